@@ -0,0 +1,81 @@
+# authentication/backends.py
+from django.conf import settings
+from django.core.cache import cache
+from django_auth_ldap.backend import LDAPBackend, valid_cache_key
+
+from .papeis import versao_papeis
+from .pool import ModuloLDAPPool
+
+TEMPO_CACHE_PERMISSOES_PADRAO = 300
+
+
+def _chave_permissoes(user_id):
+    # A versão dos papéis muda quando os grupos do usuário mudam, o que
+    # descarta as permissões em cache sem precisar apagá-las
+    return f'ldap:permissoes:{user_id}:{versao_papeis(user_id)}'
+
+
+def invalidar_permissoes(user_id):
+    cache.delete(_chave_permissoes(user_id))
+
+
+def _chave_grupos_ldap(dn):
+    return valid_cache_key(f'auth_ldap._LDAPUserGroups._group_names.{dn}')
+
+
+def descartar_cache_grupos(dns):
+    """Apaga os grupos em cache dos DNs, para o próximo login não espelhar grupos antigos."""
+    cache.delete_many([_chave_grupos_ldap(dn) for dn in dns])
+
+
+def guardar_cache_ldap(user, timeout):
+    """
+    Grava o DN e os nomes dos grupos do usuário nas mesmas chaves que o
+    django_auth_ldap consulta quando AUTH_LDAP_CACHE_TIMEOUT > 0
+    (django_auth_ldap.backend._LDAPUser._search_for_user_dn e
+    _LDAPUserGroups._cache_key). Usado pela atualização em segundo plano para
+    deixar o cache pronto e com os dados novos antes do próximo login.
+    """
+    dn = user.ldap_user.dn
+    cache.set_many({
+        valid_cache_key(f'django_auth_ldap.user_dn.{user.ldap_username}'): dn,
+        _chave_grupos_ldap(dn): set(user.ldap_user.group_names),
+    }, timeout)
+
+
+class LDAPBackendCache(LDAPBackend):
+    """
+    LDAPBackend com cache das permissões vindas dos grupos do AD.
+
+    O DN e os grupos de cada usuário já ficam em cache pelo próprio
+    django_auth_ldap (AUTH_LDAP_CACHE_TIMEOUT); aqui se guarda também o
+    conjunto de permissões, que sem cache é recalculado (grupos no LDAP +
+    consulta de Permission) a cada requisição que verifica permissões.
+    O comando atualizar_cache_ldap renova esses dados em segundo plano.
+    Tudo fica no cache padrão (CACHES): com vários processos ele precisa ser
+    compartilhado (REDIS_URL) para que a troca de grupos e a renovação feita
+    por um processo valham nos outros; no cache em memória, cada processo
+    mantém a sua cópia até expirar.
+
+    As conexões com o AD vêm de um pool do processo (authentication/pool.py),
+    já abertas e autenticadas, a menos que LDAP_POOL_ATIVO seja False.
+    """
+
+    @property
+    def ldap(self):
+        modulo = super().ldap
+        if not getattr(settings, 'LDAP_POOL_ATIVO', True):
+            return modulo
+        return ModuloLDAPPool(modulo, self.settings)
+
+    def get_group_permissions(self, user, obj=None):
+        if user.pk is None or not user.is_active:
+            return super().get_group_permissions(user, obj)
+
+        chave = _chave_permissoes(user.pk)
+        permissoes = cache.get(chave)
+        if permissoes is None:
+            permissoes = super().get_group_permissions(user, obj)
+            tempo = getattr(settings, 'LDAP_CACHE_PERMISSOES', TEMPO_CACHE_PERMISSOES_PADRAO)
+            cache.set(chave, permissoes, tempo)
+        return permissoes
@@ -0,0 +1,307 @@
+# authentication/ldap_falso.py
+"""
+Diretório LDAP falso, em memória, com latência configurável.
+
+Substitui o módulo ldap usado pelo django_auth_ldap para abrir conexões
+(LDAPBackend._ldap), o que permite testar e medir o login, o cache e a
+sincronização sem um Active Directory de verdade. Conta cada operação de rede
+em 'operacoes' para comparar cenários (ex.: com e sem cache).
+
+Uso:
+    diretorio = DiretorioFalso(latencia=0.02)
+    diretorio.adicionar_grupo('CPD')
+    diretorio.adicionar_usuario('joao', 'senha', grupos=['CPD'])
+    with override_settings(**configuracao()), diretorio.ativo():
+        authenticate(username='joao', password='senha')
+"""
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import ldap
+
+BASE_USUARIOS = 'ou=usuarios,dc=exemplo,dc=local'
+BASE_GRUPOS = 'ou=grupos,dc=exemplo,dc=local'
+BIND_DN_SERVICO = 'cn=servico,dc=exemplo,dc=local'
+SENHA_SERVICO = 'servico'
+
+_ESCAPE_FILTRO = re.compile(r'\\([0-9a-fA-F]{2})')
+
+
+def configuracao(cache_timeout=0):
+    """Configuração AUTH_LDAP_* apontando para o DiretorioFalso (para override_settings)."""
+    from django_auth_ldap.config import ActiveDirectoryGroupType, LDAPSearch
+
+    return {
+        'AUTH_LDAP_SERVER_URI': 'ldap://falso',
+        'AUTH_LDAP_BIND_DN': BIND_DN_SERVICO,
+        'AUTH_LDAP_BIND_PASSWORD': SENHA_SERVICO,
+        'AUTH_LDAP_USER_SEARCH': LDAPSearch(BASE_USUARIOS, ldap.SCOPE_SUBTREE, '(sAMAccountName=%(user)s)'),
+        'AUTH_LDAP_GROUP_SEARCH': LDAPSearch(BASE_GRUPOS, ldap.SCOPE_SUBTREE, '(objectClass=group)'),
+        'AUTH_LDAP_GROUP_TYPE': ActiveDirectoryGroupType(),
+        'AUTH_LDAP_CACHE_TIMEOUT': cache_timeout,
+    }
+
+
+# --- Filtros LDAP (RFC 4515, o suficiente para o django_auth_ldap e a sincronização) ---
+
+def _analisar_filtro(texto, posicao=0):
+    if texto[posicao] != '(':
+        raise ldap.LDAPError({'desc': f'Filtro inválido: {texto}'})
+    posicao += 1
+    operador = texto[posicao]
+    if operador in '&|!':
+        filhos, posicao = [], posicao + 1
+        while texto[posicao] == '(':
+            filho, posicao = _analisar_filtro(texto, posicao)
+            filhos.append(filho)
+        return (operador, filhos), posicao + 1
+    fim = texto.index(')', posicao)
+    atributo, comparacao, valor = re.match(r'([^=<>~]+)(>=|<=|=)(.*)', texto[posicao:fim]).groups()
+    return (comparacao, atributo.lower(), valor), fim + 1
+
+
+def _valor_filtro(valor):
+    return _ESCAPE_FILTRO.sub(lambda m: chr(int(m.group(1), 16)), valor).lower()
+
+
+def _corresponde(filtro, entrada):
+    operador, *resto = filtro
+    if operador == '&':
+        return all(_corresponde(filho, entrada) for filho in resto[0])
+    if operador == '|':
+        return any(_corresponde(filho, entrada) for filho in resto[0])
+    if operador == '!':
+        return not _corresponde(resto[0][0], entrada)
+
+    atributo, valor = resto
+    valores = [v.lower() for v in entrada.get(atributo, [])]
+    if operador == '=' and valor == '*':
+        return bool(valores)
+    if operador == '=' and '*' in valor:
+        padrao = '.*'.join(re.escape(_valor_filtro(parte)) for parte in valor.split('*'))
+        return any(re.fullmatch(padrao, v) for v in valores)
+    valor = _valor_filtro(valor)
+    if operador == '=':
+        return valor in valores
+    # >= e <= (ex.: uSNChanged): comparação numérica quando os dois lados são números
+    def comparar(atual):
+        a, b = (int(atual), int(valor)) if atual.isdigit() and valor.isdigit() else (atual, valor)
+        return a >= b if operador == '>=' else a <= b
+    return any(comparar(v) for v in valores)
+
+
+class DiretorioFalso:
+    def __init__(self, latencia=0.0, latencia_conexao=0.0):
+        # latencia: por operação (bind, busca); latencia_conexao: abertura (TCP + TLS)
+        self.latencia = latencia
+        self.latencia_conexao = latencia_conexao
+        self.entradas = {}
+        self.senhas = {BIND_DN_SERVICO: SENHA_SERVICO}
+        self.operacoes = Counter()
+        self.usn = 1000
+        self.conexoes = []
+        self._lock = threading.Lock()
+
+    # --- Conteúdo do diretório ---
+
+    def _gravar(self, dn, atributos):
+        with self._lock:
+            self.usn += 1
+            atributos['usnchanged'] = [str(self.usn)]
+            atributos['whenchanged'] = [datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S.0Z')]
+            atributos['distinguishedname'] = [dn]
+            self.entradas[dn.lower()] = (dn, atributos)
+
+    def adicionar_grupo(self, nome, base=BASE_GRUPOS):
+        dn = f'CN={nome},{base}'
+        self._gravar(dn, {'objectclass': ['top', 'group'], 'cn': [nome], 'member': []})
+        return dn
+
+    def adicionar_usuario(self, login, senha, nome='', sobrenome='', email='', grupos=(), base=BASE_USUARIOS):
+        dn = f'CN={login},{base}'
+        self._gravar(dn, {
+            'objectclass': ['top', 'person', 'user'],
+            'cn': [login], 'samaccountname': [login],
+            'givenname': [nome or login.capitalize()], 'sn': [sobrenome or 'Teste'],
+            'mail': [email or f'{login}@exemplo.local'],
+        })
+        self.senhas[dn.lower()] = senha
+        for grupo in grupos:
+            self.incluir_no_grupo(login, grupo)
+        return dn
+
+    def alterar_usuario(self, login, **atributos):
+        dn, atuais = self._entrada_usuario(login)
+        self._gravar(dn, {**atuais, **{chave.lower(): [valor] for chave, valor in atributos.items()}})
+
+    def incluir_no_grupo(self, login, grupo):
+        self._alterar_membros(login, grupo, incluir=True)
+
+    def remover_do_grupo(self, login, grupo):
+        self._alterar_membros(login, grupo, incluir=False)
+
+    def _alterar_membros(self, login, grupo, incluir):
+        usuario_dn, _ = self._entrada_usuario(login)
+        grupo_dn, atributos = next(
+            entrada for entrada in self.entradas.values() if entrada[1]['cn'] == [grupo] and 'group' in entrada[1]['objectclass']
+        )
+        membros = [m for m in atributos['member'] if m.lower() != usuario_dn.lower()]
+        if incluir:
+            membros.append(usuario_dn)
+        self._gravar(grupo_dn, {**atributos, 'member': membros})
+
+    def _entrada_usuario(self, login):
+        return next(entrada for entrada in self.entradas.values() if entrada[1].get('samaccountname') == [login])
+
+    # --- Papel de módulo ldap ---
+
+    def initialize(self, uri, **kwargs):
+        self._operacao('conexao', self.latencia_conexao)
+        conexao = ConexaoFalsa(self, uri)
+        with self._lock:
+            self.conexoes.append(conexao)
+        return conexao
+
+    def derrubar_conexoes(self):
+        """Simula o reinício do servidor: as conexões abertas passam a falhar."""
+        for conexao in self.conexoes:
+            conexao.fechada = True
+
+    @contextmanager
+    def ativo(self, backend_cls=None):
+        """Faz o LDAPBackend (e subclasses) usar este diretório dentro do bloco."""
+        from django_auth_ldap.backend import LDAPBackend
+
+        backend_cls = backend_cls or LDAPBackend
+        definido = '_ldap' in backend_cls.__dict__
+        anterior = backend_cls.__dict__.get('_ldap')
+        backend_cls._ldap = self
+        try:
+            yield self
+        finally:
+            if definido:
+                backend_cls._ldap = anterior
+            else:
+                del backend_cls._ldap
+
+    def _operacao(self, nome, latencia=None):
+        with self._lock:
+            self.operacoes[nome] += 1
+        latencia = self.latencia if latencia is None else latencia
+        if latencia:
+            time.sleep(latencia)
+
+    def buscar(self, base, escopo, filtro, atributos=None):
+        base = (base or '').lower()
+        if not base and escopo == ldap.SCOPE_BASE:
+            # rootDSE
+            return [('', {'highestCommittedUSN': [str(self.usn).encode()]})]
+        arvore, _ = _analisar_filtro(filtro)
+        resultados = []
+        for dn_minusculo, (dn, entrada) in sorted(self.entradas.items()):
+            if escopo == ldap.SCOPE_BASE and dn_minusculo != base:
+                continue
+            if escopo == ldap.SCOPE_ONELEVEL and dn_minusculo.split(',', 1)[-1] != base:
+                continue
+            if escopo == ldap.SCOPE_SUBTREE and base and not dn_minusculo.endswith(base):
+                continue
+            if _corresponde(arvore, entrada):
+                selecionados = {
+                    chave: [valor.encode() for valor in valores]
+                    for chave, valores in entrada.items()
+                    if not atributos or chave in {a.lower() for a in atributos}
+                }
+                resultados.append((dn, selecionados))
+        return resultados
+
+
+class ConexaoFalsa:
+    """Imita a interface de ldap.ldapobject.LDAPObject usada pelo sistema."""
+
+    def __init__(self, diretorio, uri):
+        self.diretorio = diretorio
+        self.uri = uri
+        self.opcoes = {}
+        self.bind_dn = None
+        self.fechada = False
+        self._paginas = {}
+        self._proximo_msgid = 1
+
+    def _verificar(self):
+        if self.fechada:
+            raise ldap.SERVER_DOWN({'desc': "Can't contact LDAP server"})
+
+    def set_option(self, opcao, valor):
+        self.opcoes[opcao] = valor
+
+    def get_option(self, opcao):
+        return self.opcoes.get(opcao)
+
+    def start_tls_s(self):
+        self.diretorio._operacao('start_tls')
+
+    def simple_bind_s(self, who=None, cred=None, serverctrls=None, clientctrls=None):
+        self._verificar()
+        self.diretorio._operacao('bind')
+        if who and self.diretorio.senhas.get(who.lower()) != cred:
+            raise ldap.INVALID_CREDENTIALS({'desc': 'Invalid credentials'})
+        self.bind_dn = who
+        return (97, [], 1, [])
+
+    def whoami_s(self):
+        self._verificar()
+        self.diretorio._operacao('whoami')
+        return f'dn:{self.bind_dn}' if self.bind_dn else ''
+
+    def search_s(self, base, scope, filterstr='(objectClass=*)', attrlist=None, attrsonly=0):
+        self._verificar()
+        self.diretorio._operacao('busca')
+        return self.diretorio.buscar(base, scope, filterstr, attrlist)
+
+    def search_ext(self, base, scope, filterstr='(objectClass=*)', attrlist=None, attrsonly=0, serverctrls=None, **kwargs):
+        """Busca paginada (controle Simple Paged Results); o resultado sai em result3()."""
+        self._verificar()
+        resultados = self.diretorio.buscar(base, scope, filterstr, attrlist)
+        controle = next((c for c in serverctrls or () if hasattr(c, 'cookie')), None)
+        inicio = int(controle.cookie or 0) if controle else 0
+        tamanho = controle.size if controle else len(resultados)
+        msgid = self._proximo_msgid
+        self._proximo_msgid += 1
+        self._paginas[msgid] = (resultados[inicio:inicio + tamanho], controle, inicio + tamanho, len(resultados))
+        return msgid
+
+    def result3(self, msgid, all=1, timeout=None):
+        self.diretorio._operacao('busca')
+        pagina, controle, proximo, total = self._paginas.pop(msgid)
+        controles = []
+        if controle is not None:
+            from ldap.controls import SimplePagedResultsControl
+
+            cookie = str(proximo).encode() if proximo < total else b''
+            controles.append(SimplePagedResultsControl(True, size=controle.size, cookie=cookie))
+        return ldap.RES_SEARCH_RESULT, pagina, msgid, controles
+
+    def search(self, base, scope, filterstr='(objectClass=*)', attrlist=None, attrsonly=0):
+        return self.search_ext(base, scope, filterstr, attrlist, attrsonly)
+
+    def result(self, msgid, all=1, timeout=None):
+        tipo, dados, _, _ = self.result3(msgid, all, timeout)
+        return tipo, dados
+
+    def compare_s(self, dn, atributo, valor):
+        self._verificar()
+        self.diretorio._operacao('compare')
+        entrada = self.diretorio.entradas.get(dn.lower())
+        if entrada is None:
+            raise ldap.NO_SUCH_OBJECT({'desc': 'No such object'})
+        valor = valor.decode() if isinstance(valor, bytes) else valor
+        return int(valor.lower() in (v.lower() for v in entrada[1].get(atributo.lower(), [])))
+
+    def unbind_s(self):
+        self.fechada = True
+
+    unbind = unbind_s
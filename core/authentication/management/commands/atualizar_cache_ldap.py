@@ -0,0 +1,50 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from authentication.backends import LDAPBackendCache, guardar_cache_ldap, invalidar_permissoes
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza a partir do AD os atributos e grupos dos usuários que usaram o sistema "
+        "recentemente e renova o cache do LDAP. Feito para rodar agendado (ex.: cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help="Considera usuários com login nos últimos N dias.")
+        parser.add_argument('--usuario', action='append', help="Atualiza só estes usuários (pode repetir).")
+
+    def handle(self, *args, **options):
+        backend = LDAPBackendCache()
+        # Sempre lê do AD: é justamente o cache que está sendo renovado
+        backend.settings.CACHE_TIMEOUT = 0
+        timeout = getattr(settings, 'AUTH_LDAP_CACHE_TIMEOUT', 0)
+
+        # Usuários criados pelo LDAP não têm senha local utilizável
+        usuarios = get_user_model().objects.filter(is_active=True, password__startswith=UNUSABLE_PASSWORD_PREFIX)
+        if options['usuario']:
+            usuarios = usuarios.filter(username__in=options['usuario'])
+        else:
+            usuarios = usuarios.filter(last_login__gte=timezone.now() - timedelta(days=options['dias']))
+
+        atualizados = ausentes = 0
+        for username in usuarios.values_list('username', flat=True).iterator():
+            user = backend.populate_user(username)
+            if user is None:
+                ausentes += 1
+                logger.warning("Usuário %s não encontrado no AD durante a atualização do cache.", username)
+                continue
+            if timeout > 0:
+                guardar_cache_ldap(user, timeout)
+            invalidar_permissoes(user.pk)
+            atualizados += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{atualizados} usuário(s) atualizado(s); {ausentes} não encontrado(s) no AD.'))
@@ -0,0 +1,75 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from authentication.backends import LDAPBackendCache
+from authentication.ldap_falso import DiretorioFalso, configuracao
+from authentication.pool import fechar_pools
+
+SENHA = 'senha'
+# (nome, AUTH_LDAP_CACHE_TIMEOUT, LDAP_POOL_ATIVO)
+CENARIOS = (
+    ('sem cache', 0, False),
+    ('com cache', 3600, False),
+    ('cache e pool', 3600, True),
+)
+
+# Cache próprio, para não misturar com o cache da aplicação
+CACHE_MEDICAO = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'medir-login-ldap'}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a latência do login LDAP com e sem cache e pool de conexões, usando um diretório falso com "
+        "latência de rede simulada. Nada é gravado no banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20, help="Usuários no diretório falso.")
+        parser.add_argument('--logins', type=int, default=5, help="Logins por usuário em cada cenário.")
+        parser.add_argument('--latencia', type=float, default=10, help="Latência por operação LDAP (ms).")
+        parser.add_argument('--latencia-conexao', type=float, default=30, help="Latência para abrir a conexão TLS (ms).")
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['logins'] < 1:
+            raise CommandError("--usuarios e --logins devem ser pelo menos 1.")
+
+        diretorio = DiretorioFalso(options['latencia'] / 1000, options['latencia_conexao'] / 1000)
+        for grupo in ('CPD', 'TI', 'Usuarios'):
+            diretorio.adicionar_grupo(grupo)
+        logins = [f'bench{i}' for i in range(options['usuarios'])]
+        for indice, login in enumerate(logins):
+            diretorio.adicionar_usuario(login, SENHA, grupos=['CPD', 'TI'] if indice % 10 == 0 else ['Usuarios'])
+
+        for nome, cache_timeout, pool in CENARIOS:
+            configuracao_cenario = {**configuracao(cache_timeout), 'CACHES': CACHE_MEDICAO, 'LDAP_POOL_ATIVO': pool}
+            with override_settings(**configuracao_cenario), diretorio.ativo(), transaction.atomic():
+                try:
+                    tempos, operacoes = self.medir(diretorio, logins, options['logins'])
+                finally:
+                    fechar_pools()
+                transaction.set_rollback(True)
+            quantis = statistics.quantiles(tempos, n=100, method='inclusive') if len(tempos) > 1 else tempos * 99
+            self.stdout.write(
+                f"{nome:<13} {len(tempos)} logins  média {statistics.fmean(tempos):7.1f} ms  "
+                f"p50 {quantis[49]:7.1f} ms  p95 {quantis[94]:7.1f} ms  "
+                f"operações LDAP/login {sum(operacoes.values()) / len(tempos):.1f} ({dict(operacoes)})"
+            )
+
+    def medir(self, diretorio, logins, repeticoes):
+        # Todo cenário começa com o cache vazio (o de medição, não o da aplicação)
+        cache.clear()
+        diretorio.operacoes.clear()
+        tempos = []
+        for _ in range(repeticoes):
+            for login in logins:
+                inicio = time.perf_counter()
+                user = LDAPBackendCache().authenticate(None, username=login, password=SENHA)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                if user is None:
+                    raise CommandError(f"Falha no login de {login} no diretório falso.")
+        return tempos, diretorio.operacoes.copy()
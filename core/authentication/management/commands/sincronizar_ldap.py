@@ -0,0 +1,38 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from authentication.sincronizacao import TAMANHO_PAGINA, sincronizar
+
+
+class Command(BaseCommand):
+    help = (
+        "Sincroniza em lote os usuários e grupos do AD com o banco (busca paginada, "
+        "bulk insert/update). Incremental por padrão: lê só o que mudou desde a última execução."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help="Lê todo o diretório, ignorando a última execução.")
+        parser.add_argument('--desde', help="Lê só as entradas alteradas a partir desta data (AAAA-MM-DD), pelo whenChanged.")
+        parser.add_argument('--pagina', type=int, default=TAMANHO_PAGINA, help="Entradas por página do LDAP (e por lote no banco).")
+
+    def handle(self, *args, **options):
+        if options['pagina'] < 1:
+            raise CommandError("--pagina deve ser pelo menos 1.")
+        desde = None
+        if options['desde']:
+            try:
+                desde = timezone.make_aware(datetime.combine(datetime.strptime(options['desde'], '%Y-%m-%d'), time.min))
+            except ValueError:
+                raise CommandError("--desde deve estar no formato AAAA-MM-DD.")
+
+        resultado = sincronizar(completo=options['completo'], desde=desde, tamanho_pagina=options['pagina'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sincronização {'incremental' if resultado.incremental else 'completa'}: "
+            f"{resultado.usuarios_lidos} usuário(s) lido(s), {resultado.usuarios_criados} criado(s), "
+            f"{resultado.usuarios_atualizados} atualizado(s); {resultado.grupos_lidos} grupo(s) lido(s), "
+            f"{resultado.grupos_criados} criado(s); {resultado.inclusoes} inclusão(ões) e "
+            f"{resultado.remocoes} remoção(ões) em grupos; {resultado.membros_ignorados} membro(s) ignorado(s)."
+        ))
@@ -0,0 +1,16 @@
+# authentication/middleware.py
+from .papeis import PapeisUsuario
+
+
+class PapeisMiddleware:
+    """
+    Disponibiliza request.papeis para as views e templates.
+    Deve vir depois do AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.papeis = PapeisUsuario(request)
+        return self.get_response(request)
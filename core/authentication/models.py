@@ -3,4 +3,22 @@ from django.db import models
 
 class Usuario(AbstractUser):
     
-    pass
\ No newline at end of file
+    pass
+
+
+class SincronizacaoLDAP(models.Model):
+    """
+    Ponto de parada da sincronização incremental com o AD (ver
+    authentication/sincronizacao.py), um por servidor: o uSNChanged só vale
+    para o controlador de domínio que o gerou.
+    """
+    servidor = models.CharField(max_length=255, unique=True, verbose_name="Servidor")
+    usn = models.BigIntegerField(null=True, blank=True, verbose_name="highestCommittedUSN")
+    data = models.DateTimeField(null=True, blank=True, verbose_name="Início da última sincronização")
+
+    class Meta:
+        verbose_name = "Sincronização LDAP"
+        verbose_name_plural = "Sincronizações LDAP"
+
+    def __str__(self):
+        return self.servidor
@@ -0,0 +1,122 @@
+# authentication/papeis.py
+from django.contrib.auth.models import Group
+from django.utils.functional import cached_property
+
+from core.versoes_cache import incrementar_versao, ler_versoes
+
+# Nomes dos grupos usados pelas regras de permissão do sistema
+GRUPO_TECNICO = 'CPD'
+GRUPO_TI = 'TI'
+GRUPO_DIRETORIA = 'Diretoria'
+
+CHAVE_SESSAO = '_papeis_usuario'
+CHAVE_VERSAO_GLOBAL = 'papeis:versao:global'
+
+
+def _chave_versao_usuario(user_id):
+    return f'papeis:versao:usuario:{user_id}'
+
+
+def versao_papeis(user_id):
+    """
+    Retorna a "versão" dos grupos do usuário. Qualquer alteração de
+    pertença (inclusive o espelhamento de grupos do LDAP no login) ou
+    renomeação de grupo muda este valor e invalida o que está na sessão.
+    A versão fica no cache compartilhado (CACHES), então vale para todos os
+    processos.
+    """
+    chave_usuario = _chave_versao_usuario(user_id)
+    versoes = ler_versoes([CHAVE_VERSAO_GLOBAL, chave_usuario])
+    return f"{versoes[CHAVE_VERSAO_GLOBAL]}.{versoes[chave_usuario]}"
+
+
+def invalidar_papeis_usuario(user_id):
+    incrementar_versao(_chave_versao_usuario(user_id))
+
+
+def invalidar_papeis_todos():
+    incrementar_versao(CHAVE_VERSAO_GLOBAL)
+
+
+class PapeisUsuario:
+    """
+    Papéis (grupos) do usuário da requisição, carregados no máximo uma vez.
+
+    Os nomes dos grupos ficam guardados na sessão junto com a versão em que
+    foram lidos, então uma requisição normal não faz nenhuma consulta de grupos.
+    """
+
+    def __init__(self, request):
+        self._request = request
+
+    @cached_property
+    def grupos(self):
+        user = self._request.user
+        if not user.is_authenticated:
+            return frozenset()
+
+        session = getattr(self._request, 'session', None)
+        versao = versao_papeis(user.pk)
+        if session is not None:
+            guardado = session.get(CHAVE_SESSAO)
+            if guardado and guardado.get('usuario') == user.pk and guardado.get('versao') == versao:
+                return frozenset(guardado['grupos'])
+
+        nomes = sorted(user.groups.values_list('name', flat=True))
+        if session is not None:
+            session[CHAVE_SESSAO] = {'usuario': user.pk, 'versao': versao, 'grupos': nomes}
+        return frozenset(nomes)
+
+    def tem_grupo(self, nome):
+        return nome in self.grupos
+
+    @property
+    def is_tecnico(self):
+        return self.tem_grupo(GRUPO_TECNICO)
+
+    @property
+    def is_ti(self):
+        return self.tem_grupo(GRUPO_TI)
+
+    @property
+    def is_diretoria(self):
+        return self.tem_grupo(GRUPO_DIRETORIA)
+
+
+def ao_alterar_grupos_usuario(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Receptor de m2m_changed em User.groups. O django_auth_ldap usa
+    user.groups.set() ao espelhar os grupos (AUTH_LDAP_MIRROR_GROUPS),
+    portanto este sinal cobre tanto o LDAP quanto edições pelo admin.
+    """
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidar_papeis_usuario(instance.pk)
+    elif pk_set:
+        # Alteração feita pelo lado do grupo (group.user_set...): pk_set são usuários
+        for user_id in pk_set:
+            invalidar_papeis_usuario(user_id)
+    else:
+        # group.user_set.clear() não informa quais usuários foram afetados
+        invalidar_papeis_todos()
+
+
+def ao_alterar_grupo(sender, **kwargs):
+    # Renomear ou apagar um grupo afeta os papéis de todos os seus membros
+    invalidar_papeis_todos()
+
+
+def conectar_sinais():
+    from django.contrib.auth import get_user_model
+    from django.db.models.signals import m2m_changed, post_delete, post_save
+
+    m2m_changed.connect(
+        ao_alterar_grupos_usuario,
+        sender=get_user_model().groups.through,
+        dispatch_uid='papeis_grupos_usuario',
+    )
+    post_save.connect(ao_alterar_grupo, sender=Group, dispatch_uid='papeis_grupo_salvo')
+    post_delete.connect(ao_alterar_grupo, sender=Group, dispatch_uid='papeis_grupo_apagado')
+    # As permissões em cache do LDAPBackendCache usam a mesma versão
+    m2m_changed.connect(ao_alterar_grupo, sender=Group.permissions.through, dispatch_uid='papeis_permissoes_grupo')
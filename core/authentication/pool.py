@@ -0,0 +1,309 @@
+# authentication/pool.py
+"""
+Pool de conexões LDAP reaproveitadas entre logins no mesmo processo.
+
+Sem o pool, cada login abre uma conexão nova (TCP + TLS) e faz bind com a
+conta de serviço. Aqui ficam dois pools por configuração: um de conexões já
+autenticadas com a conta de serviço, para as buscas (DN, grupos, atributos),
+e outro só para conferir a senha dos usuários, cujas conexões não precisam
+voltar a ser da conta de serviço depois do bind do usuário.
+
+ModuloLDAPPool faz o papel do módulo ldap para o django_auth_ldap
+(LDAPBackend.ldap): initialize() devolve uma ConexaoPool, que empresta uma
+conexão de verdade a cada operação e a devolve logo em seguida.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import Counter, deque
+
+import ldap
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAXIMO_PADRAO = 10
+OCIOSO_PADRAO = 300
+VERIFICAR_APOS_PADRAO = 30
+ESPERA_PADRAO = 5
+
+
+class PoolLDAP:
+    """
+    Conexões livres numa pilha (a mais recente sai primeiro, e é a que tem
+    mais chance de continuar aberta no servidor). 'maximo' limita as conexões
+    abertas, emprestadas ou não; quem passa do limite espera até 'espera' segundos.
+    """
+
+    def __init__(self, abrir, bind=None, maximo=MAXIMO_PADRAO, ocioso=OCIOSO_PADRAO,
+                 verificar_apos=VERIFICAR_APOS_PADRAO, espera=ESPERA_PADRAO):
+        self._abrir = abrir
+        # (dn, senha) da conta de serviço, ou None para o pool de autenticação
+        self.bind = bind
+        self.ocioso = ocioso
+        self.verificar_apos = verificar_apos
+        self.espera = espera
+        self._livres = deque()
+        self._lock = threading.Lock()
+        self._vagas = threading.BoundedSemaphore(maximo)
+        self.estatisticas = Counter()
+
+    def _contar(self, evento):
+        with self._lock:
+            self.estatisticas[evento] += 1
+
+    def _nova(self):
+        conexao = self._abrir()
+        try:
+            if self.bind is not None:
+                conexao.simple_bind_s(*self.bind)
+        except ldap.LDAPError:
+            self._fechar(conexao)
+            raise
+        self._contar('abertas')
+        return conexao
+
+    def _fechar(self, conexao):
+        self._contar('fechadas')
+        try:
+            conexao.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+    def _saudavel(self, conexao):
+        try:
+            conexao.whoami_s()
+            return True
+        except ldap.LDAPError:
+            self._contar('falhas_verificacao')
+            self._fechar(conexao)
+            return False
+
+    def emprestar(self):
+        if not self._vagas.acquire(timeout=self.espera):
+            self._contar('esgotado')
+            raise ldap.TIMEOUT({'desc': 'Pool de conexões LDAP esgotado'})
+        try:
+            while True:
+                with self._lock:
+                    if not self._livres:
+                        break
+                    conexao, ultimo_uso = self._livres.pop()
+                parada = time.monotonic() - ultimo_uso
+                if parada > self.ocioso:
+                    self._fechar(conexao)
+                elif parada <= self.verificar_apos or self._saudavel(conexao):
+                    self._contar('reaproveitadas')
+                    return conexao
+            return self._nova()
+        except BaseException:
+            self._vagas.release()
+            raise
+
+    def devolver(self, conexao, descartar=False):
+        try:
+            if descartar:
+                self._fechar(conexao)
+            else:
+                with self._lock:
+                    self._livres.append((conexao, time.monotonic()))
+        finally:
+            self._vagas.release()
+
+    def executar(self, operacao):
+        """
+        Executa operacao(conexao) com uma conexão emprestada. Se o servidor
+        tiver derrubado a conexão, descarta e tenta mais uma vez com outra.
+        """
+        for tentativa in range(2):
+            conexao = self.emprestar()
+            try:
+                resultado = operacao(conexao)
+            except ldap.SERVER_DOWN:
+                self.devolver(conexao, descartar=True)
+                if tentativa:
+                    raise
+                logger.warning("Conexão LDAP do pool caiu; tentando com outra conexão.")
+                continue
+            except BaseException:
+                # Erros de LDAP (senha errada, objeto inexistente) não estragam a conexão
+                self.devolver(conexao)
+                raise
+            self.devolver(conexao)
+            return resultado
+
+    def fechar(self):
+        with self._lock:
+            livres, self._livres = list(self._livres), deque()
+        for conexao, _ in livres:
+            self._fechar(conexao)
+
+
+class ParPools:
+    def __init__(self, servico, autenticacao):
+        self.servico = servico
+        self.autenticacao = autenticacao
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pools_para(modulo, uri, config):
+    """Pools (serviço e autenticação) deste processo para a configuração dada."""
+    opcoes = tuple(config.CONNECTION_OPTIONS.items())
+    chave = (id(modulo), uri, config.BIND_DN, config.BIND_PASSWORD, config.START_TLS, opcoes)
+    with _pools_lock:
+        par = _pools.get(chave)
+        if par is None:
+            def abrir():
+                conexao = modulo.initialize(uri, bytes_mode=False)
+                for opcao, valor in opcoes:
+                    conexao.set_option(opcao, valor)
+                if config.START_TLS:
+                    conexao.start_tls_s()
+                return conexao
+
+            parametros = {
+                'maximo': getattr(settings, 'LDAP_POOL_MAXIMO', MAXIMO_PADRAO),
+                'ocioso': getattr(settings, 'LDAP_POOL_OCIOSO', OCIOSO_PADRAO),
+                'verificar_apos': getattr(settings, 'LDAP_POOL_VERIFICAR_APOS', VERIFICAR_APOS_PADRAO),
+                'espera': getattr(settings, 'LDAP_POOL_ESPERA', ESPERA_PADRAO),
+            }
+            par = _pools[chave] = ParPools(
+                PoolLDAP(abrir, bind=(config.BIND_DN, config.BIND_PASSWORD), **parametros),
+                PoolLDAP(abrir, **parametros),
+            )
+        return par
+
+
+def fechar_pools():
+    with _pools_lock:
+        pares = list(_pools.values())
+        _pools.clear()
+    for par in pares:
+        par.servico.fechar()
+        par.autenticacao.fechar()
+
+
+def estatisticas_pools():
+    with _pools_lock:
+        pares = list(_pools.items())
+    return {
+        f'{chave[1]} ({nome})': dict(getattr(par, nome).estatisticas)
+        for chave, par in pares for nome in ('servico', 'autenticacao')
+    }
+
+
+class ConexaoPool:
+    """
+    O que o django_auth_ldap enxerga como uma conexão. O bind com a conta de
+    serviço não vai ao servidor (as conexões do pool já estão autenticadas);
+    o bind de um usuário usa o pool de autenticação.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, pools):
+        self._pools = pools
+        # Credenciais do usuário quando o django_auth_ldap continua autenticado
+        # como ele (AUTH_LDAP_BIND_AS_AUTHENTICATING_USER)
+        self._usuario = None
+        self._pendentes = {}
+
+    def _executar(self, operacao):
+        if self._usuario is None:
+            return self._pools.servico.executar(operacao)
+        usuario = self._usuario
+        return self._pools.autenticacao.executar(lambda conexao: (conexao.simple_bind_s(*usuario), operacao(conexao))[1])
+
+    # Opções e TLS já foram aplicados quando a conexão do pool foi aberta
+    def set_option(self, opcao, valor):
+        pass
+
+    def start_tls_s(self):
+        pass
+
+    def simple_bind_s(self, who=None, cred=None, serverctrls=None, clientctrls=None):
+        if (who, cred) == self._pools.servico.bind:
+            self._usuario = None
+            return (ldap.RES_BIND, [], 0, [])
+        resultado = self._pools.autenticacao.executar(lambda conexao: conexao.simple_bind_s(who, cred))
+        self._usuario = (who, cred)
+        return resultado
+
+    def whoami_s(self):
+        return self._executar(lambda conexao: conexao.whoami_s())
+
+    def search_s(self, *args, **kwargs):
+        return self._executar(lambda conexao: conexao.search_s(*args, **kwargs))
+
+    def compare_s(self, *args, **kwargs):
+        return self._executar(lambda conexao: conexao.compare_s(*args, **kwargs))
+
+    # Buscas assíncronas: a conexão fica emprestada até a leitura do resultado
+    def _iniciar(self, metodo, args, kwargs):
+        pool = self._pools.servico if self._usuario is None else self._pools.autenticacao
+        conexao = pool.emprestar()
+        try:
+            if self._usuario is not None:
+                conexao.simple_bind_s(*self._usuario)
+            msgid = getattr(conexao, metodo)(*args, **kwargs)
+        except ldap.SERVER_DOWN:
+            pool.devolver(conexao, descartar=True)
+            raise
+        except BaseException:
+            pool.devolver(conexao)
+            raise
+        identificador = next(self._ids)
+        self._pendentes[identificador] = (pool, conexao, msgid)
+        return identificador
+
+    def _concluir(self, identificador, metodo, kwargs):
+        pool, conexao, msgid = self._pendentes.pop(identificador)
+        try:
+            resultado = getattr(conexao, metodo)(msgid, **kwargs)
+        except ldap.SERVER_DOWN:
+            pool.devolver(conexao, descartar=True)
+            raise
+        except BaseException:
+            pool.devolver(conexao)
+            raise
+        pool.devolver(conexao)
+        return resultado
+
+    def search(self, *args, **kwargs):
+        return self._iniciar('search', args, kwargs)
+
+    def search_ext(self, *args, **kwargs):
+        return self._iniciar('search_ext', args, kwargs)
+
+    def result(self, msgid, all=1, timeout=None):
+        return self._concluir(msgid, 'result', {'all': all, 'timeout': timeout})
+
+    def result3(self, msgid, all=1, timeout=None):
+        tipo, dados, _, controles = self._concluir(msgid, 'result3', {'all': all, 'timeout': timeout})
+        return tipo, dados, msgid, controles
+
+    def unbind_s(self):
+        # As conexões são do pool; só devolve buscas que ficaram sem leitura
+        for identificador in list(self._pendentes):
+            pool, conexao, _ = self._pendentes.pop(identificador)
+            pool.devolver(conexao, descartar=True)
+
+    unbind = unbind_s
+
+
+class ModuloLDAPPool:
+    """Substitui o módulo ldap no LDAPBackend: o django_auth_ldap só chama initialize()."""
+
+    def __init__(self, modulo, config):
+        self._modulo = modulo
+        self._config = config
+
+    def initialize(self, uri, **kwargs):
+        return ConexaoPool(pools_para(self._modulo, uri, self._config))
+
+    def __getattr__(self, nome):
+        return getattr(self._modulo, nome)
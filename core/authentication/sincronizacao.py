@@ -0,0 +1,319 @@
+# authentication/sincronizacao.py
+"""
+Sincronização em lote dos usuários e grupos do AD com o banco.
+
+Sem ela, usuários e grupos só entram nas tabelas no primeiro login, pelo
+espelhamento do django_auth_ldap. Aqui o diretório é lido com busca paginada
+(controle Simple Paged Results), cada página é comparada com o banco e as
+diferenças vão para o banco com bulk_create/bulk_update, uma transação por página.
+
+A sincronização é incremental: guarda o highestCommittedUSN do controlador de
+domínio (SincronizacaoLDAP) e, na execução seguinte, lê só as entradas com
+uSNChanged maior. Se o servidor não informar o USN, usa o whenChanged.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import timezone as fuso
+
+import ldap
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django_auth_ldap.backend import LDAPBackend
+from ldap.controls import SimplePagedResultsControl
+from ldap.filter import escape_filter_chars
+
+from .backends import descartar_cache_grupos
+from .models import SincronizacaoLDAP
+from .papeis import invalidar_papeis_usuario
+
+logger = logging.getLogger(__name__)
+
+ATRIBUTO_LOGIN = 'sAMAccountName'
+# Bit ACCOUNTDISABLE do userAccountControl
+CONTA_DESATIVADA = 0x2
+TAMANHO_PAGINA = 500
+# DNs por filtro (|(distinguishedName=...)...) ao resolver membros de grupos
+DNS_POR_BUSCA = 50
+
+
+@dataclass
+class ResultadoSincronizacao:
+    incremental: bool = False
+    usuarios_lidos: int = 0
+    usuarios_criados: int = 0
+    usuarios_atualizados: int = 0
+    grupos_lidos: int = 0
+    grupos_criados: int = 0
+    inclusoes: int = 0
+    remocoes: int = 0
+    # Membros de grupos que não são usuários do sistema (outros grupos, contas fora da base)
+    membros_ignorados: int = 0
+
+
+# --- Leitura do diretório ---
+
+def abrir_conexao(backend):
+    """Conexão autenticada com a conta de serviço, com a mesma configuração do login."""
+    config = backend.settings
+    conexao = backend.ldap.initialize(config.SERVER_URI, bytes_mode=False)
+    for opcao, valor in config.CONNECTION_OPTIONS.items():
+        conexao.set_option(opcao, valor)
+    if config.START_TLS:
+        conexao.start_tls_s()
+    conexao.simple_bind_s(config.BIND_DN, config.BIND_PASSWORD)
+    return conexao
+
+
+def _decodificar(atributos):
+    # Nomes de atributo do LDAP não diferenciam maiúsculas
+    return {chave.lower(): [valor.decode('utf-8', 'replace') for valor in valores] for chave, valores in atributos.items()}
+
+
+def _primeiro(atributos, nome, padrao=''):
+    valores = atributos.get(nome.lower())
+    return valores[0] if valores else padrao
+
+
+def buscar_paginado(conexao, base, escopo, filtro, atributos, tamanho_pagina=TAMANHO_PAGINA):
+    """Gera as páginas (listas de (dn, atributos)) de uma busca com Simple Paged Results."""
+    controle = SimplePagedResultsControl(True, size=tamanho_pagina, cookie='')
+    while True:
+        msgid = conexao.search_ext(base, escopo, filtro, atributos, serverctrls=[controle])
+        _, dados, _, controles = conexao.result3(msgid)
+        # Entradas sem DN são referências para outros servidores
+        yield [(dn, _decodificar(valores)) for dn, valores in dados if dn]
+        resposta = next((c for c in controles if c.controlType == SimplePagedResultsControl.controlType), None)
+        if resposta is None or not resposta.cookie:
+            return
+        controle.cookie = resposta.cookie
+
+
+def usn_atual(conexao):
+    """highestCommittedUSN do rootDSE, ou None se o servidor não informar."""
+    try:
+        resultado = conexao.search_s('', ldap.SCOPE_BASE, '(objectClass=*)', ['highestCommittedUSN'])
+    except ldap.LDAPError:
+        return None
+    for _, atributos in resultado:
+        valor = _primeiro(_decodificar(atributos), 'highestCommittedUSN')
+        if valor.isdigit():
+            return int(valor)
+    return None
+
+
+def _filtro(filtro, usn=None, desde=None):
+    condicoes = [filtro]
+    if usn is not None:
+        condicoes.append(f'(uSNChanged>={usn + 1})')
+    if desde is not None:
+        condicoes.append(f"(whenChanged>={desde.astimezone(fuso.utc):%Y%m%d%H%M%S}.0Z)")
+    return condicoes[0] if len(condicoes) == 1 else f"(&{''.join(condicoes)})"
+
+
+def _buscas(search):
+    # LDAPSearchUnion agrupa várias LDAPSearch
+    return getattr(search, 'searches', [search])
+
+
+# --- Sincronização ---
+
+class Sincronizador:
+    def __init__(self, conexao, config, tamanho_pagina=TAMANHO_PAGINA):
+        self.conexao = conexao
+        self.config = config
+        self.tamanho_pagina = tamanho_pagina
+        self.resultado = ResultadoSincronizacao()
+        self.User = get_user_model()
+        self.Membro = self.User.groups.through
+        # Nome da coluna que aponta para o usuário na tabela intermediária
+        self.campo_usuario = self.User.groups.field.m2m_field_name()
+        self.campos_usuario = [*config.USER_ATTR_MAP, 'is_active']
+        # DN (minúsculo) -> pk dos usuários vistos nesta execução
+        self.ids_por_dn = {}
+        # DN (minúsculo) -> DN como veio do AD, que é o usado nas chaves de cache do django_auth_ldap
+        self.dns = {}
+
+    def usuarios(self, usn=None, desde=None):
+        atributos = [ATRIBUTO_LOGIN, 'userAccountControl', *self.config.USER_ATTR_MAP.values()]
+        for busca in _buscas(self.config.USER_SEARCH):
+            filtro = _filtro(busca.filterstr % {'user': '*'}, usn, desde)
+            for pagina in buscar_paginado(self.conexao, busca.base_dn, busca.scope, filtro, atributos, self.tamanho_pagina):
+                self._aplicar_usuarios(pagina)
+
+    def _dados_usuario(self, atributos):
+        dados = {campo: _primeiro(atributos, atributo) for campo, atributo in self.config.USER_ATTR_MAP.items()}
+        controle = _primeiro(atributos, 'userAccountControl', '0')
+        dados['is_active'] = not (int(controle) if controle.isdigit() else 0) & CONTA_DESATIVADA
+        return dados
+
+    def _aplicar_usuarios(self, pagina):
+        # O django_auth_ldap procura o usuário com username__iexact
+        entradas = {}
+        for dn, atributos in pagina:
+            login = _primeiro(atributos, ATRIBUTO_LOGIN)
+            if login:
+                entradas[login.lower()] = (login, dn, self._dados_usuario(atributos))
+        self.resultado.usuarios_lidos += len(entradas)
+
+        existentes = {
+            user.username.lower(): user
+            for user in self.User.objects.annotate(login=Lower('username'))
+            .filter(login__in=list(entradas)).only('pk', 'username', *self.campos_usuario)
+        }
+        novos, alterados, por_dn = [], [], {}
+        for chave, (login, dn, dados) in entradas.items():
+            user = existentes.get(chave)
+            if user is None:
+                user = self.User(username=login, **dados)
+                # Como os usuários criados no login: sem senha local
+                user.set_unusable_password()
+                novos.append(user)
+            elif any(getattr(user, campo) != valor for campo, valor in dados.items()):
+                for campo, valor in dados.items():
+                    setattr(user, campo, valor)
+                alterados.append(user)
+            por_dn[dn.lower()] = user
+            self.dns[dn.lower()] = dn
+
+        with transaction.atomic():
+            self.User.objects.bulk_create(novos, batch_size=self.tamanho_pagina)
+            self.User.objects.bulk_update(alterados, self.campos_usuario, batch_size=self.tamanho_pagina)
+        self.ids_por_dn.update((dn, user.pk) for dn, user in por_dn.items())
+        self.resultado.usuarios_criados += len(novos)
+        self.resultado.usuarios_atualizados += len(alterados)
+
+    def _espelhar(self, nome):
+        # Mesma regra do espelhamento do django_auth_ldap no login
+        excecoes = self.config.MIRROR_GROUPS_EXCEPT
+        if excecoes is not None:
+            return nome not in excecoes
+        espelhados = self.config.MIRROR_GROUPS
+        if isinstance(espelhados, (set, frozenset, list, tuple)):
+            return nome in espelhados
+        return bool(espelhados)
+
+    def grupos(self, usn=None, desde=None):
+        if not (self.config.MIRROR_GROUPS or self.config.MIRROR_GROUPS_EXCEPT is not None):
+            return
+        tipo = self.config.GROUP_TYPE
+        atributo_nome = getattr(tipo, 'name_attr', 'cn')
+        atributo_membros = getattr(tipo, 'member_attr', 'member')
+        for busca in _buscas(self.config.GROUP_SEARCH):
+            filtro = _filtro(busca.filterstr, usn, desde)
+            for pagina in buscar_paginado(self.conexao, busca.base_dn, busca.scope, filtro, [atributo_nome, atributo_membros], self.tamanho_pagina):
+                membros_por_grupo = {}
+                for _, atributos in pagina:
+                    nome = _primeiro(atributos, atributo_nome)
+                    if nome and self._espelhar(nome):
+                        membros_por_grupo[nome] = atributos.get(atributo_membros.lower(), [])
+                self.resultado.grupos_lidos += len(membros_por_grupo)
+                self._aplicar_grupos(membros_por_grupo)
+
+    def _resolver_membros(self, dns):
+        """Completa ids_por_dn com usuários que não vieram nesta execução (modo incremental)."""
+        faltando = [dn for dn in dict.fromkeys(dn.lower() for dn in dns) if dn not in self.ids_por_dn]
+        logins = {}
+        for busca in _buscas(self.config.USER_SEARCH):
+            for inicio in range(0, len(faltando), DNS_POR_BUSCA):
+                trecho = faltando[inicio:inicio + DNS_POR_BUSCA]
+                filtro = '(|' + ''.join(f'(distinguishedName={escape_filter_chars(dn)})' for dn in trecho) + ')'
+                for pagina in buscar_paginado(self.conexao, busca.base_dn, busca.scope, filtro, [ATRIBUTO_LOGIN], self.tamanho_pagina):
+                    for dn, atributos in pagina:
+                        logins[_primeiro(atributos, ATRIBUTO_LOGIN).lower()] = dn.lower()
+                        self.dns[dn.lower()] = dn
+        if logins:
+            encontrados = self.User.objects.annotate(login=Lower('username')).filter(login__in=list(logins))
+            for pk, login in encontrados.values_list('pk', 'login'):
+                self.ids_por_dn[logins[login]] = pk
+
+    def _aplicar_grupos(self, membros_por_grupo):
+        if not membros_por_grupo:
+            return
+        self._resolver_membros(dn for dns in membros_por_grupo.values() for dn in dns)
+
+        existentes = set(Group.objects.filter(name__in=membros_por_grupo).values_list('name', flat=True))
+        novos = [Group(name=nome) for nome in membros_por_grupo if nome not in existentes]
+        campo = f'{self.campo_usuario}_id'
+
+        with transaction.atomic():
+            Group.objects.bulk_create(novos, ignore_conflicts=True)
+            ids_grupos = dict(Group.objects.filter(name__in=membros_por_grupo).values_list('name', 'pk'))
+
+            desejados = set()
+            for nome, dns in membros_por_grupo.items():
+                for dn in dns:
+                    user_id = self.ids_por_dn.get(dn.lower())
+                    if user_id is None:
+                        self.resultado.membros_ignorados += 1
+                    else:
+                        desejados.add((user_id, ids_grupos[nome]))
+
+            # Só usuários vindos do AD (sem senha local) saem de grupos espelhados,
+            # como no login; contas locais continuam onde foram colocadas
+            atuais = self.Membro.objects.filter(group_id__in=ids_grupos.values())
+            atuais_ldap = set(
+                atuais.filter(**{f'{self.campo_usuario}__password__startswith': UNUSABLE_PASSWORD_PREFIX})
+                .values_list(campo, 'group_id')
+            )
+            incluir = desejados - set(atuais.values_list(campo, 'group_id'))
+            remover = atuais_ldap - desejados
+
+            self.Membro.objects.bulk_create(
+                [self.Membro(**{campo: user_id, 'group_id': grupo_id}) for user_id, grupo_id in incluir],
+                batch_size=self.tamanho_pagina, ignore_conflicts=True,
+            )
+            for grupo_id in {grupo_id for _, grupo_id in remover}:
+                self.Membro.objects.filter(
+                    group_id=grupo_id, **{f'{campo}__in': [user_id for user_id, g in remover if g == grupo_id]}
+                ).delete()
+
+        # bulk_create/delete não disparam m2m_changed: invalida papéis e caches aqui
+        afetados = {user_id for user_id, _ in incluir | remover}
+        for user_id in afetados:
+            invalidar_papeis_usuario(user_id)
+        descartar_cache_grupos(self.dns[dn] for dn, user_id in self.ids_por_dn.items() if user_id in afetados)
+        self.resultado.grupos_criados += len(novos)
+        self.resultado.inclusoes += len(incluir)
+        self.resultado.remocoes += len(remover)
+
+
+def sincronizar(completo=False, desde=None, tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Sincroniza usuários e depois grupos. Sem 'completo' nem 'desde', continua
+    da última execução registrada para o servidor (ou faz uma completa, se não houver).
+    """
+    backend = LDAPBackend()
+    config = backend.settings
+    estado, _ = SincronizacaoLDAP.objects.get_or_create(servidor=str(config.SERVER_URI)[:255])
+
+    usn = None
+    automatico = desde is None
+    if automatico and not completo:
+        if estado.usn is not None:
+            usn = estado.usn
+        else:
+            desde = estado.data
+
+    inicio = timezone.now()
+    conexao = abrir_conexao(backend)
+    try:
+        # Lido antes das buscas: o que mudar durante a execução entra na próxima
+        marca = usn_atual(conexao)
+        sincronizador = Sincronizador(conexao, config, tamanho_pagina)
+        sincronizador.resultado.incremental = usn is not None or desde is not None
+        sincronizador.usuarios(usn, desde)
+        sincronizador.grupos(usn, desde)
+    finally:
+        conexao.unbind_s()
+
+    # Um --desde manual não muda o ponto de parada da sincronização agendada
+    if automatico:
+        estado.usn = marca
+        estado.data = inicio
+        estado.save(update_fields=['usn', 'data'])
+    logger.info("Sincronização LDAP concluída", extra={'sincronizacao': vars(sincronizador.resultado)})
+    return sincronizador.resultado
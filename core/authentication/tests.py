@@ -1,3 +1,247 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
 
-# Create your tests here.
+import ldap
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+
+from .backends import LDAPBackendCache
+from .ldap_falso import BASE_USUARIOS, BIND_DN_SERVICO, SENHA_SERVICO, DiretorioFalso, configuracao
+from .models import SincronizacaoLDAP
+from .papeis import PapeisUsuario, versao_papeis
+from .pool import PoolLDAP, estatisticas_pools, fechar_pools
+from .sincronizacao import sincronizar
+
+
+class PapeisUsuarioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='tecnico', password='x')
+        self.cpd = Group.objects.create(name='CPD')
+        self.user.groups.add(self.cpd)
+        self.session = SessionStore()
+
+    def _papeis(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request.session = self.session
+        return PapeisUsuario(request)
+
+    def test_grupos_carregados_uma_vez_por_requisicao(self):
+        papeis = self._papeis()
+        with self.assertNumQueries(1):
+            self.assertTrue(papeis.is_tecnico)
+            self.assertFalse(papeis.is_ti)
+            self.assertFalse(papeis.is_diretoria)
+
+    def test_sessao_reaproveitada_entre_requisicoes(self):
+        self.assertTrue(self._papeis().is_tecnico)
+        with self.assertNumQueries(0):
+            self.assertTrue(self._papeis().is_tecnico)
+
+    def test_alteracao_de_grupos_invalida_sessao(self):
+        self.assertFalse(self._papeis().is_diretoria)
+        # Mesmo caminho usado pelo espelhamento de grupos do django_auth_ldap
+        self.user.groups.set([self.cpd, Group.objects.create(name='Diretoria')])
+        self.assertTrue(self._papeis().is_diretoria)
+
+    def test_alteracao_pelo_lado_do_grupo_invalida_sessao(self):
+        self.assertTrue(self._papeis().is_tecnico)
+        self.cpd.user_set.remove(self.user)
+        self.assertFalse(self._papeis().is_tecnico)
+
+    def test_renomear_grupo_invalida_sessao(self):
+        self.assertTrue(self._papeis().is_tecnico)
+        self.cpd.name = 'CPD antigo'
+        self.cpd.save()
+        self.assertFalse(self._papeis().is_tecnico)
+
+    def test_versao_descartada_pelo_cache_nao_revalida_sessao(self):
+        self.assertFalse(self._papeis().is_diretoria)
+        cache.clear()
+        self.user.groups.add(Group.objects.create(name='Diretoria'))
+        # O limite de entradas do cache descarta a versão depois da alteração
+        cache.clear()
+        self.assertTrue(self._papeis().is_diretoria)
+
+
+class CacheLDAPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.diretorio = DiretorioFalso()
+        self.diretorio.adicionar_grupo('CPD')
+        self.diretorio.adicionar_grupo('TI')
+        self.diretorio.adicionar_usuario('joao', 'senha', nome='João', grupos=['CPD'])
+        self.enterContext(override_settings(**configuracao(cache_timeout=3600)))
+        self.enterContext(self.diretorio.ativo())
+        self.addCleanup(fechar_pools)
+
+    def _login(self, senha='senha'):
+        return LDAPBackendCache().authenticate(None, username='joao', password=senha)
+
+    def test_login_cria_usuario_e_espelha_grupos(self):
+        user = self._login()
+        self.assertEqual(user.first_name, 'João')
+        self.assertEqual(user.email, 'joao@exemplo.local')
+        self.assertEqual(list(user.groups.values_list('name', flat=True)), ['CPD'])
+        self.assertIsNone(self._login(senha='errada'))
+
+    def test_segundo_login_so_faz_bind(self):
+        self._login()
+        self.diretorio.operacoes.clear()
+        self.assertIsNotNone(self._login())
+        # DN e grupos vêm do cache e a conexão vem do pool: só o bind do usuário
+        self.assertEqual(dict(self.diretorio.operacoes), {'bind': 1})
+
+    def test_permissoes_em_cache_e_invalidadas_pelo_grupo(self):
+        backend = LDAPBackendCache()
+        user = self._login()
+        permissao = Permission.objects.get(codename='view_group')
+        Group.objects.get(name='CPD').permissions.add(permissao)
+        self.assertEqual(backend.get_group_permissions(backend.get_user(user.pk)), {'auth.view_group'})
+
+        self.diretorio.operacoes.clear()
+        with self.assertNumQueries(1):  # só o carregamento do usuário
+            self.assertEqual(backend.get_group_permissions(backend.get_user(user.pk)), {'auth.view_group'})
+        self.assertFalse(self.diretorio.operacoes)
+
+        Group.objects.get(name='CPD').permissions.remove(permissao)
+        self.assertEqual(backend.get_group_permissions(backend.get_user(user.pk)), set())
+
+    def test_atualizar_cache_ldap_aplica_mudancas_do_ad(self):
+        self._login()
+        self.diretorio.incluir_no_grupo('joao', 'TI')
+        self.diretorio.alterar_usuario('joao', mail='joao.silva@exemplo.local')
+
+        call_command('atualizar_cache_ldap', usuario=['joao'], stdout=StringIO())
+
+        user = get_user_model().objects.get(username='joao')
+        self.assertEqual(user.email, 'joao.silva@exemplo.local')
+        self.assertEqual(sorted(user.groups.values_list('name', flat=True)), ['CPD', 'TI'])
+        # O cache foi renovado com os grupos novos: o login seguinte continua só com o bind
+        self.diretorio.operacoes.clear()
+        self.assertIsNotNone(self._login())
+        self.assertEqual(dict(self.diretorio.operacoes), {'bind': 1})
+        self.assertEqual(sorted(user.groups.values_list('name', flat=True)), ['CPD', 'TI'])
+
+
+class SincronizacaoLDAPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.diretorio = DiretorioFalso()
+        for grupo in ('CPD', 'TI', 'HelpDesk'):
+            self.diretorio.adicionar_grupo(grupo)
+        self.diretorio.adicionar_usuario('joao', 'senha', grupos=['CPD'])
+        self.diretorio.adicionar_usuario('maria', 'senha', grupos=['CPD', 'TI', 'HelpDesk'])
+        for indice in range(20):
+            self.diretorio.adicionar_usuario(f'usuario{indice}', 'senha')
+        self.enterContext(override_settings(**configuracao()))
+        self.enterContext(self.diretorio.ativo())
+
+    def _grupos(self, username):
+        return sorted(Group.objects.filter(user__username=username).values_list('name', flat=True))
+
+    def test_sincronizacao_completa_em_paginas(self):
+        resultado = sincronizar(tamanho_pagina=5)
+
+        self.assertFalse(resultado.incremental)
+        self.assertEqual((resultado.usuarios_criados, resultado.inclusoes), (22, 3))
+        self.assertEqual(get_user_model().objects.count(), 22)
+        self.assertFalse(get_user_model().objects.get(username='joao').has_usable_password())
+        self.assertEqual(self._grupos('maria'), ['CPD', 'TI'])
+        # HelpDesk está em AUTH_LDAP_MIRROR_GROUPS_EXCEPT
+        self.assertFalse(Group.objects.filter(name='HelpDesk').exists())
+        self.assertGreater(self.diretorio.operacoes['busca'], 5)
+
+    def test_incremental_le_so_o_que_mudou(self):
+        sincronizar()
+        admin = get_user_model().objects.create_user(username='admin', password='x')
+        admin.groups.add(Group.objects.get(name='TI'))
+        versao = versao_papeis(get_user_model().objects.get(username='maria').pk)
+
+        self.diretorio.alterar_usuario('joao', mail='joao.silva@exemplo.local')
+        self.diretorio.alterar_usuario('usuario1', userAccountControl='514')
+        self.diretorio.remover_do_grupo('maria', 'TI')
+        resultado = sincronizar()
+
+        self.assertTrue(resultado.incremental)
+        self.assertEqual((resultado.usuarios_lidos, resultado.grupos_lidos), (2, 1))
+        self.assertEqual(get_user_model().objects.get(username='joao').email, 'joao.silva@exemplo.local')
+        self.assertFalse(get_user_model().objects.get(username='usuario1').is_active)
+        self.assertEqual(self._grupos('maria'), ['CPD'])
+        self.assertNotEqual(versao_papeis(get_user_model().objects.get(username='maria').pk), versao)
+        # Conta local não é retirada de grupos espelhados
+        self.assertEqual(self._grupos('admin'), ['TI'])
+        self.assertEqual(SincronizacaoLDAP.objects.get().usn, self.diretorio.usn)
+
+    def test_incremental_resolve_membros_que_nao_mudaram(self):
+        sincronizar()
+        self.diretorio.incluir_no_grupo('usuario5', 'TI')
+        resultado = sincronizar()
+
+        self.assertEqual((resultado.usuarios_lidos, resultado.inclusoes, resultado.remocoes), (0, 1, 0))
+        self.assertEqual(self._grupos('usuario5'), ['TI'])
+
+
+class PoolLDAPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.diretorio = DiretorioFalso()
+        self.diretorio.adicionar_grupo('CPD')
+        self.diretorio.adicionar_usuario('joao', 'senha', grupos=['CPD'])
+        self.enterContext(override_settings(**configuracao()))
+        self.enterContext(self.diretorio.ativo())
+        self.addCleanup(fechar_pools)
+
+    def _login(self, senha='senha'):
+        return LDAPBackendCache().authenticate(None, username='joao', password=senha)
+
+    def test_logins_reaproveitam_conexoes(self):
+        for _ in range(3):
+            self.assertIsNotNone(self._login())
+        self.assertIsNone(self._login(senha='errada'))
+        # Uma conexão da conta de serviço e uma para o bind dos usuários
+        self.assertEqual(self.diretorio.operacoes['conexao'], 2)
+        self.assertEqual(self.diretorio.operacoes['bind'], 1 + 4)
+
+    def test_sem_pool_cada_login_abre_conexao(self):
+        with override_settings(LDAP_POOL_ATIVO=False):
+            self._login()
+            self._login()
+        self.assertEqual(self.diretorio.operacoes['conexao'], 2)
+
+    def test_conexao_derrubada_e_substituida(self):
+        self._login()
+        self.diretorio.derrubar_conexoes()
+        self.assertIsNotNone(self._login())
+        self.assertEqual(self.diretorio.operacoes['conexao'], 4)
+        self.assertIn('fechadas', next(iter(estatisticas_pools().values())))
+
+    def test_conexao_parada_e_verificada_antes_do_uso(self):
+        with override_settings(LDAP_POOL_VERIFICAR_APOS=0):
+            self._login()
+            self.diretorio.derrubar_conexoes()
+            self.assertIsNotNone(self._login())
+        self.assertGreaterEqual(self.diretorio.operacoes['whoami'], 2)
+
+    def test_limite_de_conexoes(self):
+        pool = PoolLDAP(lambda: self.diretorio.initialize('ldap://falso'), bind=(BIND_DN_SERVICO, SENHA_SERVICO), maximo=2, espera=0.01)
+        primeira, segunda = pool.emprestar(), pool.emprestar()
+        with self.assertRaises(ldap.TIMEOUT):
+            pool.emprestar()
+        pool.devolver(primeira)
+        self.assertIs(pool.emprestar(), primeira)
+        pool.devolver(segunda)
+
+    def test_uso_concorrente_respeita_o_maximo(self):
+        self.diretorio.latencia = 0.005
+        pool = PoolLDAP(lambda: self.diretorio.initialize('ldap://falso'), bind=(BIND_DN_SERVICO, SENHA_SERVICO), maximo=3)
+        buscar = lambda conexao: conexao.search_s(BASE_USUARIOS, ldap.SCOPE_SUBTREE, '(sAMAccountName=joao)')
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            resultados = list(executor.map(lambda _: pool.executar(buscar), range(40)))
+        self.assertTrue(all(len(resultado) == 1 for resultado in resultados))
+        self.assertLessEqual(pool.estatisticas['abertas'], 3)
@@ -11,7 +11,7 @@ def login_redirect_view(request):
     """
     Verifica o grupo do usuário e redireciona para o dashboard correto na app 'tickets'.
     """
-    if request.user.groups.filter(name='CPD').exists():
+    if request.papeis.is_tecnico:
         # Redireciona para a view 'dashboard_tecnico' DENTRO da app 'tickets'
         return redirect('tickets:dashboard_tecnico')
     else:
@@ -0,0 +1,122 @@
+# core/banco.py
+"""
+Configuração do banco de dados (DATABASES['default']) a partir de variáveis
+de ambiente.
+
+DB_ENGINE=sqlite (padrão) usa o arquivo DB_NAME (ou db.sqlite3 em BASE_DIR)
+com PRAGMAs aplicados a cada conexão nova: WAL (leituras não bloqueiam a
+escrita), synchronous=NORMAL, busy_timeout e mmap. Transações começam como
+IMMEDIATE, para que duas escritas concorrentes esperem a vez (busy_timeout)
+em vez de falhar com "database is locked" no meio da transação.
+
+DB_ENGINE=postgresql usa conexões persistentes (DB_CONN_MAX_AGE) com
+verificação antes do reuso, ou, com DB_POOL=True, o pool de conexões do
+psycopg 3 (Django 5.1+), que exige CONN_MAX_AGE = 0.
+
+Com DB_REPLICA_HOST (PostgreSQL) ou DB_REPLICA_NAME (SQLite) definido, uma
+réplica de leitura entra como o alias 'replica' (ver core/roteador.py).
+"""
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+# Tempo máximo (ms) que uma escrita espera pelo lock do SQLite
+SQLITE_ESPERA_PADRAO = 5000
+# Tamanho (bytes) do arquivo mapeado em memória para leituras
+SQLITE_MMAP_PADRAO = 128 * 1024 * 1024
+
+
+def _booleano(nome, padrao):
+    return os.getenv(nome, str(padrao)) == 'True'
+
+
+def pragmas_sqlite(espera=SQLITE_ESPERA_PADRAO, mmap=SQLITE_MMAP_PADRAO):
+    return [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA busy_timeout={espera}',
+        f'PRAGMA mmap_size={mmap}',
+        'PRAGMA temp_store=MEMORY',
+    ]
+
+
+def opcoes_sqlite(otimizado=True, espera=SQLITE_ESPERA_PADRAO, mmap=SQLITE_MMAP_PADRAO):
+    """OPTIONS do backend sqlite3; sem otimização, o modo padrão do SQLite (journal DELETE)."""
+    if not otimizado:
+        return {'init_command': 'PRAGMA journal_mode=DELETE'}
+    return {
+        'init_command': '; '.join(pragmas_sqlite(espera, mmap)),
+        'transaction_mode': 'IMMEDIATE',
+        # Espera do módulo sqlite3 (segundos), a mesma do busy_timeout
+        'timeout': espera / 1000,
+    }
+
+
+def configuracao_banco(base_dir):
+    motor = os.getenv('DB_ENGINE', 'sqlite').lower()
+
+    if motor == 'sqlite':
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME') or base_dir / 'db.sqlite3',
+            'OPTIONS': opcoes_sqlite(
+                otimizado=_booleano('DB_SQLITE_OTIMIZADO', True),
+                espera=int(os.getenv('DB_SQLITE_ESPERA', SQLITE_ESPERA_PADRAO)),
+                mmap=int(os.getenv('DB_SQLITE_MMAP', SQLITE_MMAP_PADRAO)),
+            ),
+        }
+
+    if motor == 'postgresql':
+        opcoes = {}
+        tempo_conexao = int(os.getenv('DB_CONN_MAX_AGE', 60))
+        if _booleano('DB_POOL', False):
+            # O pool do psycopg substitui as conexões persistentes do Django
+            tempo_conexao = 0
+            opcoes['pool'] = {
+                'min_size': int(os.getenv('DB_POOL_MINIMO', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAXIMO', 10)),
+                'timeout': int(os.getenv('DB_POOL_ESPERA', 10)),
+            }
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'chamados'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', ''),
+            'CONN_MAX_AGE': tempo_conexao,
+            # Confere a conexão persistente antes de reaproveitá-la numa requisição nova
+            'CONN_HEALTH_CHECKS': _booleano('DB_CONN_HEALTH_CHECKS', True),
+            'OPTIONS': opcoes,
+        }
+
+    raise ImproperlyConfigured(f"DB_ENGINE '{motor}' não suportado (use 'sqlite' ou 'postgresql').")
+
+
+def configuracao_replica(principal):
+    """Alias 'replica' com as mesmas configurações do principal, ou None se não houver réplica."""
+    if principal['ENGINE'] == 'django.db.backends.sqlite3':
+        nome = os.getenv('DB_REPLICA_NAME')
+        if not nome:
+            return None
+        espera = int(os.getenv('DB_SQLITE_ESPERA', SQLITE_ESPERA_PADRAO))
+        mmap = int(os.getenv('DB_SQLITE_MMAP', SQLITE_MMAP_PADRAO))
+        return {
+            'ENGINE': principal['ENGINE'],
+            # Somente leitura: sem o arquivo, a conexão falha e as leituras voltam ao principal
+            'NAME': f'file:{nome}?mode=ro',
+            'OPTIONS': {'init_command': f'PRAGMA busy_timeout={espera}; PRAGMA mmap_size={mmap}'},
+            'TEST': {'MIRROR': 'default'},
+        }
+
+    host = os.getenv('DB_REPLICA_HOST')
+    if not host:
+        return None
+    replica = copy.deepcopy(principal)
+    replica.update({
+        'HOST': host,
+        'PORT': os.getenv('DB_REPLICA_PORT', principal['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    })
+    return replica
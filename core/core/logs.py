@@ -0,0 +1,153 @@
+# core/logs.py
+"""
+Logging estruturado (JSON) e assíncrono.
+
+As views só enfileiram o registro (ManipuladorFila); a formatação em JSON e a
+escrita acontecem numa thread separada (QueueListener). Cada linha leva o
+request_id da requisição em andamento, definido pelo RequestIdMiddleware.
+A configuração fica em LOGGING, no settings.py.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+
+request_id = contextvars.ContextVar('request_id', default='-')
+
+CABECALHO_REQUEST_ID = 'X-Request-ID'
+# Aceita o id de um proxy/balanceador só se for "bem-comportado"
+FORMATO_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Atributos padrão de LogRecord; o resto veio de extra={...} e vai para o JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'request_id'}
+
+
+def niveis_por_logger(texto):
+    """
+    Converte 'django_auth_ldap=WARNING,tickets=DEBUG' na seção 'loggers' do
+    LOGGING, para ajustar níveis por variável de ambiente.
+    """
+    loggers = {}
+    for item in filter(None, (parte.strip() for parte in texto.split(','))):
+        nome, _, nivel = item.partition('=')
+        loggers[nome.strip()] = {'level': nivel.strip().upper() or 'INFO'}
+    return loggers
+
+
+class FiltroRequisicao(logging.Filter):
+    """Anota o registro com o request_id (roda na thread da requisição)."""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        dados = {
+            'data': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        if record.exc_info:
+            dados['excecao'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            dados['excecao'] = record.exc_text
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO and not chave.startswith('_'):
+                dados[chave] = valor
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class ManipuladorFila(logging.handlers.QueueHandler):
+    """
+    Enfileira os registros para uma thread de escrita. O formatador
+    configurado é aplicado pelo handler de destino, já fora da requisição.
+    Com a fila cheia o registro é descartado (e contado) em vez de bloquear.
+
+    A thread é iniciada no primeiro registro de cada processo: um servidor que
+    carrega a aplicação e depois faz fork dos workers (ex.: gunicorn --preload)
+    passa o handler aos filhos, mas não a thread.
+    """
+
+    def __init__(self, arquivo=None, tamanho_fila=10000):
+        super().__init__(queue.Queue(tamanho_fila))
+        self.descartados = 0
+        if arquivo:
+            self.destino = logging.handlers.WatchedFileHandler(arquivo, encoding='utf-8')
+        else:
+            self.destino = logging.StreamHandler(sys.stderr)
+        self.listener = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def _iniciar(self):
+        # Chamado com self.lock (Handler.handle), uma vez por processo
+        if self.listener is not None:
+            # Herdados do processo pai: a thread não existe neste processo e a
+            # fila pode ter sido copiada no meio de uma operação
+            self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = logging.handlers.QueueListener(self.queue, self.destino, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def setFormatter(self, fmt):
+        # O formatador (ex.: JSON) é usado na thread de escrita, não aqui
+        self.destino.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Só resolve a mensagem e copia o registro; a formatação fica para o destino
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._iniciar()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def close(self):
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+        self.listener = None
+        self.destino.close()
+        super().close()
+
+
+class RequestIdMiddleware:
+    """
+    Define o request_id da requisição (o do cabeçalho X-Request-ID, quando
+    válido, ou um novo) para os logs, e o devolve no mesmo cabeçalho da resposta.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recebido = request.headers.get(CABECALHO_REQUEST_ID, '')
+        identificador = recebido if FORMATO_REQUEST_ID.match(recebido) else uuid.uuid4().hex
+        request.request_id = identificador
+        token = request_id.set(identificador)
+        try:
+            resposta = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        resposta[CABECALHO_REQUEST_ID] = identificador
+        return resposta
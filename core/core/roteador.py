@@ -0,0 +1,161 @@
+# core/roteador.py
+"""
+Leituras numa réplica do banco (alias 'replica' em DATABASES).
+
+Só as leituras marcadas com leitura_replica() (as listagens e painéis, que
+toleram alguns segundos de atraso) vão para a réplica; todo o resto, e
+qualquer escrita, usa o banco principal. Para o usuário ver o que acabou de
+gravar, depois de uma escrita as leituras dele ficam no principal por
+DB_REPLICA_FIXAR segundos (cookie definido pelo ReplicaMiddleware). Se a
+réplica não conectar, ou a conexão cair no meio de uma leitura, as leituras
+voltam ao principal por DB_REPLICA_PAUSA segundos antes de tentar de novo.
+"""
+import contextvars
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA = 'replica'
+COOKIE_PRINCIPAL = 'ler_principal'
+FIXAR_PADRAO = 5
+PAUSA_PADRAO = 30
+
+_leitura_replica = contextvars.ContextVar('leitura_replica', default=False)
+# Nesta requisição as leituras devem ir ao principal (houve escrita, agora ou há pouco)
+_fixado = contextvars.ContextVar('fixado_no_principal', default=False)
+_escreveu = contextvars.ContextVar('escreveu', default=False)
+
+_indisponivel_ate = 0.0
+_lock = threading.Lock()
+
+
+class leitura_replica:
+    """
+    Envia para a réplica as leituras feitas dentro do bloco (também funciona
+    como decorador). Se a conexão com a réplica cair no meio do bloco, a
+    réplica entra em pausa e o erro é propagado; como decorador (views só de
+    leitura), a view é executada de novo, lendo do principal.
+    """
+
+    def __enter__(self):
+        self._token = _leitura_replica.set(True)
+
+    def __exit__(self, tipo, erro, rastro):
+        _leitura_replica.reset(self._token)
+        if isinstance(erro, DatabaseError):
+            self.replica_falhou = _descartar_replica_com_erro()
+        return False
+
+    def __call__(self, funcao):
+        @wraps(funcao)
+        def interna(*args, **kwargs):
+            bloco = leitura_replica()
+            try:
+                with bloco:
+                    return funcao(*args, **kwargs)
+            except DatabaseError:
+                if not getattr(bloco, 'replica_falhou', False):
+                    raise
+            return funcao(*args, **kwargs)
+        return interna
+
+
+def _pausar_replica():
+    global _indisponivel_ate
+    pausa = getattr(settings, 'DB_REPLICA_PAUSA', PAUSA_PADRAO)
+    with _lock:
+        _indisponivel_ate = time.monotonic() + pausa
+    logger.warning("Réplica do banco indisponível; lendo do principal por %s s.", pausa, exc_info=True)
+
+
+def _descartar_replica_com_erro():
+    """Fecha a conexão com a réplica se ela falhou e não responde mais; devolve se fechou."""
+    if REPLICA not in settings.DATABASES:
+        return False
+    conexao = connections[REPLICA]
+    if conexao.connection is None or not conexao.errors_occurred or conexao.is_usable():
+        return False
+    conexao.close()
+    _pausar_replica()
+    return True
+
+
+def _replica_disponivel():
+    if time.monotonic() < _indisponivel_ate:
+        return False
+    conexao = connections[REPLICA]
+    if conexao.connection is not None:
+        return True
+    try:
+        conexao.ensure_connection()
+        return True
+    except DatabaseError:
+        _pausar_replica()
+        return False
+
+
+def reativar_replica():
+    global _indisponivel_ate
+    with _lock:
+        _indisponivel_ate = 0.0
+
+
+class RoteadorReplica:
+    def db_for_read(self, model, **hints):
+        if REPLICA not in settings.DATABASES or not _leitura_replica.get():
+            return DEFAULT_DB_ALIAS
+        if _fixado.get() or _escreveu.get():
+            return DEFAULT_DB_ALIAS
+        # Dentro de uma transação no principal, ler da réplica veria um estado diferente
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA if _replica_disponivel() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _escreveu.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Os dois aliases têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # A réplica recebe o esquema do principal (replicação), não do migrate
+        if db == REPLICA:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Depois de uma requisição que grava, fixa o usuário no banco principal por
+    alguns segundos (o atraso da réplica), via cookie, para valer também nas
+    requisições atendidas por outros processos.
+
+    Deve vir depois do SessionMiddleware: a gravação da sessão (ex.: os papéis
+    guardados por PapeisUsuario) acontece na volta dele e não conta como
+    escrita, pois não muda nada que as leituras da réplica mostram.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        fixado = _fixado.set(COOKIE_PRINCIPAL in request.COOKIES)
+        escreveu = _escreveu.set(False)
+        try:
+            resposta = self.get_response(request)
+            gravou = _escreveu.get()
+        finally:
+            _fixado.reset(fixado)
+            _escreveu.reset(escreveu)
+        if gravou:
+            tempo = getattr(settings, 'DB_REPLICA_FIXAR', FIXAR_PADRAO)
+            resposta.set_cookie(COOKIE_PRINCIPAL, '1', max_age=tempo, httponly=True, samesite='Lax')
+        return resposta
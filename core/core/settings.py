@@ -28,11 +28,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.logs.RequestIdMiddleware',
+    'tickets.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    # Depois do SessionMiddleware: gravar a sessão não fixa o usuário no principal
+    'core.roteador.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'authentication.middleware.PapeisMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -58,14 +63,51 @@ WSGI_APPLICATION = 'core.wsgi.application'
 
 
 # Database
+# Definido por variáveis de ambiente (DB_ENGINE, DB_NAME, ...); ver core/banco.py.
+# Sem nenhuma, usa o db.sqlite3 local com WAL e busy_timeout.
+from core.banco import configuracao_banco, configuracao_replica
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': configuracao_banco(BASE_DIR),
 }
 
+# Réplica de leitura opcional (DB_REPLICA_HOST ou DB_REPLICA_NAME), usada só
+# pelas listagens e painéis; ver core/roteador.py
+_replica = configuracao_replica(DATABASES['default'])
+if _replica:
+    DATABASES['replica'] = _replica
+
+DATABASE_ROUTERS = ['core.roteador.RoteadorReplica']
+
+# Depois de gravar, o usuário lê do principal por este tempo (atraso da réplica)
+DB_REPLICA_FIXAR = int(os.getenv('DB_REPLICA_FIXAR', 5))
+# Com a réplica fora do ar, as leituras ficam no principal por este tempo
+DB_REPLICA_PAUSA = int(os.getenv('DB_REPLICA_PAUSA', 30))
+
+
+# Cache
+# Guarda as versões que invalidam cópias em outros processos (papéis na sessão,
+# regras de prioridade, tipos de ação), a contagem por status e os dados do
+# LDAP. Com vários processos (gunicorn/uvicorn com workers) precisa ser
+# compartilhado: defina REDIS_URL (ex.: redis://servidor.redis:6379/1). Sem
+# ela, cada processo tem o seu cache em memória, o que só serve para um
+# processo (ex.: runserver).
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
 
 # Password validation
 
@@ -110,12 +152,12 @@ from django_auth_ldap.config import LDAPSearch, ActiveDirectoryGroupType
 
 # 1. BACKENDS DE AUTENTICAÇÃO
 AUTHENTICATION_BACKENDS = [
-    'django_auth_ldap.backend.LDAPBackend',
+    'authentication.backends.LDAPBackendCache',
     'django.contrib.auth.backends.ModelBackend',
 ]
 
 # 2. CONFIGURAÇÃO DA CONEXÃO LDAP
-AUTH_LDAP_SERVER_URI = os.getenv('LDAP_SERVER_URI'),
+AUTH_LDAP_SERVER_URI = os.getenv('LDAP_SERVER_URI')
 AUTH_LDAP_BIND_DN =  os.getenv('BIND_DN')
 AUTH_LDAP_BIND_PASSWORD = os.getenv('BIND_PASSWORD')
 
@@ -175,10 +217,69 @@ AUTH_LDAP_MIRROR_GROUPS_EXCEPT = [
     'HelpDesk',
 ]
 
-# 5. CONFIGURAÇÃO DE LOGGING PARA DEPURAÇÃO
-import logging
-logging.basicConfig(level=logging.DEBUG)
-logging.getLogger('django_auth_ldap').setLevel(logging.DEBUG)
+# Cache do DN e dos grupos de cada usuário (em segundos). Com ele, o login
+# faz só o bind com a senha do usuário, sem buscas no AD.
+AUTH_LDAP_CACHE_TIMEOUT = int(os.getenv('LDAP_CACHE_TIMEOUT', 3600))
+
+# Atributos (nome, e-mail) são atualizados pelo comando atualizar_cache_ldap,
+# que deve ser agendado (ex.: cron a cada 15 minutos), e não a cada login.
+# No primeiro login o usuário é sempre preenchido.
+AUTH_LDAP_ALWAYS_UPDATE_USER = os.getenv('LDAP_ATUALIZAR_NO_LOGIN', 'False') == 'True'
+
+# Tempo (em segundos) que o conjunto de permissões de cada usuário fica em cache
+LDAP_CACHE_PERMISSOES = int(os.getenv('LDAP_CACHE_PERMISSOES', 300))
+
+# Pool de conexões com o AD, por processo (authentication/pool.py): conexões
+# já abertas (TLS) e autenticadas com a conta de serviço, reaproveitadas entre logins
+LDAP_POOL_ATIVO = os.getenv('LDAP_POOL_ATIVO', 'True') == 'True'
+LDAP_POOL_MAXIMO = int(os.getenv('LDAP_POOL_MAXIMO', 10))
+# Conexões paradas há mais tempo que isso (segundos) são fechadas
+LDAP_POOL_OCIOSO = int(os.getenv('LDAP_POOL_OCIOSO', 300))
+# Conexões paradas há mais tempo que isso são testadas (whoami) antes do uso
+LDAP_POOL_VERIFICAR_APOS = int(os.getenv('LDAP_POOL_VERIFICAR_APOS', 30))
+# Tempo máximo de espera por uma conexão com o pool cheio
+LDAP_POOL_ESPERA = int(os.getenv('LDAP_POOL_ESPERA', 5))
+
+# 5. CONFIGURAÇÃO DE LOGGING
+# Logs em JSON, escritos por uma thread separada (a requisição só enfileira).
+# LOG_NIVEL é o nível geral; LOG_NIVEIS ajusta loggers específicos, por exemplo
+# LOG_NIVEIS="django_auth_ldap=DEBUG" para depurar o login no AD.
+# LOG_ARQUIVO grava num arquivo em vez do stderr.
+from core.logs import niveis_por_logger
+
+LOG_NIVEL = os.getenv('LOG_NIVEL', 'INFO').upper()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'requisicao': {'()': 'core.logs.FiltroRequisicao'},
+    },
+    'formatters': {
+        'json': {'()': 'core.logs.FormatoJSON'},
+    },
+    'handlers': {
+        'fila': {
+            '()': 'core.logs.ManipuladorFila',
+            'arquivo': os.getenv('LOG_ARQUIVO') or None,
+            'formatter': 'json',
+            'filters': ['requisicao'],
+        },
+    },
+    'root': {
+        'handlers': ['fila'],
+        'level': LOG_NIVEL,
+    },
+    'loggers': {
+        # Sem o handler de console padrão do Django: tudo sai em JSON pela raiz
+        'django': {'handlers': [], 'propagate': True},
+        # Padrões silenciosos para os loggers mais verbosos
+        'django_auth_ldap': {'level': 'WARNING'},
+        'django.db.backends': {'level': 'WARNING'},
+        'asyncio': {'level': 'WARNING'},
+        **niveis_por_logger(os.getenv('LOG_NIVEIS', '')),
+    },
+}
 
 # CONFIGURAÇÃO DO JAZZMIN
 
@@ -193,4 +294,49 @@ JAZZMIN_SETTINGS = {
         {"app": "tickets", "name": "Chamados"},
     ],
     "theme": "darkly", # Existem muitos temas, 'darkly' é um tema escuro
-}
\ No newline at end of file
+}
+
+# CONFIGURAÇÕES DO SISTEMA DE CHAMADOS
+
+# Quantidade de chamados por página nas listagens (lista e histórico)
+TICKETS_ITENS_POR_PAGINA = int(os.getenv('TICKETS_ITENS_POR_PAGINA', 25))
+
+# Tempo (em segundos) que a contagem de chamados por status do admin fica em cache
+TICKETS_CACHE_ESTATISTICAS = int(os.getenv('TICKETS_CACHE_ESTATISTICAS', 60))
+
+# Tempo (em segundos) dos fragmentos da página de detalhe do chamado em cache.
+# A chave inclui a versão do chamado; o tempo só limita o atraso de mudanças
+# de fora do chamado (ex.: nome ou setor do solicitante)
+TICKETS_CACHE_FRAGMENTOS = int(os.getenv('TICKETS_CACHE_FRAGMENTOS', 600))
+
+# Comentários mostrados de início na página de detalhe; os anteriores são
+# carregados sob demanda (tickets:comentarios)
+TICKETS_COMENTARIOS_POR_PAGINA = int(os.getenv('TICKETS_COMENTARIOS_POR_PAGINA', 20))
+
+# Backend do broker que envia os eventos da fila ao painel do técnico (SSE).
+# O padrão funciona dentro de um único processo ASGI.
+TICKETS_BROKER_BACKEND = os.getenv('TICKETS_BROKER_BACKEND', 'tickets.broker.BrokerMemoria')
+
+# Métricas por view (latência, consultas SQL) coletadas pelo MetricasMiddleware
+TICKETS_METRICAS_ATIVAS = os.getenv('TICKETS_METRICAS_ATIVAS', 'True') == 'True'
+
+# Token para o Prometheus ler /admin/metricas/prometheus/ sem sessão de staff
+# (cabeçalho "Authorization: Bearer <token>"). Vazio: só usuários staff.
+TICKETS_METRICAS_TOKEN = os.getenv('TICKETS_METRICAS_TOKEN', '')
+
+# Distribuição automática dos chamados novos aos técnicos habilitados na
+# subcategoria (Admin → Habilidades), até LIMITE chamados ativos por técnico.
+# O estado em memória é remontado do banco a cada RECARGA segundos.
+TICKETS_ROTEAMENTO_AUTOMATICO = os.getenv('TICKETS_ROTEAMENTO_AUTOMATICO', 'True') == 'True'
+TICKETS_ROTEAMENTO_LIMITE = int(os.getenv('TICKETS_ROTEAMENTO_LIMITE', 5))
+TICKETS_ROTEAMENTO_RECARGA = int(os.getenv('TICKETS_ROTEAMENTO_RECARGA', 300))
+
+# Ordem da fila do painel do técnico: cada prioridade adianta o chamado em
+# AVANCO minutos e a espera envelhece todos no mesmo ritmo (ver tickets/fila.py).
+# Depois de mudar os avanços, rode "python manage.py recalcular_fila".
+TICKETS_FILA_AVANCO = {
+    'ALTA': int(os.getenv('TICKETS_FILA_AVANCO_ALTA', 240)),
+    'MEDIA': int(os.getenv('TICKETS_FILA_AVANCO_MEDIA', 60)),
+    'BAIXA': int(os.getenv('TICKETS_FILA_AVANCO_BAIXA', 0)),
+}
+TICKETS_FILA_TAMANHO = int(os.getenv('TICKETS_FILA_TAMANHO', 50))
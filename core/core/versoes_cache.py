@@ -0,0 +1,36 @@
+# core/versoes_cache.py
+"""
+Contadores de versão no cache (CACHES['default']), usados para invalidar
+cópias guardadas em outro lugar (sessão, memória de cada processo): quem
+guarda a cópia anota a versão, e incrementar a versão descarta todas as
+cópias de uma vez, em todos os processos que usam o mesmo cache.
+
+Uma chave que ainda não existe, ou que o cache descartou (expiração, limite
+de entradas), começa num valor novo (o relógio em nanossegundos) e não em
+zero, para que uma cópia anotada com uma versão antiga não volte a valer.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def ler_versoes(chaves):
+    versoes = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in versoes:
+            # add() não sobrescreve o valor que outro processo acabou de gravar
+            cache.add(chave, time.time_ns(), None)
+            versoes[chave] = cache.get(chave)
+    return versoes
+
+
+def ler_versao(chave):
+    return ler_versoes([chave])[chave]
+
+
+def incrementar_versao(chave):
+    try:
+        cache.incr(chave)
+    except ValueError:
+        # A chave não existe: qualquer valor novo já difere do anotado nas cópias
+        cache.add(chave, time.time_ns(), None)
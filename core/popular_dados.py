@@ -1,6 +1,9 @@
 # popular_dados.py
 import json
-from tickets.models import Categoria, Subcategoria, TipoAcao
+from django.contrib.auth.models import Group
+from authentication.papeis import GRUPO_DIRETORIA
+from tickets.models import Categoria, Chamado, RegraPrioridade, Subcategoria, TipoAcao
+from tickets.eventos import ACOES_PADRAO
 
 print("A iniciar a importação de dados...")
 
@@ -26,14 +29,8 @@ except Exception as e:
 
 # 2. Popular Tipos de Ação
 ACOES_INICIAIS = [
-    {'nome': 'CRIACAO', 'nome_exibicao': 'Chamado criado'},
-    {'nome': 'ACEITE', 'nome_exibicao': 'Técnico aceitou o chamado'},
-    {'nome': 'COMENTARIO', 'nome_exibicao': 'Técnico adicionou um comentário'},
-    {'nome': 'STATUS_UPDATE', 'nome_exibicao': 'Técnico alterou o status'},
-    {'nome': 'RESOLUCAO', 'nome_exibicao': 'Técnico resolveu o chamado'},
-    {'nome': 'FECHAMENTO_USUARIO', 'nome_exibicao': 'Usuário avaliou e fechou o chamado'},
-    {'nome': 'ANEXOU_ARQUIVO', 'nome_exibicao': 'Usuário anexou um arquivo'},
-    
+    {'nome': nome, 'nome_exibicao': nome_exibicao}
+    for nome, nome_exibicao in ACOES_PADRAO.items()
 ]
 
 for acao in ACOES_INICIAIS:
@@ -41,4 +38,20 @@ for acao in ACOES_INICIAIS:
     if created: print(f"- Tipo de Ação criado: {acao['nome_exibicao']}")
 print("Tipos de Ação populados com sucesso.")
 
+
+# 3. Regras de prioridade iniciais (editáveis em Admin → Regras de prioridade)
+diretoria, _ = Group.objects.get_or_create(name=GRUPO_DIRETORIA)
+regra, created = RegraPrioridade.objects.get_or_create(
+    nome='Solicitante da Diretoria', defaults={'prioridade': Chamado.Prioridade.ALTA, 'grupo': diretoria},
+)
+if created: print(f"- Regra de prioridade criada: {regra.nome}")
+
+parada_geral = Categoria.objects.filter(nome='Parada Geral').first()
+if parada_geral:
+    regra, created = RegraPrioridade.objects.get_or_create(
+        nome='Parada Geral', defaults={'prioridade': Chamado.Prioridade.ALTA, 'categoria': parada_geral},
+    )
+    if created: print(f"- Regra de prioridade criada: {regra.nome}")
+print("Regras de prioridade populadas com sucesso.")
+
 print("\nImportação de dados concluída!")
\ No newline at end of file
@@ -1,27 +1,100 @@
+from django.conf import settings
 from django.contrib import admin
+from django.http import HttpResponse, HttpResponseForbidden
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
 from django.contrib.auth.admin import UserAdmin, GroupAdmin
 from django.contrib.auth.models import Group
 
 # Importe os modelos da sua aplicação de autenticação e de tickets
 from authentication.models import Usuario
-from .models import Categoria, Subcategoria, Chamado, Comentario, Anexo, LogTecnico, TipoAcao
+from core.roteador import leitura_replica
+from .models import Categoria, Subcategoria, Chamado, Comentario, Anexo, Habilidade, Incidente, LogTecnico, RegraPrioridade, TipoAcao
+from .estatisticas import contagem_por_status
+from .metricas import formato_prometheus, metricas
+from .relatorios import relatorio
 
 # --- Admin Site Personalizado ---
 class CustomAdminSite(admin.AdminSite):
     def index(self, request, extra_context=None):
-        chamados_abertos = Chamado.objects.filter(status=Chamado.Status.ABERTO).count()
-        chamados_em_atendimento = Chamado.objects.filter(status=Chamado.Status.EM_ATENDIMENTO).count()
-        chamados_concluidos = Chamado.objects.filter(status=Chamado.Status.CONCLUIDO).count()
-        chamados_fechados = Chamado.objects.filter(status=Chamado.Status.FECHADO).count()
+        # Uma única consulta (em cache) com a contagem de todos os status, na réplica se houver
+        with leitura_replica():
+            contagem = contagem_por_status()
         extra_context = extra_context or {}
         extra_context['stats'] = {
-            'abertos': chamados_abertos,
-            'em_atendimento': chamados_em_atendimento,
-            'concluidos': chamados_concluidos,
-            'fechados': chamados_fechados,
+            'abertos': contagem[Chamado.Status.ABERTO],
+            'em_atendimento': contagem[Chamado.Status.EM_ATENDIMENTO],
+            'concluidos': contagem[Chamado.Status.CONCLUIDO],
+            'fechados': contagem[Chamado.Status.FECHADO],
+            'por_status': [(rotulo, contagem[status]) for status, rotulo in Chamado.Status.choices],
         }
         return super().index(request, extra_context=extra_context)
 
+    def get_urls(self):
+        urls = [
+            path('metricas/', self.admin_view(self.metricas_view), name='metricas'),
+            path('metricas/prometheus/', never_cache(self.metricas_prometheus_view), name='metricas_prometheus'),
+            path('relatorios/', self.admin_view(self.relatorios_view), name='relatorios'),
+        ]
+        return urls + super().get_urls()
+
+    def metricas_view(self, request):
+        # Página só para staff (admin_view) com as métricas por view deste processo
+        if request.method == 'POST' and 'zerar' in request.POST:
+            metricas.zerar()
+            return redirect('myadmin:metricas')
+
+        linhas = []
+        for view, estatistica in metricas.instantaneo().items():
+            linhas.append({
+                'view': view,
+                'estatistica': estatistica,
+                'p50_ms': estatistica.percentil(50) * 1000,
+                'p95_ms': estatistica.percentil(95) * 1000,
+                'p99_ms': estatistica.percentil(99) * 1000,
+                'media_ms': estatistica.media_latencia * 1000,
+                'tempo_bd_ms': estatistica.tempo_bd * 1000 / estatistica.requisicoes,
+            })
+        # As views mais lentas primeiro
+        linhas.sort(key=lambda linha: linha['p95_ms'], reverse=True)
+        context = {
+            **self.each_context(request),
+            'title': 'Métricas por view',
+            'linhas': linhas,
+            'inicio': metricas.inicio,
+        }
+        return TemplateResponse(request, 'admin/metricas.html', context)
+
+    def relatorios_view(self, request):
+        # Lê só os resumos mensais (ResumoMensal), nunca o histórico de chamados e logs
+        agrupamento = 'categoria' if request.GET.get('por') == 'categoria' else 'tecnico'
+        try:
+            meses = max(1, min(int(request.GET.get('meses', 12)), 36))
+        except ValueError:
+            meses = 12
+        with leitura_replica():
+            dados = relatorio(agrupamento, meses)
+        context = {
+            **self.each_context(request),
+            'title': 'Relatórios de SLA e desempenho',
+            'agrupamento': agrupamento,
+            'meses': meses,
+            **dados,
+        }
+        return TemplateResponse(request, 'admin/relatorios.html', context)
+
+    def metricas_prometheus_view(self, request):
+        token = getattr(settings, 'TICKETS_METRICAS_TOKEN', '')
+        autorizado = self.has_permission(request) or (
+            token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+        )
+        if not autorizado:
+            return HttpResponseForbidden("Acesso negado.")
+        return HttpResponse(formato_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 custom_admin_site = CustomAdminSite(name='myadmin')
 
 
@@ -41,6 +114,20 @@ class LogTecnicoInline(admin.TabularInline):
 class ChamadoAdmin(admin.ModelAdmin):
     inlines = [LogTecnicoInline]
 
+class HabilidadeAdmin(admin.ModelAdmin):
+    list_display = ('tecnico', 'subcategoria')
+    list_filter = ('subcategoria__categoria',)
+    list_select_related = ('tecnico', 'subcategoria__categoria')
+
+class RegraPrioridadeAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'prioridade', 'grupo', 'categoria', 'subcategoria', 'palavras_chave', 'ativa')
+    list_filter = ('prioridade', 'ativa')
+    list_select_related = ('grupo', 'categoria', 'subcategoria__categoria')
+
+class IncidenteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'titulo', 'tecnico', 'status', 'data_abertura')
+    list_filter = ('status',)
+
 # --- Modelos da App 'authentication' ---
 custom_admin_site.register(Usuario, CustomUserAdmin)
 
@@ -51,7 +138,10 @@ custom_admin_site.register(Group, GroupAdmin) # <-- REGISTA OS GRUPOS
 custom_admin_site.register(Categoria)
 custom_admin_site.register(Subcategoria)
 custom_admin_site.register(Chamado, ChamadoAdmin)
+custom_admin_site.register(Incidente, IncidenteAdmin)
 custom_admin_site.register(Comentario)
 custom_admin_site.register(Anexo)
 custom_admin_site.register(TipoAcao)
+custom_admin_site.register(Habilidade, HabilidadeAdmin)
+custom_admin_site.register(RegraPrioridade, RegraPrioridadeAdmin)
 # LogTecnico não precisa ser registrado aqui pois já é um inline em ChamadoAdmin
\ No newline at end of file
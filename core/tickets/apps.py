@@ -4,3 +4,46 @@ from django.apps import AppConfig
 class TicketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tickets'
+
+    def ready(self):
+        from django.contrib.auth.models import Group
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from .estatisticas import invalidar_estatisticas
+        from .eventos import invalidar_tipos_acao
+        from .fila import preencher_fila
+        from .models import Chamado, Habilidade, RegraPrioridade, TipoAcao
+        from .prioridades import invalidar_regras
+        from .roteamento import invalidar_roteamento, registrar_transicao
+        from .transicoes import transicao_aplicada
+        from . import busca, versoes
+
+        # Qualquer gravação de chamado pode mudar a contagem por status
+        post_save.connect(invalidar_estatisticas, sender=Chamado, dispatch_uid='estatisticas_chamado_salvo')
+        post_delete.connect(invalidar_estatisticas, sender=Chamado, dispatch_uid='estatisticas_chamado_apagado')
+
+        # Edições de TipoAcao (ex.: pelo admin) descartam o cache de tipos de ação
+        post_save.connect(invalidar_tipos_acao, sender=TipoAcao, dispatch_uid='tipos_acao_salvo')
+        post_delete.connect(invalidar_tipos_acao, sender=TipoAcao, dispatch_uid='tipos_acao_apagado')
+
+        # Regras de prioridade: edições pelo admin (e grupos renomeados ou
+        # apagados) fazem cada processo recompilar as regras
+        post_save.connect(invalidar_regras, sender=RegraPrioridade, dispatch_uid='regras_prioridade_salva')
+        post_delete.connect(invalidar_regras, sender=RegraPrioridade, dispatch_uid='regras_prioridade_apagada')
+        post_save.connect(invalidar_regras, sender=Group, dispatch_uid='regras_prioridade_grupo_salvo')
+        post_delete.connect(invalidar_regras, sender=Group, dispatch_uid='regras_prioridade_grupo_apagado')
+
+        # Distribuição automática: a carga dos técnicos acompanha as transições,
+        # e edições de Habilidade remontam o estado em memória
+        transicao_aplicada.connect(registrar_transicao, dispatch_uid='roteamento_transicao')
+        post_save.connect(invalidar_roteamento, sender=Habilidade, dispatch_uid='roteamento_habilidade_salva')
+        post_delete.connect(invalidar_roteamento, sender=Habilidade, dispatch_uid='roteamento_habilidade_apagada')
+
+        # Posição na fila dos chamados gravados antes da coluna data_fila
+        post_migrate.connect(preencher_fila, dispatch_uid='fila_preencher')
+
+        # Índice de busca: documentos atualizados a cada gravação e estruturas
+        # do índice (FTS5/GIN) criadas depois do migrate
+        busca.conectar_sinais()
+
+        # Comentários, anexos e avaliação mudam a versão do chamado (cache e ETag do detalhe)
+        versoes.conectar_sinais()
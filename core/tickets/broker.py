@@ -0,0 +1,119 @@
+# tickets/broker.py
+import asyncio
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+CANAL_FILA = 'fila'
+BROKER_PADRAO = 'tickets.broker.BrokerMemoria'
+
+
+class BrokerMemoria:
+    """
+    Broker de eventos em memória, dentro do processo.
+
+    publicar() pode ser chamado de qualquer thread (as views síncronas rodam
+    em threads); cada assinante tem a sua fila asyncio e recebe os eventos no
+    seu próprio event loop. Só entrega eventos aos assinantes do mesmo
+    processo: para vários workers, troque por um backend compartilhado
+    (ex.: Redis pub/sub) com a mesma interface em TICKETS_BROKER_BACKEND.
+    """
+
+    # Eventos acumulados por assinante lento antes de começar a descartar
+    TAMANHO_FILA = 100
+
+    def __init__(self):
+        self._assinantes = {}
+        self._lock = threading.Lock()
+
+    def publicar(self, canal, evento):
+        with self._lock:
+            assinantes = list(self._assinantes.get(canal, ()))
+        for loop, fila in assinantes:
+            try:
+                loop.call_soon_threadsafe(self._entregar, fila, evento)
+            except RuntimeError:
+                # O loop do assinante já foi fechado
+                pass
+
+    @staticmethod
+    def _entregar(fila, evento):
+        try:
+            fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            pass
+
+    def assinar(self, canal):
+        """Uso: async with broker.assinar('fila') as fila: evento = await fila.get()"""
+        return _Assinatura(self, canal)
+
+    def _adicionar(self, canal, assinante):
+        with self._lock:
+            self._assinantes.setdefault(canal, set()).add(assinante)
+
+    def _remover(self, canal, assinante):
+        with self._lock:
+            self._assinantes.get(canal, set()).discard(assinante)
+
+
+class _Assinatura:
+    # Gerenciador de contexto explícito (e não um gerador) para que o
+    # cancelamento da conexão sempre remova o assinante
+    def __init__(self, broker, canal):
+        self.broker = broker
+        self.canal = canal
+        self.assinante = None
+
+    async def __aenter__(self):
+        self.assinante = (asyncio.get_running_loop(), asyncio.Queue(self.broker.TAMANHO_FILA))
+        self.broker._adicionar(self.canal, self.assinante)
+        return self.assinante[1]
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remover(self.canal, self.assinante)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def obter_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'TICKETS_BROKER_BACKEND', BROKER_PADRAO))()
+        return _broker
+
+
+def _reiniciar_broker(setting, **kwargs):
+    global _broker
+    if setting == 'TICKETS_BROKER_BACKEND':
+        with _broker_lock:
+            _broker = None
+
+
+setting_changed.connect(_reiniciar_broker)
+
+
+def publicar_evento_chamado(chamado, tipo):
+    """
+    Publica uma alteração de chamado para os técnicos conectados.
+    O envio acontece só depois do commit, para nunca anunciar algo desfeito.
+    """
+    evento = {
+        'tipo': tipo,
+        'id': chamado.pk,
+        'subcategoria': chamado.subcategoria.nome,
+        'status': chamado.status,
+        'status_display': chamado.get_status_display(),
+        'tecnico_id': chamado.tecnico_id,
+        'incidente_id': chamado.incidente_id,
+        'data_abertura': chamado.data_abertura.isoformat() if chamado.data_abertura else None,
+        'prioridade_display': chamado.get_prioridade_display(),
+        # Posição na fila do painel (ver tickets/fila.py)
+        'data_fila': chamado.data_fila.isoformat() if chamado.data_fila else None,
+    }
+    transaction.on_commit(lambda: obter_broker().publicar(CANAL_FILA, evento))
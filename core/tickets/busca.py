@@ -0,0 +1,368 @@
+# tickets/busca.py
+"""
+Busca de texto completo em chamados, comentários, logs técnicos e nomes de
+categoria/subcategoria.
+
+Cada texto pesquisável vira uma linha de DocumentoBusca, mantida pelos sinais
+de gravação (ver conectar_sinais) e por indexar_logs() no caminho do
+bulk_create. Sobre essa tabela cada banco tem o seu índice:
+
+- SQLite: tabela virtual FTS5 com "external content" sincronizada por triggers;
+- PostgreSQL: índice GIN sobre to_tsvector('portuguese', texto);
+- outros (ou SQLite sem FTS5): busca simples com icontains.
+
+As estruturas do índice são criadas após o migrate (sinal post_migrate) e
+podem ser refeitas com "python manage.py reconstruir_busca".
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+from django.db import OperationalError, ProgrammingError, connections, router
+from django.db.models import Count, Q
+
+from .models import Categoria, Chamado, Comentario, DocumentoBusca, LogTecnico, Subcategoria
+
+TAMANHO_LOTE = 2000
+MAXIMO_TERMOS = 10
+
+STOPWORDS = frozenset("""
+    a ao aos as com como da das de do dos e em na nas no nos o os ou para pela pelas
+    pelo pelos por que se sem um uma umas uns nao sim ja foi esta estao ser ter
+""".split())
+
+# Sufixos removidos pelo radicalizador, do mais longo para o mais curto
+SUFIXOS = (
+    'amentos', 'imentos', 'adoras', 'adores', 'amento', 'imento', 'mente',
+    'acoes', 'icoes', 'adora', 'ador', 'acao', 'icao', 'coes', 'cao',
+    'oes', 'aes', 'ais', 'eis', 'ns', 'as', 'es', 'os', 'ar', 'er', 'ir',
+    's', 'a', 'e', 'o',
+)
+TAMANHO_MINIMO_RADICAL = 4
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos ('Impressão' -> 'impressao')."""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def radical(palavra):
+    """
+    Radicalizador leve para o português: remove plurais, gênero e alguns
+    sufixos comuns, para que 'impressoras' e 'impressora' (ou 'configurar' e
+    'configuracao') levem ao mesmo prefixo de busca.
+    """
+    for sufixo in SUFIXOS:
+        if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= TAMANHO_MINIMO_RADICAL:
+            return palavra[:-len(sufixo)]
+    return palavra
+
+
+def termos_da_consulta(consulta):
+    termos = []
+    for palavra in re.findall(r'\w+', normalizar(consulta)):
+        if palavra in STOPWORDS:
+            continue
+        termo = radical(palavra)
+        if termo not in termos:
+            termos.append(termo)
+    return termos[:MAXIMO_TERMOS]
+
+
+# --- Documentos ---
+
+def documento_chamado(chamado):
+    subcategoria = chamado.subcategoria
+    texto = f"{subcategoria.categoria.nome} {subcategoria.nome} {chamado.observacao or ''}"
+    return DocumentoBusca(
+        chamado_id=chamado.pk, origem=DocumentoBusca.Origem.CHAMADO,
+        origem_id=chamado.pk, texto=normalizar(texto),
+    )
+
+
+def documento_comentario(comentario):
+    return DocumentoBusca(
+        chamado_id=comentario.chamado_id, origem=DocumentoBusca.Origem.COMENTARIO,
+        origem_id=comentario.pk, texto=normalizar(comentario.conteudo),
+    )
+
+
+def documento_log(log):
+    if not log.detalhes:
+        return None
+    return DocumentoBusca(
+        chamado_id=log.chamado_id, origem=DocumentoBusca.Origem.LOG,
+        origem_id=log.pk, texto=normalizar(log.detalhes),
+    )
+
+
+def salvar_documentos(documentos, using=None):
+    documentos = [documento for documento in documentos if documento is not None]
+    if documentos:
+        # INSERT ... ON CONFLICT DO UPDATE: indexa ou reindexa numa única consulta
+        DocumentoBusca.objects.using(using).bulk_create(
+            documentos, batch_size=TAMANHO_LOTE, update_conflicts=True,
+            unique_fields=['origem', 'origem_id'], update_fields=['chamado', 'texto'],
+        )
+
+
+def indexar_logs(logs):
+    """Para logs gravados com bulk_create, que não disparam post_save."""
+    salvar_documentos(documento_log(log) for log in logs if log.pk)
+
+
+def reindexar_chamados(queryset):
+    queryset = queryset.select_related('subcategoria__categoria').order_by()
+    lote = []
+    for chamado in queryset.iterator(chunk_size=TAMANHO_LOTE):
+        lote.append(documento_chamado(chamado))
+        if len(lote) >= TAMANHO_LOTE:
+            salvar_documentos(lote)
+            lote = []
+    salvar_documentos(lote)
+
+
+# --- Receptores de sinais ---
+
+# Campos do chamado que entram no texto indexado (documento_chamado)
+CAMPOS_INDEXADOS_CHAMADO = frozenset({'observacao', 'subcategoria', 'subcategoria_id'})
+
+
+def ao_salvar_chamado(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # save(update_fields=[...]) que não toca no texto (ex.: status, prioridade) não reindexa
+    if update_fields is not None and not CAMPOS_INDEXADOS_CHAMADO & update_fields:
+        return
+    salvar_documentos([documento_chamado(instance)])
+
+
+def ao_salvar_comentario(sender, instance, raw=False, **kwargs):
+    if not raw:
+        salvar_documentos([documento_comentario(instance)])
+
+
+def ao_salvar_log(sender, instance, raw=False, **kwargs):
+    if not raw:
+        salvar_documentos([documento_log(instance)])
+
+
+def ao_apagar_origem(origem):
+    def receptor(sender, instance, **kwargs):
+        DocumentoBusca.objects.filter(origem=origem, origem_id=instance.pk).delete()
+    return receptor
+
+
+def ao_salvar_subcategoria(sender, instance, raw=False, created=False, **kwargs):
+    # Renomear uma subcategoria muda o texto de todos os seus chamados
+    if not raw and not created:
+        reindexar_chamados(Chamado.objects.filter(subcategoria=instance))
+
+
+def ao_salvar_categoria(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created:
+        reindexar_chamados(Chamado.objects.filter(subcategoria__categoria=instance))
+
+
+def ao_migrar(sender, using, **kwargs):
+    if sender.name == 'tickets':
+        preparar_indice(using)
+
+
+def conectar_sinais():
+    from django.db.models.signals import post_delete, post_migrate, post_save
+
+    post_save.connect(ao_salvar_chamado, sender=Chamado, dispatch_uid='busca_chamado')
+    post_save.connect(ao_salvar_comentario, sender=Comentario, dispatch_uid='busca_comentario')
+    post_save.connect(ao_salvar_log, sender=LogTecnico, dispatch_uid='busca_log')
+    post_save.connect(ao_salvar_subcategoria, sender=Subcategoria, dispatch_uid='busca_subcategoria')
+    post_save.connect(ao_salvar_categoria, sender=Categoria, dispatch_uid='busca_categoria')
+    post_delete.connect(ao_apagar_origem(DocumentoBusca.Origem.COMENTARIO), sender=Comentario, weak=False, dispatch_uid='busca_comentario_apagado')
+    post_delete.connect(ao_apagar_origem(DocumentoBusca.Origem.LOG), sender=LogTecnico, weak=False, dispatch_uid='busca_log_apagado')
+    post_migrate.connect(ao_migrar, dispatch_uid='busca_preparar_indice')
+
+
+# --- Backends de índice ---
+
+TABELA_DOCUMENTOS = DocumentoBusca._meta.db_table
+
+
+class BuscaSimples:
+    """Sem índice de texto: cada termo vira um icontains. Serve para qualquer banco."""
+
+    def preparar(self, cursor):
+        pass
+
+    def desativar(self, cursor):
+        pass
+
+    def reconstruir(self, cursor):
+        pass
+
+    def consultar(self, using, consulta, usuario_id, limite, deslocamento):
+        documentos = DocumentoBusca.objects.using(using)
+        for termo in termos_da_consulta(consulta):
+            documentos = documentos.filter(texto__icontains=termo)
+        if usuario_id is not None:
+            documentos = documentos.filter(chamado__usuario_id=usuario_id)
+        linhas = (
+            documentos.values('chamado_id')
+            .annotate(relevancia=Count('id'))
+            .order_by('-relevancia', '-chamado_id')[deslocamento:deslocamento + limite]
+        )
+        return [linha['chamado_id'] for linha in linhas]
+
+
+class BuscaSQLite(BuscaSimples):
+    TABELA_FTS = f'{TABELA_DOCUMENTOS}_fts'
+
+    def preparar(self, cursor):
+        fts, conteudo = self.TABELA_FTS, TABELA_DOCUMENTOS
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"texto, content='{conteudo}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        # Triggers mantêm o índice em dia com qualquer escrita na tabela de documentos
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {conteudo} BEGIN "
+            f"INSERT INTO {fts}(rowid, texto) VALUES (new.id, new.texto); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {conteudo} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, texto) VALUES ('delete', old.id, old.texto); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {conteudo} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, texto) VALUES ('delete', old.id, old.texto); "
+            f"INSERT INTO {fts}(rowid, texto) VALUES (new.id, new.texto); END"
+        )
+
+    def desativar(self, cursor):
+        fts = self.TABELA_FTS
+        for sufixo in ('ai', 'ad', 'au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{sufixo}")
+        cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+    def reconstruir(self, cursor):
+        cursor.execute(f"INSERT INTO {self.TABELA_FTS}({self.TABELA_FTS}) VALUES ('rebuild')")
+
+    def consultar(self, using, consulta, usuario_id, limite, deslocamento):
+        termos = termos_da_consulta(consulta)
+        if not termos:
+            return []
+        # Cada termo é um radical sem caracteres especiais; busca por prefixo
+        expressao = ' AND '.join(f'"{termo}"*' for termo in termos)
+        filtro_usuario, parametros = '', [expressao]
+        if usuario_id is not None:
+            filtro_usuario = f"AND d.chamado_id IN (SELECT id FROM {Chamado._meta.db_table} WHERE usuario_id = %s)"
+            parametros.append(usuario_id)
+        sql = (
+            f"SELECT d.chamado_id, MIN(f.rank) AS relevancia "
+            f"FROM {self.TABELA_FTS} f JOIN {TABELA_DOCUMENTOS} d ON d.id = f.rowid "
+            f"WHERE {self.TABELA_FTS} MATCH %s {filtro_usuario} "
+            f"GROUP BY d.chamado_id ORDER BY relevancia, d.chamado_id DESC LIMIT %s OFFSET %s"
+        )
+        with connections[using].cursor() as cursor:
+            cursor.execute(sql, parametros + [limite, deslocamento])
+            return [linha[0] for linha in cursor.fetchall()]
+
+
+class BuscaPostgreSQL(BuscaSimples):
+    INDICE = 'documentobusca_texto_gin'
+    # A expressão do índice e a das consultas precisam ser idênticas
+    VETOR = "to_tsvector('portuguese', d.texto)"
+
+    def preparar(self, cursor):
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.INDICE} ON {TABELA_DOCUMENTOS} "
+            f"USING gin (to_tsvector('portuguese', texto))"
+        )
+
+    def desativar(self, cursor):
+        # Carregar sem o índice e criá-lo no final é bem mais rápido
+        cursor.execute(f"DROP INDEX IF EXISTS {self.INDICE}")
+
+    def consultar(self, using, consulta, usuario_id, limite, deslocamento):
+        # O PostgreSQL faz a radicalização com o dicionário 'portuguese'
+        texto = normalizar(consulta).strip()
+        if not texto:
+            return []
+        filtro_usuario, parametros = '', [texto]
+        if usuario_id is not None:
+            filtro_usuario = f"AND d.chamado_id IN (SELECT id FROM {Chamado._meta.db_table} WHERE usuario_id = %s)"
+            parametros.append(usuario_id)
+        sql = (
+            f"SELECT d.chamado_id, MAX(ts_rank({self.VETOR}, q)) AS relevancia "
+            f"FROM {TABELA_DOCUMENTOS} d, websearch_to_tsquery('portuguese', %s) q "
+            f"WHERE {self.VETOR} @@ q {filtro_usuario} "
+            f"GROUP BY d.chamado_id ORDER BY relevancia DESC, d.chamado_id DESC LIMIT %s OFFSET %s"
+        )
+        with connections[using].cursor() as cursor:
+            cursor.execute(sql, parametros + [limite, deslocamento])
+            return [linha[0] for linha in cursor.fetchall()]
+
+
+_fts_disponivel = {}
+
+
+def obter_backend(using):
+    vendor = connections[using].vendor
+    if vendor == 'postgresql':
+        return BuscaPostgreSQL()
+    if vendor == 'sqlite':
+        if not _fts_disponivel.get(using):
+            with connections[using].cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [BuscaSQLite.TABELA_FTS])
+                _fts_disponivel[using] = cursor.fetchone() is not None
+        if _fts_disponivel[using]:
+            return BuscaSQLite()
+    return BuscaSimples()
+
+
+def preparar_indice(using):
+    """Cria as estruturas do índice do banco 'using' (idempotente)."""
+    vendor = connections[using].vendor
+    backend = {'sqlite': BuscaSQLite, 'postgresql': BuscaPostgreSQL}.get(vendor, BuscaSimples)()
+    try:
+        with connections[using].cursor() as cursor:
+            backend.preparar(cursor)
+    except (OperationalError, ProgrammingError):
+        # Ex.: SQLite compilado sem FTS5; a busca usa BuscaSimples
+        return None
+    _fts_disponivel.pop(using, None)
+    return backend
+
+
+# --- Consulta ---
+
+@dataclass
+class ResultadoBusca:
+    consulta: str
+    chamados: list = field(default_factory=list)
+    pagina: int = 1
+    tem_proxima: bool = False
+
+    @property
+    def tem_anterior(self):
+        return self.pagina > 1
+
+
+def buscar(consulta, usuario_id=None, pagina=1, por_pagina=20):
+    """
+    Chamados que correspondem à consulta, do mais para o menos relevante.
+    Com usuario_id, só os chamados abertos por esse usuário.
+    """
+    resultado = ResultadoBusca(consulta=consulta, pagina=pagina)
+    if not consulta.strip():
+        return resultado
+
+    using = router.db_for_read(DocumentoBusca)
+    # Pede um item a mais para saber se há próxima página, sem COUNT(*)
+    ids = obter_backend(using).consultar(using, consulta, usuario_id, por_pagina + 1, (pagina - 1) * por_pagina)
+    resultado.tem_proxima = len(ids) > por_pagina
+    ids = ids[:por_pagina]
+    chamados = Chamado.objects.using(using).para_lista().in_bulk(ids)
+    resultado.chamados = [chamados[pk] for pk in ids if pk in chamados]
+    return resultado
@@ -0,0 +1,31 @@
+# tickets/estatisticas.py
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Chamado
+
+CHAVE_CONTAGEM_STATUS = 'tickets:contagem_por_status'
+TEMPO_CACHE_PADRAO = 60
+
+
+def contagem_por_status():
+    """
+    Quantidade de chamados em cada status, guardada em cache.
+
+    A contagem é feita numa única consulta e o cache é descartado sempre que
+    um chamado é salvo ou apagado, então o valor só fica velho se o status
+    for alterado por fora do ORM (no máximo pelo tempo de expiração). Com
+    vários processos, o descarte só chega aos outros se o cache for
+    compartilhado (REDIS_URL, ver CACHES em core/settings.py); com o cache
+    em memória, cada processo pode mostrar a contagem antiga até expirar.
+    """
+    contagem = cache.get(CHAVE_CONTAGEM_STATUS)
+    if contagem is None:
+        contagem = Chamado.objects.contagem_por_status()
+        tempo = getattr(settings, 'TICKETS_CACHE_ESTATISTICAS', TEMPO_CACHE_PADRAO)
+        cache.set(CHAVE_CONTAGEM_STATUS, contagem, tempo)
+    return contagem
+
+
+def invalidar_estatisticas(**kwargs):
+    cache.delete(CHAVE_CONTAGEM_STATUS)
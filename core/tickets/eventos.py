@@ -0,0 +1,126 @@
+# tickets/eventos.py
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
+
+from core.versoes_cache import incrementar_versao, ler_versao
+
+from .busca import indexar_logs
+from .models import LogTecnico, TipoAcao
+from .relatorios import registrar_eventos
+
+# Tipos de ação usados pelo sistema (nome interno -> nome de exibição)
+ACOES_PADRAO = {
+    'CRIACAO': 'Chamado criado',
+    'ACEITE': 'Técnico aceitou o chamado',
+    'COMENTARIO': 'Técnico adicionou um comentário',
+    'STATUS_UPDATE': 'Técnico alterou o status',
+    'RESOLUCAO': 'Técnico resolveu o chamado',
+    'FECHAMENTO_USUARIO': 'Usuário avaliou e fechou o chamado',
+    'ANEXOU_ARQUIVO': 'Usuário anexou um arquivo',
+}
+
+CHAVE_VERSAO = 'tipos_acao:versao'
+
+_tipos_acao = {}
+_versao = None
+_tipos_acao_lock = threading.Lock()
+_local = threading.local()
+
+
+def _guardar_tipos(tipos, versao):
+    global _versao
+    with _tipos_acao_lock:
+        if _versao != versao:
+            _tipos_acao.clear()
+            _versao = versao
+        _tipos_acao.update(tipos)
+
+
+def tipo_acao(nome):
+    """
+    Retorna o TipoAcao pelo nome usando um cache do processo.
+
+    A tabela inteira é lida na primeira chamada. Um tipo padrão que ainda não
+    exista no banco (popular_dados.py não executado) é criado na hora.
+    Os valores só entram no cache depois do commit, para que um rollback não
+    deixe no cache um registro que não existe. Uma edição em qualquer processo
+    muda a versão no cache compartilhado e a tabela é lida de novo.
+    """
+    versao = ler_versao(CHAVE_VERSAO)
+    with _tipos_acao_lock:
+        atual = _versao == versao
+        tipo = _tipos_acao.get(nome) if atual else None
+        vazio = not atual or not _tipos_acao
+    if tipo is not None:
+        return tipo
+
+    if vazio:
+        carregados = {tipo.nome: tipo for tipo in TipoAcao.objects.all()}
+        transaction.on_commit(partial(_guardar_tipos, carregados, versao))
+        tipo = carregados.get(nome)
+        if tipo is not None:
+            return tipo
+
+    if nome not in ACOES_PADRAO:
+        raise TipoAcao.DoesNotExist(f"Tipo de ação '{nome}' não cadastrado.")
+    tipo, criado = TipoAcao.objects.get_or_create(nome=nome, defaults={'nome_exibicao': ACOES_PADRAO[nome]})
+    if criado:
+        # A criação dispara invalidar_tipos_acao, que muda a versão
+        versao = ler_versao(CHAVE_VERSAO)
+    transaction.on_commit(partial(_guardar_tipos, {nome: tipo}, versao))
+    return tipo
+
+
+def invalidar_tipos_acao(**kwargs):
+    # Chamado quando um TipoAcao é salvo ou apagado (ex.: edição pelo admin);
+    # a versão nova faz os outros processos lerem a tabela de novo
+    incrementar_versao(CHAVE_VERSAO)
+    with _tipos_acao_lock:
+        _tipos_acao.clear()
+
+
+def registrar_evento(chamado, usuario, acao, detalhes=None):
+    """
+    Registra um LogTecnico para o chamado.
+
+    Dentro de um bloco lote_eventos() o registro é acumulado e gravado junto
+    com os outros num único bulk_create; fora dele é gravado imediatamente.
+    """
+    log = LogTecnico(chamado=chamado, tecnico=usuario, tipo_acao=tipo_acao(acao), detalhes=detalhes)
+    lote = getattr(_local, 'lote', None)
+    if lote is not None:
+        lote.append(log)
+    else:
+        with transaction.atomic():
+            log.save()
+            registrar_eventos([log])
+    return log
+
+
+@contextmanager
+def lote_eventos():
+    """
+    Agrupa os eventos registrados no bloco num único INSERT, na mesma
+    transação das demais gravações do bloco. Blocos aninhados usam o lote
+    do bloco mais externo.
+    """
+    if getattr(_local, 'lote', None) is not None:
+        yield _local.lote
+        return
+
+    with transaction.atomic():
+        _local.lote = []
+        try:
+            yield _local.lote
+            lote = _local.lote
+        finally:
+            _local.lote = None
+        if lote:
+            LogTecnico.objects.bulk_create(lote)
+            # bulk_create não dispara post_save; indexa os detalhes para a busca
+            indexar_logs(lote)
+            # e soma os eventos nos resumos dos relatórios
+            registrar_eventos(lote)
@@ -0,0 +1,78 @@
+# tickets/fila.py
+"""
+Ordem da fila de chamados abertos (dashboard_tecnico e distribuição automática).
+
+Cada prioridade adianta o chamado na fila em TICKETS_FILA_AVANCO minutos:
+a posição é data_fila = data_abertura - avanço, e a fila é lida em ordem
+crescente de data_fila. Equivale a ordenar pela pontuação
+"espera + avanço da prioridade": a prioridade dá uma vantagem fixa e a espera
+envelhece todos os chamados no mesmo ritmo, então um chamado de prioridade
+baixa que espera mais do que a diferença de avanço passa à frente de um de
+prioridade alta recém-aberto.
+
+Como data_fila não muda com o tempo, ela é gravada no chamado (Chamado.save)
+e a fila é uma leitura em ordem do índice parcial 'chamado_fila_idx'. Depois
+de alterar TICKETS_FILA_AVANCO, rode 'python manage.py recalcular_fila'.
+
+Chamados gravados antes de existir a coluna ficam com data_fila nula até o
+preenchimento feito depois do migrate (sinal post_migrate); enquanto isso a
+fila os posiciona pela data de abertura (ver posicao()).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, models, router
+from django.db.models.functions import Coalesce
+
+# Minutos de avanço de cada prioridade
+AVANCO_PADRAO = {'ALTA': 240, 'MEDIA': 60, 'BAIXA': 0}
+TAMANHO_PADRAO = 50
+
+
+def avancos():
+    configurado = getattr(settings, 'TICKETS_FILA_AVANCO', AVANCO_PADRAO)
+    return {prioridade: timedelta(minutes=configurado.get(prioridade, 0)) for prioridade in AVANCO_PADRAO}
+
+
+def data_fila(data_abertura, prioridade):
+    return data_abertura - avancos().get(prioridade, timedelta(0))
+
+
+def expressao_data_fila():
+    """data_fila calculada no banco, para recalcular muitos chamados num UPDATE."""
+    return models.Case(
+        *[
+            models.When(prioridade=prioridade, then=models.F('data_abertura') - models.Value(avanco))
+            for prioridade, avanco in avancos().items() if avanco
+        ],
+        default=models.F('data_abertura'),
+        output_field=models.DateTimeField(),
+    )
+
+
+def posicao():
+    """
+    Posição usada para ordenar a fila (e expressão do índice 'chamado_fila_idx'):
+    data_fila, ou a data de abertura enquanto data_fila não foi preenchida.
+    """
+    return Coalesce('data_fila', 'data_abertura')
+
+
+def preencher_fila(sender, using, **kwargs):
+    # post_migrate: calcula data_fila dos chamados que ainda não a têm
+    if sender.name != 'tickets':
+        return
+    from .models import Chamado
+
+    # Um migrate parcial (ex.: 'migrate auth', 'migrate tickets zero') também
+    # dispara o sinal, com ou sem a tabela; a réplica não é migrada
+    if not router.allow_migrate_model(using, Chamado):
+        return
+    if Chamado._meta.db_table not in connections[using].introspection.table_names():
+        return
+    Chamado.objects.using(using).filter(data_fila__isnull=True).recalcular_fila()
+
+
+def tamanho():
+    # Chamados mostrados na fila do painel do técnico
+    return getattr(settings, 'TICKETS_FILA_TAMANHO', TAMANHO_PADRAO)
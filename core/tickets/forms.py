@@ -1,6 +1,7 @@
 # chamados/forms.py
 from django import forms
-from .models import Chamado, Comentario, Avaliacao, Anexo
+from .models import Chamado, Comentario, Avaliacao, Anexo, Incidente
+from .operacoes import LIMITE_LOTE
 
 class ChamadoForm(forms.ModelForm):
     class Meta:
@@ -42,6 +43,51 @@ class AtualizarStatusForm(forms.ModelForm):
         # Atualiza as opções do campo 'status' neste formulário
         self.fields['status'].choices = opcoes_para_tecnico
 
+class AtualizarStatusIncidenteForm(AtualizarStatusForm):
+    # Mesmas opções de status que o técnico tem num chamado
+    class Meta(AtualizarStatusForm.Meta):
+        model = Incidente
+
+def ids_chamados(texto):
+    # "12, 15 #18" -> [12, 15, 18]
+    partes = texto.replace(',', ' ').replace('#', ' ').split()
+    if not all(parte.isdigit() for parte in partes):
+        raise forms.ValidationError("Informe apenas os números dos chamados, separados por vírgula.")
+    ids = list(dict.fromkeys(int(parte) for parte in partes))
+    if len(ids) > LIMITE_LOTE:
+        raise forms.ValidationError(f"No máximo {LIMITE_LOTE} chamados por vez.")
+    return ids
+
+class VincularChamadosForm(forms.Form):
+    chamados = forms.CharField(
+        label="Chamados",
+        widget=forms.TextInput(attrs={'placeholder': 'Números dos chamados, ex.: 12, 15, 18'}),
+    )
+
+    def clean_chamados(self):
+        return ids_chamados(self.cleaned_data['chamados'])
+
+class IncidenteForm(forms.ModelForm):
+    chamados = forms.CharField(
+        label="Chamados",
+        required=False,
+        widget=forms.TextInput(attrs={'placeholder': 'Opcional: números dos chamados, ex.: 12, 15, 18'}),
+    )
+
+    class Meta:
+        model = Incidente
+        fields = ['titulo', 'descricao']
+
+    def clean_chamados(self):
+        return ids_chamados(self.cleaned_data['chamados'])
+
+class ResolverIncidenteForm(forms.Form):
+    comentario = forms.CharField(
+        label="Solução",
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 3, 'placeholder': 'Opcional: descreva a solução para os solicitantes'}),
+    )
+
 class AnexoForm(forms.ModelForm):
     class Meta:
         model = Anexo
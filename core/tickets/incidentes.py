@@ -0,0 +1,146 @@
+# tickets/incidentes.py
+"""
+Incidentes: um problema comum (ex.: uma parada geral) que gerou vários
+chamados. Os chamados vinculados ficam com o técnico do incidente e o
+acompanham: cada mudança de status, comentário ou resolução do incidente é
+aplicada a todos os chamados ativos dele de uma vez, com um UPDATE
+(executar_transicao_em_lote) e um bulk_create para comentários e logs
+(lote_eventos), sem salvar chamado por chamado.
+"""
+from django.utils import timezone
+
+from .eventos import lote_eventos, registrar_evento
+from .models import Chamado, Incidente
+from .operacoes import ResultadoLote, comentar_em_lote
+from .transicoes import TRANSICOES, ConflitoTransicao, executar_transicao_em_lote
+
+Status = Chamado.Status
+
+MENSAGEM_FINALIZADO = "Este incidente já foi resolvido e não permite mais ações."
+
+
+def _verificar_ativo(incidente):
+    if incidente.esta_finalizado:
+        raise ConflitoTransicao(MENSAGEM_FINALIZADO)
+
+
+def _alterar_incidente(incidente, **campos):
+    # UPDATE condicional, como nas transições do chamado: só altera um incidente ativo
+    if not Incidente.objects.filter(pk=incidente.pk, status__in=Chamado.STATUS_ATIVOS).update(**campos):
+        raise ConflitoTransicao(MENSAGEM_FINALIZADO)
+    for campo, valor in campos.items():
+        setattr(incidente, campo, valor)
+
+
+def _filhos(incidente, status):
+    # FOR UPDATE (no PostgreSQL), como em aplicar_em_lote
+    return list(
+        Chamado.objects.para_acao().select_for_update(of=('self',))
+        .filter(incidente=incidente, status__in=status).order_by('pk')
+    )
+
+
+def _motivo_recusa(chamado, incidente):
+    if chamado.incidente_id == incidente.pk:
+        return "Chamado já vinculado a este incidente."
+    if chamado.incidente_id is not None:
+        return "Chamado vinculado a outro incidente."
+    if chamado.status == Status.ABERTO and chamado.tecnico_id is None:
+        return None
+    if chamado.status not in TRANSICOES['atualizar_status'].origens:
+        return "Apenas chamados abertos ou em atendimento podem ser vinculados."
+    if chamado.tecnico_id != incidente.tecnico_id:
+        return "Chamado em atendimento por outro técnico."
+    return None
+
+
+def vincular(incidente, ids):
+    """
+    Vincula os chamados 'ids' ao incidente. Os abertos e sem técnico são
+    aceitos pelo técnico do incidente, e todos passam ao status do incidente.
+    Chamados de outro técnico, finalizados ou já vinculados ficam em
+    ResultadoLote.recusados.
+    """
+    _verificar_ativo(incidente)
+    resultado = ResultadoLote()
+    tecnico = incidente.tecnico
+    with lote_eventos():
+        encontrados = Chamado.objects.para_acao().select_for_update(of=('self',)).filter(pk__in=ids)
+        chamados = {chamado.pk: chamado for chamado in encontrados}
+
+        validos = []
+        for chamado_id in dict.fromkeys(ids):
+            chamado = chamados.get(chamado_id)
+            motivo = "Chamado não encontrado." if chamado is None else _motivo_recusa(chamado, incidente)
+            if motivo:
+                resultado.recusados[chamado_id] = motivo
+            else:
+                validos.append(chamado)
+        if not validos:
+            return resultado
+
+        abertos = [chamado for chamado in validos if chamado.status == Status.ABERTO]
+        executar_transicao_em_lote(
+            abertos, 'aceitar', condicoes={'tecnico__isnull': True, 'incidente__isnull': True},
+            tecnico=tecnico, incidente=incidente,
+        )
+        for chamado in abertos:
+            registrar_evento(chamado, tecnico, 'ACEITE')
+
+        # Um único UPDATE vincula os demais e põe todos no status do incidente
+        executar_transicao_em_lote(
+            validos, 'atualizar_status', destino=incidente.status, condicoes={'tecnico': tecnico}, incidente=incidente,
+        )
+        for chamado in validos:
+            registrar_evento(
+                chamado, tecnico, 'STATUS_UPDATE',
+                f"Vinculado ao incidente #{incidente.pk}. Status: {chamado.get_status_display()}",
+            )
+
+    resultado.aplicados = [chamado.pk for chamado in validos]
+    return resultado
+
+
+def atualizar_status(incidente, destino):
+    """Muda o status do incidente e dos chamados vinculados que estão em atendimento."""
+    transicao = TRANSICOES['atualizar_status']
+    if destino not in transicao.destinos:
+        raise ValueError(f"Status '{destino}' não permitido para o incidente.")
+    with lote_eventos():
+        _alterar_incidente(incidente, status=destino)
+        filhos = _filhos(incidente, [status for status in transicao.origens if status != destino])
+        executar_transicao_em_lote(filhos, 'atualizar_status', destino=destino, condicoes={'incidente': incidente})
+        for chamado in filhos:
+            registrar_evento(
+                chamado, incidente.tecnico, 'STATUS_UPDATE',
+                f"Status alterado para: {chamado.get_status_display()} (incidente #{incidente.pk})",
+            )
+    return filhos
+
+
+def comentar(incidente, conteudo, registrar_log=True):
+    """Adiciona o comentário do técnico a todos os chamados ativos do incidente."""
+    _verificar_ativo(incidente)
+    with lote_eventos():
+        filhos = _filhos(incidente, Chamado.STATUS_ATIVOS)
+        if filhos:
+            comentar_em_lote(filhos, incidente.tecnico, conteudo, registrar_log)
+    return filhos
+
+
+def resolver(incidente, comentario='', registrar_log=True):
+    """
+    Resolve o incidente e conclui, com a mesma data, todos os chamados
+    vinculados em atendimento. Cada solicitante avalia e fecha o seu chamado.
+    """
+    with lote_eventos():
+        _alterar_incidente(incidente, status=Status.CONCLUIDO, data_conclusao=timezone.now())
+        filhos = _filhos(incidente, TRANSICOES['resolver_incidente'].origens)
+        executar_transicao_em_lote(
+            filhos, 'resolver_incidente', condicoes={'incidente': incidente}, data_conclusao=incidente.data_conclusao,
+        )
+        for chamado in filhos:
+            registrar_evento(chamado, incidente.tecnico, 'RESOLUCAO')
+        if comentario and filhos:
+            comentar_em_lote(filhos, incidente.tecnico, comentario, registrar_log)
+    return filhos
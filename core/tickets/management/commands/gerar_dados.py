@@ -0,0 +1,253 @@
+import json
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from authentication.papeis import GRUPO_DIRETORIA, GRUPO_TECNICO, GRUPO_TI, invalidar_papeis_todos
+from tickets import busca, fila, relatorios
+from tickets.estatisticas import invalidar_estatisticas
+from tickets.eventos import ACOES_PADRAO, invalidar_tipos_acao
+from tickets.models import Avaliacao, Categoria, Chamado, Comentario, Incidente, LogTecnico, Subcategoria, TipoAcao
+
+Status = Chamado.Status
+
+# Distribuição aproximada dos status num sistema em uso há algum tempo
+PESOS_STATUS = {
+    Status.ABERTO: 10,
+    Status.EM_ATENDIMENTO: 8,
+    Status.AGUARDANDO_RESPOSTA: 4,
+    Status.AGUARDANDO_TERCEIROS: 3,
+    Status.CONCLUIDO: 5,
+    Status.FECHADO: 60,
+    Status.CANCELADO: 10,
+}
+PESOS_PRIORIDADE = {Chamado.Prioridade.BAIXA: 70, Chamado.Prioridade.MEDIA: 20, Chamado.Prioridade.ALTA: 10}
+
+PROBLEMAS = [
+    'Não liga', 'Tela azul ao iniciar', 'Impressão saindo borrada', 'Sem acesso à rede',
+    'Senha expirada', 'Lentidão ao abrir o sistema', 'Erro ao enviar e-mail',
+    'Cabo danificado', 'Barulho estranho', 'Não reconhece o dispositivo',
+]
+LOCAIS = ['na recepção', 'no financeiro', 'na sala de reuniões', 'no RH', 'na diretoria', 'no almoxarifado']
+RESPOSTAS = [
+    'Verificando o equipamento no local.', 'Pode reiniciar e testar novamente?',
+    'Aguardando peça do fornecedor.', 'Configuração refeita, favor confirmar.',
+    'Ainda está com o mesmo problema.', 'Funcionou, obrigado!',
+]
+
+SENHA_PADRAO = 'senha123'
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera um volume realista de dados sintéticos (usuários, grupos, chamados em todos os status, "
+        "comentários, logs, avaliações e incidentes) com bulk_create, para testes de carga e benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=200, help="Usuários comuns a criar.")
+        parser.add_argument('--tecnicos', type=int, default=10, help="Técnicos (grupos CPD e TI) a criar.")
+        parser.add_argument('--chamados', type=int, default=5000, help="Chamados a criar.")
+        parser.add_argument('--comentarios', type=int, default=4, help="Máximo de comentários por chamado.")
+        parser.add_argument('--incidentes', type=int, default=10, help="Incidentes em atendimento a criar.")
+        parser.add_argument('--dias', type=int, default=365, help="Período (em dias) das datas de abertura.")
+        parser.add_argument('--lote', type=int, default=1000, help="Chamados gravados por transação.")
+        parser.add_argument('--semente', type=int, default=42, help="Semente do gerador aleatório (dados reprodutíveis).")
+        parser.add_argument('--prefixo', default='carga', help="Prefixo dos nomes de usuário gerados.")
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['tecnicos'] < 1:
+            raise CommandError("São necessários ao menos um usuário e um técnico.")
+
+        self.aleatorio = random.Random(options['semente'])
+        self.agora = timezone.now()
+        self.dias = options['dias']
+
+        subcategorias = self.garantir_categorias()
+        self.tipos = self.garantir_tipos_acao()
+        usuarios, tecnicos = self.criar_usuarios(options['usuarios'], options['tecnicos'], options['prefixo'])
+
+        restantes = options['chamados']
+        while restantes > 0:
+            quantidade = min(restantes, options['lote'])
+            with transaction.atomic():
+                self.criar_lote(quantidade, usuarios, tecnicos, subcategorias, options['comentarios'])
+            restantes -= quantidade
+            self.stdout.write(f"{options['chamados'] - restantes}/{options['chamados']} chamados gerados...")
+
+        with transaction.atomic():
+            self.criar_incidentes(options['incidentes'], tecnicos)
+
+        # bulk_create não dispara sinais: descarta os caches que dependem deles
+        invalidar_estatisticas()
+        invalidar_papeis_todos()
+        # Os logs foram gravados direto, sem passar pelos resumos dos relatórios
+        self.stdout.write(f'{relatorios.reconstruir()} linhas de resumo para os relatórios.')
+        self.stdout.write(self.style.SUCCESS('Dados sintéticos gerados.'))
+
+    # --- Dados de apoio ---
+
+    def garantir_categorias(self):
+        if not Subcategoria.objects.exists():
+            arquivo = settings.BASE_DIR / 'categorias.json'
+            if arquivo.exists():
+                dados = json.loads(arquivo.read_text(encoding='utf-8'))
+            else:
+                dados = [{'categoria_nome': 'Hardware', 'subcategorias': ['Computador', 'Impressora', 'Monitor']}]
+            categorias = Categoria.objects.bulk_create(
+                [Categoria(nome=item['categoria_nome']) for item in dados], ignore_conflicts=True,
+            )
+            por_nome = {categoria.nome: categoria for categoria in Categoria.objects.all()}
+            Subcategoria.objects.bulk_create([
+                Subcategoria(categoria=por_nome[item['categoria_nome']], nome=nome)
+                for item in dados for nome in item['subcategorias']
+            ])
+            self.stdout.write(f'{len(categorias)} categorias criadas.')
+        return list(Subcategoria.objects.select_related('categoria'))
+
+    def garantir_tipos_acao(self):
+        TipoAcao.objects.bulk_create(
+            [TipoAcao(nome=nome, nome_exibicao=exibicao) for nome, exibicao in ACOES_PADRAO.items()],
+            ignore_conflicts=True,
+        )
+        invalidar_tipos_acao()
+        return {tipo.nome: tipo for tipo in TipoAcao.objects.all()}
+
+    def criar_usuarios(self, quantidade_usuarios, quantidade_tecnicos, prefixo):
+        User = get_user_model()
+        # Continua a numeração de execuções anteriores com o mesmo prefixo
+        inicio = User.objects.filter(username__startswith=f'{prefixo}_').count()
+        senha = make_password(SENHA_PADRAO)  # o hash é caro: calcula uma vez só
+
+        def novo(indice, tipo):
+            return User(
+                username=f'{prefixo}_{tipo}{inicio + indice}', password=senha,
+                first_name=tipo.capitalize(), last_name=str(inicio + indice),
+                email=f'{prefixo}_{tipo}{inicio + indice}@exemplo.local',
+            )
+
+        usuarios = User.objects.bulk_create([novo(i, 'usuario') for i in range(quantidade_usuarios)])
+        tecnicos = User.objects.bulk_create([novo(i, 'tecnico') for i in range(quantidade_tecnicos)])
+
+        grupos = {nome: Group.objects.get_or_create(name=nome)[0] for nome in (GRUPO_TECNICO, GRUPO_TI, GRUPO_DIRETORIA)}
+        Membro = User.groups.through
+        # Nome da coluna que aponta para o usuário na tabela intermediária
+        campo_usuario = f'{User.groups.field.m2m_field_name()}_id'
+
+        def membro(usuario, grupo):
+            return Membro(**{campo_usuario: usuario.pk, 'group_id': grupos[grupo].pk})
+
+        membros = [membro(tecnico, nome) for tecnico in tecnicos for nome in (GRUPO_TECNICO, GRUPO_TI)]
+        # Uma pequena parte dos usuários é da diretoria (prioridade alta)
+        membros += [membro(usuario, GRUPO_DIRETORIA) for usuario in usuarios if self.aleatorio.random() < 0.05]
+        Membro.objects.bulk_create(membros, ignore_conflicts=True)
+        self.stdout.write(f'{len(usuarios)} usuários e {len(tecnicos)} técnicos criados (senha: {SENHA_PADRAO}).')
+        return usuarios, tecnicos
+
+    # --- Chamados e dependentes ---
+
+    def escolher(self, pesos):
+        return self.aleatorio.choices(list(pesos), weights=list(pesos.values()))[0]
+
+    def criar_lote(self, quantidade, usuarios, tecnicos, subcategorias, maximo_comentarios):
+        aleatorio = self.aleatorio
+        chamados = []
+        for _ in range(quantidade):
+            status = self.escolher(PESOS_STATUS)
+            abertura = self.agora - timedelta(minutes=aleatorio.randint(0, self.dias * 24 * 60))
+            conclusao = None
+            if status in (Status.CONCLUIDO, Status.FECHADO):
+                conclusao = min(abertura + timedelta(hours=aleatorio.randint(1, 120)), self.agora)
+            chamados.append(Chamado(
+                usuario=aleatorio.choice(usuarios),
+                subcategoria=aleatorio.choice(subcategorias),
+                tecnico=None if status in (Status.ABERTO, Status.CANCELADO) else aleatorio.choice(tecnicos),
+                observacao=f'{aleatorio.choice(PROBLEMAS)} {aleatorio.choice(LOCAIS)}.',
+                prioridade=self.escolher(PESOS_PRIORIDADE),
+                status=status,
+                data_abertura=abertura,
+                data_conclusao=conclusao,
+            ))
+        datas = [chamado.data_abertura for chamado in chamados]
+        Chamado.objects.bulk_create(chamados)
+        # data_abertura é auto_now_add (o bulk_create grava "agora"); bulk_update não passa por pre_save
+        for chamado, data in zip(chamados, datas):
+            chamado.data_abertura = data
+            chamado.data_fila = fila.data_fila(data, chamado.prioridade)
+        Chamado.objects.bulk_update(chamados, ['data_abertura', 'data_fila'], batch_size=500)
+
+        comentarios, logs, avaliacoes = [], [], []
+        for chamado in chamados:
+            logs.append(self.log(chamado, chamado.usuario, 'CRIACAO', chamado.data_abertura))
+            if chamado.tecnico is None:
+                continue
+            momento = chamado.data_abertura + timedelta(minutes=aleatorio.randint(5, 240))
+            logs.append(self.log(chamado, chamado.tecnico, 'ACEITE', momento))
+
+            for _ in range(aleatorio.randint(0, maximo_comentarios)):
+                momento += timedelta(minutes=aleatorio.randint(5, 600))
+                autor = aleatorio.choice((chamado.tecnico, chamado.usuario))
+                comentario = Comentario(chamado=chamado, usuario=autor, conteudo=aleatorio.choice(RESPOSTAS), data_criacao=momento)
+                comentarios.append(comentario)
+                if autor is chamado.tecnico:
+                    logs.append(self.log(chamado, autor, 'COMENTARIO', momento, comentario.conteudo[:100]))
+
+            if chamado.status in (Status.AGUARDANDO_RESPOSTA, Status.AGUARDANDO_TERCEIROS):
+                logs.append(self.log(
+                    chamado, chamado.tecnico, 'STATUS_UPDATE', momento,
+                    f"Status alterado para: {chamado.get_status_display()}",
+                ))
+            if chamado.data_conclusao:
+                logs.append(self.log(chamado, chamado.tecnico, 'RESOLUCAO', chamado.data_conclusao))
+            if chamado.status == Status.FECHADO:
+                avaliacao_em = chamado.data_conclusao + timedelta(hours=aleatorio.randint(1, 48))
+                avaliacoes.append(Avaliacao(
+                    chamado=chamado, usuario=chamado.usuario, nota=aleatorio.choices(range(1, 6), weights=(5, 5, 10, 30, 50))[0],
+                    data_avaliacao=avaliacao_em,
+                ))
+                logs.append(self.log(chamado, chamado.usuario, 'FECHAMENTO_USUARIO', avaliacao_em))
+
+        self.gravar_com_datas(Comentario, comentarios, 'data_criacao')
+        self.gravar_com_datas(LogTecnico, logs, 'data_evento')
+        self.gravar_com_datas(Avaliacao, avaliacoes, 'data_avaliacao')
+
+        # Índice de busca: os sinais de post_save não rodam no bulk_create
+        busca.salvar_documentos(busca.documento_chamado(chamado) for chamado in chamados)
+        busca.salvar_documentos(busca.documento_comentario(comentario) for comentario in comentarios)
+        busca.indexar_logs(logs)
+
+    def criar_incidentes(self, quantidade, tecnicos):
+        # Cada incidente agrupa alguns chamados em atendimento do seu técnico
+        aleatorio = self.aleatorio
+        incidentes = Incidente.objects.bulk_create([
+            Incidente(
+                titulo=f'{aleatorio.choice(PROBLEMAS)} {aleatorio.choice(LOCAIS)}',
+                tecnico=aleatorio.choice(tecnicos),
+            )
+            for _ in range(quantidade)
+        ])
+        vinculados = 0
+        for incidente in incidentes:
+            ids = list(
+                Chamado.objects.filter(tecnico=incidente.tecnico, status=incidente.status, incidente__isnull=True)
+                .order_by('-pk').values_list('pk', flat=True)[:aleatorio.randint(1, 5)]
+            )
+            vinculados += Chamado.objects.filter(pk__in=ids).update(incidente=incidente)
+        self.stdout.write(f'{len(incidentes)} incidentes criados, com {vinculados} chamados vinculados.')
+
+    def log(self, chamado, autor, acao, momento, detalhes=None):
+        return LogTecnico(chamado=chamado, tecnico=autor, tipo_acao=self.tipos[acao], data_evento=momento, detalhes=detalhes)
+
+    def gravar_com_datas(self, modelo, objetos, campo_data):
+        datas = [getattr(objeto, campo_data) for objeto in objetos]
+        modelo.objects.bulk_create(objetos, batch_size=500)
+        for objeto, data in zip(objetos, datas):
+            setattr(objeto, campo_data, data)
+        modelo.objects.bulk_update(objetos, [campo_data], batch_size=500)
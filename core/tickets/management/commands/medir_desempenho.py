@@ -0,0 +1,220 @@
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from authentication.papeis import GRUPO_TECNICO
+from tickets.models import Chamado, Incidente
+
+Status = Chamado.Status
+BACKEND_LOGIN = 'django.contrib.auth.backends.ModelBackend'
+PERCENTIS = (50, 90, 95, 99)
+# Diferenças de latência abaixo disso são ruído de medição, não regressão
+MARGEM_MINIMA_MS = 2.0
+# Chamados abertos aceitos de uma vez no cenário operacao_lote
+CHAMADOS_LOTE = 10
+
+
+class Cenario:
+    def __init__(self, nome, usuario, metodo, url, dados=None, content_type=None):
+        self.nome = nome
+        self.usuario = usuario
+        self.metodo = metodo
+        self.url = url
+        self.dados = dados or {}
+        # Ex.: 'application/json' para as views que leem o corpo em JSON
+        self.content_type = content_type
+
+
+def cenarios():
+    """
+    Uma requisição típica para cada view de tickets/urls.py, com um usuário
+    e um chamado no estado que a view espera. Usa os dados já existentes no
+    banco (ver o comando gerar_dados).
+    """
+    User = get_user_model()
+    tecnico = User.objects.filter(groups__name=GRUPO_TECNICO).order_by('pk').first()
+    if tecnico is None:
+        raise CommandError("Nenhum técnico encontrado. Gere dados antes com 'python manage.py gerar_dados'.")
+
+    def chamado(**filtros):
+        encontrado = Chamado.objects.filter(**filtros).order_by('-pk').first()
+        if encontrado is None:
+            raise CommandError(f"Nenhum chamado com {filtros}. Gere mais dados com 'python manage.py gerar_dados'.")
+        return encontrado
+
+    aberto = chamado(status=Status.ABERTO, tecnico__isnull=True)
+    abertos = list(
+        Chamado.objects.filter(status=Status.ABERTO, tecnico__isnull=True)
+        .order_by('-pk').values_list('pk', flat=True)[:CHAMADOS_LOTE]
+    )
+    em_atendimento = chamado(status=Status.EM_ATENDIMENTO, tecnico__isnull=False)
+    aguardando = chamado(status=Status.AGUARDANDO_RESPOSTA)
+    concluido = chamado(status=Status.CONCLUIDO)
+    fechado = chamado(status=Status.FECHADO)
+    incidente = Incidente.objects.filter(status__in=Chamado.STATUS_ATIVOS).select_related('tecnico').order_by('-pk').first()
+    if incidente is None:
+        raise CommandError("Nenhum incidente ativo. Gere dados com 'python manage.py gerar_dados'.")
+    ids_abertos = ', '.join(map(str, abertos))
+    # O usuário mais ativo é o pior caso das telas do usuário
+    usuario = User.objects.get(pk=fechado.usuario_id)
+
+    return [
+        Cenario('lista (técnico)', tecnico, 'get', reverse('tickets:lista')),
+        Cenario('lista (usuário)', usuario, 'get', reverse('tickets:lista')),
+        Cenario('detalhe', tecnico, 'get', reverse('tickets:detalhe', args=[fechado.pk])),
+        Cenario('historico (técnico)', tecnico, 'get', reverse('tickets:historico')),
+        Cenario('historico (usuário)', usuario, 'get', reverse('tickets:historico')),
+        Cenario('buscar', tecnico, 'get', reverse('tickets:buscar'), {'q': 'impressora'}),
+        Cenario('criar (formulário)', usuario, 'get', reverse('tickets:criar')),
+        Cenario('criar', aberto.usuario, 'post', reverse('tickets:criar'), {'subcategoria': aberto.subcategoria_id, 'observacao': 'Teste de carga'}),
+        Cenario('cancelar (confirmação)', aberto.usuario, 'get', reverse('tickets:cancelar', args=[aberto.pk])),
+        Cenario('cancelar', aberto.usuario, 'post', reverse('tickets:cancelar', args=[aberto.pk])),
+        Cenario('aceitar', tecnico, 'get', reverse('tickets:aceitar', args=[aberto.pk])),
+        Cenario('atualizar_status', em_atendimento.tecnico, 'post', reverse('tickets:atualizar_status', args=[em_atendimento.pk]), {'status': Status.AGUARDANDO_TERCEIROS}),
+        Cenario('resolver', em_atendimento.tecnico, 'post', reverse('tickets:resolver', args=[em_atendimento.pk])),
+        Cenario(
+            'operacao_lote', tecnico, 'post', reverse('tickets:operacao_lote'),
+            {'acao': 'aceitar', 'ids': abertos}, content_type='application/json',
+        ),
+        Cenario('criar_incidente (formulário)', tecnico, 'get', reverse('tickets:criar_incidente')),
+        Cenario(
+            'criar_incidente', tecnico, 'post', reverse('tickets:criar_incidente'),
+            {'titulo': 'Teste de carga', 'descricao': 'Teste de carga', 'chamados': ids_abertos},
+        ),
+        Cenario('detalhe_incidente', incidente.tecnico, 'get', reverse('tickets:detalhe_incidente', args=[incidente.pk])),
+        Cenario('vincular_chamados', incidente.tecnico, 'post', reverse('tickets:vincular_chamados', args=[incidente.pk]), {'chamados': ids_abertos}),
+        Cenario(
+            'atualizar_status_incidente', incidente.tecnico, 'post',
+            reverse('tickets:atualizar_status_incidente', args=[incidente.pk]), {'status': Status.AGUARDANDO_TERCEIROS},
+        ),
+        Cenario('comentar_incidente', incidente.tecnico, 'post', reverse('tickets:comentar_incidente', args=[incidente.pk]), {'conteudo': 'Teste de carga'}),
+        Cenario('resolver_incidente', incidente.tecnico, 'post', reverse('tickets:resolver_incidente', args=[incidente.pk]), {'comentario': 'Teste de carga'}),
+        Cenario('avaliar (formulário)', concluido.usuario, 'get', reverse('tickets:avaliar_e_fechar', args=[concluido.pk])),
+        Cenario('avaliar_e_fechar', concluido.usuario, 'post', reverse('tickets:avaliar_e_fechar', args=[concluido.pk]), {'nota': 5}),
+        Cenario('adicionar_anexo', aguardando.usuario, 'post', reverse('tickets:adicionar_anexo', args=[aguardando.pk]), {'caminho': r'\\servidor\arquivo.txt'}),
+        Cenario('adicionar_comentario', tecnico, 'post', reverse('tickets:adicionar_comentario', args=[em_atendimento.pk]), {'conteudo': 'Teste de carga'}),
+        Cenario('comentarios', em_atendimento.usuario, 'get', reverse('tickets:comentarios', args=[em_atendimento.pk])),
+        Cenario('dashboard_usuario', usuario, 'get', reverse('tickets:dashboard_usuario')),
+        Cenario('dashboard_tecnico', tecnico, 'get', reverse('tickets:dashboard_tecnico')),
+        # Fluxo SSE contínuo: mede só a abertura da conexão
+        Cenario('fila_eventos', tecnico, 'get', reverse('tickets:fila_eventos')),
+    ]
+
+
+def _host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def medir(cenario, repeticoes, aquecimento):
+    cliente = Client(HTTP_HOST=_host())
+    cliente.force_login(cenario.usuario, backend=BACKEND_LOGIN)
+    requisitar = getattr(cliente, cenario.metodo)
+    extras = {'content_type': cenario.content_type} if cenario.content_type else {}
+
+    tempos, consultas, status = [], 0, None
+    for rodada in range(aquecimento + repeticoes):
+        # Cada requisição roda numa transação desfeita no final: as ações que
+        # gravam sempre encontram o chamado no mesmo estado e o banco não muda
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as contexto:
+                inicio = time.perf_counter()
+                resposta = requisitar(cenario.url, cenario.dados, **extras)
+                decorrido = (time.perf_counter() - inicio) * 1000
+            resposta.close()
+            transaction.set_rollback(True)
+        if rodada >= aquecimento:
+            tempos.append(decorrido)
+            consultas = max(consultas, len(contexto.captured_queries))
+            status = resposta.status_code
+
+    return {
+        'metodo': cenario.metodo.upper(),
+        'url': cenario.url,
+        'status': status,
+        'consultas': consultas,
+        'ms': resumir(tempos),
+    }
+
+
+def resumir(tempos):
+    resumo = {'media': statistics.fmean(tempos), 'max': max(tempos)}
+    if len(tempos) > 1:
+        quantis = statistics.quantiles(tempos, n=100, method='inclusive')
+        resumo.update({f'p{p}': quantis[p - 1] for p in PERCENTIS})
+    else:
+        resumo.update({f'p{p}': tempos[0] for p in PERCENTIS})
+    return {chave: round(valor, 3) for chave, valor in resumo.items()}
+
+
+def comparar(atual, referencia, tolerancia):
+    """Lista as regressões de 'atual' em relação à linha de base 'referencia'."""
+    regressoes = []
+    for nome, base in referencia['cenarios'].items():
+        medido = atual['cenarios'].get(nome)
+        if medido is None:
+            continue
+        if medido['consultas'] > base['consultas']:
+            regressoes.append(f"{nome}: {base['consultas']} -> {medido['consultas']} consultas")
+        limite = max(base['ms']['p95'] * (1 + tolerancia), base['ms']['p95'] + MARGEM_MINIMA_MS)
+        if medido['ms']['p95'] > limite:
+            regressoes.append(f"{nome}: p95 {base['ms']['p95']:.1f} ms -> {medido['ms']['p95']:.1f} ms")
+    return regressoes
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa cada view de tickets/urls.py com o cliente de testes do Django e grava latência "
+        "(percentis) e número de consultas num JSON de linha de base, opcionalmente comparando com outro."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=20, help="Requisições medidas por cenário.")
+        parser.add_argument('--aquecimento', type=int, default=2, help="Requisições descartadas antes de medir.")
+        parser.add_argument('--saida', default='desempenho.json', help="Arquivo JSON com os resultados.")
+        parser.add_argument('--comparar', help="JSON de uma execução anterior (linha de base) para detectar regressões.")
+        parser.add_argument('--tolerancia', type=float, default=0.2, help="Aumento relativo de p95 aceito (0.2 = 20%%).")
+        parser.add_argument('--cenario', action='append', help="Executa só os cenários com estes nomes.")
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1:
+            raise CommandError("--repeticoes deve ser pelo menos 1.")
+
+        selecionados = cenarios()
+        if options['cenario']:
+            selecionados = [cenario for cenario in selecionados if cenario.nome in options['cenario']]
+
+        resultado = {
+            'data': timezone.now().isoformat(),
+            'banco': connection.vendor,
+            'repeticoes': options['repeticoes'],
+            'chamados': Chamado.objects.count(),
+            'cenarios': {},
+        }
+        for cenario in selecionados:
+            medido = medir(cenario, options['repeticoes'], options['aquecimento'])
+            resultado['cenarios'][cenario.nome] = medido
+            self.stdout.write(
+                f"{cenario.nome:<24} {medido['status']}  {medido['consultas']:>3} consultas  "
+                f"p50 {medido['ms']['p50']:>8.2f} ms  p95 {medido['ms']['p95']:>8.2f} ms"
+            )
+
+        Path(options['saida']).write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(f"Resultados gravados em {options['saida']}.")
+
+        if options['comparar']:
+            referencia = json.loads(Path(options['comparar']).read_text(encoding='utf-8'))
+            regressoes = comparar(resultado, referencia, options['tolerancia'])
+            if regressoes:
+                raise CommandError("Regressões em relação à linha de base:\n" + "\n".join(regressoes))
+            self.stdout.write(self.style.SUCCESS('Nenhuma regressão em relação à linha de base.'))
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from authentication.papeis import GRUPO_TECNICO
+from core.banco import opcoes_sqlite
+from tickets.models import Chamado, Subcategoria
+
+from .medir_desempenho import BACKEND_LOGIN, _host, resumir
+
+# Marca os chamados criados pela medição, apagados no final
+OBSERVACAO = '[medir_escrita] chamado de teste'
+
+
+def _trabalhador(usuario, subcategoria, requisicoes, barreira, resultados):
+    cliente = Client(HTTP_HOST=_host())
+    cliente.force_login(usuario, backend=BACKEND_LOGIN)
+    url = reverse('tickets:criar')
+    dados = {'subcategoria': subcategoria.pk, 'observacao': OBSERVACAO}
+    tempos, status = [], Counter()
+    try:
+        barreira.wait()
+        for _ in range(requisicoes):
+            inicio = time.perf_counter()
+            try:
+                resposta = cliente.post(url, dados)
+                status[resposta.status_code] += 1
+            except Exception as erro:
+                status[type(erro).__name__] += 1
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        # Cada thread tem a própria conexão com o banco
+        connection.close()
+    resultados.append((tempos, status))
+
+
+def medir(usuarios, subcategoria, threads, requisicoes):
+    """Dispara criar_chamado em paralelo, uma thread por cliente, e mede a vazão."""
+    barreira = threading.Barrier(threads + 1)
+    resultados = []
+    trabalhadores = [
+        threading.Thread(target=_trabalhador, args=(usuarios[i % len(usuarios)], subcategoria, requisicoes, barreira, resultados))
+        for i in range(threads)
+    ]
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for trabalhador in trabalhadores:
+        trabalhador.join()
+    duracao = time.perf_counter() - inicio
+
+    tempos, status = [], Counter()
+    for tempos_thread, status_thread in resultados:
+        tempos += tempos_thread
+        status.update(status_thread)
+    # criar_chamado redireciona (302) quando grava
+    gravados = status[302]
+    return {
+        'gravados': gravados,
+        'falhas': sum(status.values()) - gravados,
+        'status': dict(status),
+        'por_segundo': gravados / duracao if duracao else 0,
+        'ms': resumir(tempos),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a vazão de escrita com várias chamadas concorrentes a criar_chamado. "
+        "No SQLite, compara o modo padrão com o modo otimizado (WAL, busy_timeout)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Clientes simultâneos.")
+        parser.add_argument('--requisicoes', type=int, default=25, help="Chamados criados por cliente.")
+        parser.add_argument('--somente-atual', action='store_true',
+                            help="No SQLite, mede só a configuração atual, sem comparar os modos.")
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['requisicoes'] < 1:
+            raise CommandError("--threads e --requisicoes devem ser pelo menos 1.")
+
+        # Usuários comuns sem chamados concluídos (que limitariam a abertura de novos)
+        usuarios = list(
+            get_user_model().objects.exclude(groups__name=GRUPO_TECNICO)
+            .exclude(chamados_criados__status=Chamado.Status.CONCLUIDO)
+            .filter(is_active=True).order_by('pk')[:options['threads']]
+        )
+        subcategoria = Subcategoria.objects.order_by('pk').first()
+        if not usuarios or subcategoria is None:
+            raise CommandError("Sem usuários comuns ou subcategorias. Gere dados antes com 'python manage.py gerar_dados'.")
+
+        configuracao = connections.settings['default']
+        modos = [('atual', configuracao.get('OPTIONS', {}))]
+        if connection.vendor == 'sqlite' and not options['somente_atual']:
+            modos = [('padrão', opcoes_sqlite(otimizado=False)), ('otimizado', opcoes_sqlite())]
+
+        original = configuracao.get('OPTIONS', {})
+        try:
+            for nome, opcoes in modos:
+                # As threads abrem conexões novas com estas opções
+                configuracao['OPTIONS'] = opcoes
+                connection.close()
+                medido = medir(usuarios, subcategoria, options['threads'], options['requisicoes'])
+                self.stdout.write(
+                    f"{nome:<10} {medido['gravados']:>5} gravados  {medido['falhas']:>4} falhas  "
+                    f"{medido['por_segundo']:>8.1f} chamados/s  p50 {medido['ms']['p50']:>8.2f} ms  "
+                    f"p95 {medido['ms']['p95']:>8.2f} ms"
+                )
+                if medido['falhas']:
+                    self.stdout.write(f"           respostas: {medido['status']}")
+        finally:
+            configuracao['OPTIONS'] = original
+            connection.close()
+            apagados, _ = Chamado.objects.filter(observacao=OBSERVACAO).delete()
+            self.stdout.write(f"{apagados} registro(s) da medição apagados.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tickets.models import Chamado
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a posição na fila (data_fila) de todos os chamados com os avanços por prioridade "
+        "atuais (TICKETS_FILA_AVANCO). Rode depois de alterar a configuração."
+    )
+
+    def handle(self, *args, **options):
+        total = Chamado.objects.recalcular_fila()
+        self.stdout.write(self.style.SUCCESS(f'{total} chamados atualizados.'))
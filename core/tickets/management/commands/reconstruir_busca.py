@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from tickets import busca
+from tickets.models import Chamado, Comentario, DocumentoBusca, LogTecnico
+
+
+class Command(BaseCommand):
+    help = "Reconstrói do zero o índice de busca de texto (documentos e índice FTS5/GIN)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Banco de dados a reindexar.")
+
+    def handle(self, *args, **options):
+        using = options['database']
+        backend = busca.obter_backend(using)
+
+        with transaction.atomic(using=using):
+            # Sem o índice (e seus triggers) a carga em lote é bem mais rápida
+            with connections[using].cursor() as cursor:
+                backend.desativar(cursor)
+            DocumentoBusca.objects.using(using).all().delete()
+
+            origens = [
+                ('chamados', Chamado.objects.using(using).select_related('subcategoria__categoria'), busca.documento_chamado),
+                ('comentários', Comentario.objects.using(using).only('id', 'chamado_id', 'conteudo'), busca.documento_comentario),
+                ('logs', LogTecnico.objects.using(using).exclude(detalhes__isnull=True).exclude(detalhes='').only('id', 'chamado_id', 'detalhes'), busca.documento_log),
+            ]
+            for nome, queryset, documento in origens:
+                total, lote = 0, []
+                for objeto in queryset.order_by().iterator(chunk_size=busca.TAMANHO_LOTE):
+                    lote.append(documento(objeto))
+                    if len(lote) >= busca.TAMANHO_LOTE:
+                        busca.salvar_documentos(lote, using=using)
+                        total += len(lote)
+                        lote = []
+                busca.salvar_documentos(lote, using=using)
+                total += len(lote)
+                self.stdout.write(f'{total} {nome} indexados.')
+
+        backend = busca.preparar_indice(using) or backend
+        with connections[using].cursor() as cursor:
+            backend.reconstruir(cursor)
+        self.stdout.write(self.style.SUCCESS('Índice de busca reconstruído.'))
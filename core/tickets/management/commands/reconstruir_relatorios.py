@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tickets import relatorios
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula do zero os resumos mensais dos relatórios (tempo de aceite e de resolução, "
+        "reaberturas e notas por técnico e categoria) a partir dos logs dos chamados."
+    )
+
+    def handle(self, *args, **options):
+        linhas = relatorios.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'{linhas} linhas de resumo gravadas.'))
@@ -0,0 +1,159 @@
+import heapq
+import random
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import fila
+from tickets.models import Chamado
+from tickets.roteamento import PESOS_PRIORIDADE, MotorRoteamento
+
+from .medir_desempenho import resumir
+
+Prioridade = Chamado.Prioridade
+
+# Mesma distribuição de prioridades de gerar_dados
+PESOS_CHEGADA = {Prioridade.BAIXA: 70, Prioridade.MEDIA: 20, Prioridade.ALTA: 10}
+
+
+def politicas():
+    """
+    Ordens da espera comparadas, como (pesos, avanço em minutos): a da fila do
+    painel (avanço por prioridade e envelhecimento, TICKETS_FILA_AVANCO), a
+    prioridade estrita e a ordem de chegada pura.
+    """
+    avanco = {prioridade: avanco.total_seconds() / 60 for prioridade, avanco in fila.avancos().items()}
+    return {
+        'fila': ({}, avanco),
+        'prioridade': (PESOS_PRIORIDADE, None),
+        'fifo': ({}, None),
+    }
+
+
+@dataclass
+class Chegada:
+    id: int
+    minuto: float
+    subcategoria: int
+    prioridade: str
+    duracao: float
+
+
+def gerar_habilidades(tecnicos, subcategorias, por_tecnico, aleatorio):
+    """Pares (subcategoria, técnico); toda subcategoria tem pelo menos um técnico."""
+    pares = {(subcategoria, subcategoria % tecnicos) for subcategoria in range(subcategorias)}
+    for tecnico in range(tecnicos):
+        for subcategoria in aleatorio.sample(range(subcategorias), min(por_tecnico, subcategorias)):
+            pares.add((subcategoria, tecnico))
+    return sorted(pares)
+
+
+def gerar_chegadas(quantidade, por_hora, duracao_media, subcategorias, aleatorio):
+    """Fluxo de chamados com chegadas de Poisson e tempo de atendimento exponencial (minutos)."""
+    chegadas, minuto = [], 0.0
+    prioridades, pesos = list(PESOS_CHEGADA), list(PESOS_CHEGADA.values())
+    for chamado_id in range(1, quantidade + 1):
+        minuto += aleatorio.expovariate(por_hora / 60)
+        chegadas.append(Chegada(
+            id=chamado_id,
+            minuto=minuto,
+            subcategoria=aleatorio.randrange(subcategorias),
+            prioridade=aleatorio.choices(prioridades, pesos)[0],
+            duracao=aleatorio.expovariate(1 / duracao_media),
+        ))
+    return chegadas
+
+
+def simular(chegadas, habilidades, limite, pesos=PESOS_PRIORIDADE, avanco=None):
+    """
+    Reproduz as chegadas no MotorRoteamento (simulação de eventos discretos)
+    e devolve o tempo de espera, em minutos, de cada chamado por prioridade.
+    Com 'avanco', a espera é ordenada como data_fila (ver tickets/fila.py).
+    """
+    motor = MotorRoteamento(habilidades, limite=limite, pesos=pesos)
+    por_id = {chegada.id: chegada for chegada in chegadas}
+    # (minuto, desempate, tipo, dado): a chegada de um chamado ou o fim de um atendimento
+    eventos = [(chegada.minuto, chegada.id, 'chegada', chegada.id) for chegada in chegadas]
+    heapq.heapify(eventos)
+    esperas = defaultdict(list)
+    sequencia = len(chegadas)
+
+    def iniciar(chamado_id, tecnico, minuto):
+        nonlocal sequencia
+        chegada = por_id[chamado_id]
+        motor.ajustar_carga(tecnico, 1)
+        esperas[chegada.prioridade].append(minuto - chegada.minuto)
+        sequencia += 1
+        heapq.heappush(eventos, (minuto + chegada.duracao, sequencia, 'fim', tecnico))
+
+    while eventos:
+        minuto, _, tipo, dado = heapq.heappop(eventos)
+        if tipo == 'chegada':
+            chegada = por_id[dado]
+            posicao = chegada.minuto - (avanco or {}).get(chegada.prioridade, 0)
+            tecnico = motor.chegada(chegada.id, chegada.subcategoria, chegada.prioridade, posicao)
+            if tecnico is not None:
+                iniciar(chegada.id, tecnico, minuto)
+        else:
+            motor.ajustar_carga(dado, -1)
+            while (chamado_id := motor.proximo_para(dado)) is not None:
+                iniciar(chamado_id, dado, minuto)
+    return esperas
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula a distribuição automática com um fluxo sintético de chamados e mostra o tempo "
+        "de espera na fila por prioridade, comparando a ordem da fila (prioridade com envelhecimento), "
+        "a prioridade estrita e a ordem de chegada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chamados', type=int, default=5000, help="Chamados no fluxo simulado.")
+        parser.add_argument('--por-hora', type=float, default=18, help="Média de chamados abertos por hora.")
+        parser.add_argument('--duracao', type=float, default=90, help="Tempo médio de atendimento (minutos).")
+        parser.add_argument('--tecnicos', type=int, default=6, help="Técnicos simulados.")
+        parser.add_argument('--subcategorias', type=int, default=12, help="Subcategorias simuladas.")
+        parser.add_argument('--habilidades', type=int, default=4, help="Subcategorias atendidas por técnico.")
+        parser.add_argument('--limite', type=int, default=None,
+                            help="Chamados ativos por técnico (padrão: TICKETS_ROTEAMENTO_LIMITE).")
+        parser.add_argument('--semente', type=int, default=42, help="Semente do gerador aleatório.")
+
+    def handle(self, *args, **options):
+        for opcao in ('chamados', 'tecnicos', 'subcategorias', 'habilidades'):
+            if options[opcao] < 1:
+                raise CommandError(f"--{opcao} deve ser pelo menos 1.")
+        if options['por_hora'] <= 0 or options['duracao'] <= 0:
+            raise CommandError("--por-hora e --duracao devem ser positivos.")
+        limite = options['limite'] or settings.TICKETS_ROTEAMENTO_LIMITE
+
+        aleatorio = random.Random(options['semente'])
+        habilidades = gerar_habilidades(options['tecnicos'], options['subcategorias'], options['habilidades'], aleatorio)
+        chegadas = gerar_chegadas(
+            options['chamados'], options['por_hora'], options['duracao'], options['subcategorias'], aleatorio,
+        )
+        self.stdout.write(
+            f"{len(chegadas)} chamados, {options['tecnicos']} técnicos, limite {limite} por técnico "
+            f"(espera em minutos)"
+        )
+
+        for politica, (pesos, avanco) in politicas().items():
+            esperas = simular(chegadas, habilidades, limite, pesos, avanco)
+            self.stdout.write(f"\n{politica}")
+            todas = []
+            for prioridade in (Prioridade.ALTA, Prioridade.MEDIA, Prioridade.BAIXA):
+                tempos = esperas.get(prioridade)
+                if tempos:
+                    todas += tempos
+                    self._linha(Prioridade(prioridade).label, tempos)
+            self._linha('Total', todas)
+
+    def _linha(self, rotulo, tempos):
+        resumo = resumir(tempos)
+        sem_espera = sum(1 for tempo in tempos if tempo == 0) / len(tempos) * 100
+        self.stdout.write(
+            f"  {rotulo:<6} {len(tempos):>6} chamados  sem espera {sem_espera:>5.1f}%  média {resumo['media']:>8.1f}  "
+            f"p50 {resumo['p50']:>8.1f}  p95 {resumo['p95']:>8.1f}  máx {resumo['max']:>8.1f}"
+        )
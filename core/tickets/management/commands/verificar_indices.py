@@ -0,0 +1,82 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from tickets import fila
+from tickets.models import Chamado, Comentario, LogTecnico
+from tickets.paginacao import ITENS_POR_PAGINA_PADRAO, KeysetPaginator
+
+# Qualquer id serve: o plano de execução não depende do valor
+USUARIO_EXEMPLO = 0
+
+
+def consultas_criticas():
+    """
+    As consultas mais frequentes das views, montadas da mesma forma que nas views.
+    """
+    pendentes = Chamado.objects.filter(usuario_id=USUARIO_EXEMPLO, status=Chamado.Status.CONCLUIDO)
+    fechados = Chamado.objects.para_historico().filter(status=Chamado.Status.FECHADO)
+    return [
+        ('dashboard_tecnico: fila', Chamado.objects.na_fila()[:fila.TAMANHO_PADRAO]),
+        ('dashboard_tecnico: meus atendimentos', Chamado.objects.em_atendimento_por(USUARIO_EXEMPLO)),
+        ('dashboard_usuario', Chamado.objects.filter(usuario_id=USUARIO_EXEMPLO).exclude(status=Chamado.Status.FECHADO).order_by('-data_abertura')),
+        ('criar_chamado: pendentes de avaliação', pendentes),
+        ('lista_chamados (técnico)', KeysetPaginator(Chamado.objects.all(), 'data_abertura', ITENS_POR_PAGINA_PADRAO).consulta()),
+        ('lista_chamados (usuário)', KeysetPaginator(Chamado.objects.filter(usuario_id=USUARIO_EXEMPLO), 'data_abertura', ITENS_POR_PAGINA_PADRAO).consulta()),
+        ('historico_chamados (técnico)', KeysetPaginator(fechados, 'data_historico', ITENS_POR_PAGINA_PADRAO).consulta()),
+        ('historico_chamados (usuário)', KeysetPaginator(fechados.filter(usuario_id=USUARIO_EXEMPLO), 'data_historico', ITENS_POR_PAGINA_PADRAO).consulta()),
+        ('logs do chamado', LogTecnico.objects.filter(chamado_id=0)),
+        ('comentarios_chamado', KeysetPaginator(Comentario.objects.filter(chamado_id=0), 'data_criacao', ITENS_POR_PAGINA_PADRAO).consulta()),
+    ]
+
+
+def _usa_indice_sqlite(plano, tabela):
+    linhas = [linha for linha in plano.splitlines() if f' {tabela}' in linha]
+    # "SCAN tabela" sem "USING" é uma leitura completa da tabela
+    if any(re.search(rf'SCAN {tabela}\s*$', linha) for linha in linhas):
+        return False
+    return any('USING' in linha and ('INDEX' in linha or 'PRIMARY KEY' in linha) for linha in linhas)
+
+
+def _usa_indice_postgresql(plano, tabela):
+    if f'Seq Scan on {tabela}' in plano:
+        return False
+    return any(tipo in plano for tipo in ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'))
+
+
+class Command(BaseCommand):
+    help = "Verifica com EXPLAIN se as consultas críticas das views usam índices (SQLite e PostgreSQL)."
+
+    def handle(self, *args, **options):
+        fornecedor = connection.vendor
+        if fornecedor == 'sqlite':
+            usa_indice = _usa_indice_sqlite
+        elif fornecedor == 'postgresql':
+            usa_indice = _usa_indice_postgresql
+        else:
+            raise CommandError(f"Banco de dados '{fornecedor}' não suportado por este comando.")
+
+        falhas = []
+        for nome, queryset in consultas_criticas():
+            tabela = queryset.model._meta.db_table
+            with transaction.atomic():
+                if fornecedor == 'postgresql':
+                    # Com tabelas pequenas o PostgreSQL prefere Seq Scan; desliga para
+                    # verificar se existe um índice utilizável para a consulta
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                plano = queryset.explain()
+
+            if usa_indice(plano, tabela):
+                self.stdout.write(self.style.SUCCESS(f'OK     {nome}'))
+            else:
+                falhas.append(nome)
+                self.stdout.write(self.style.ERROR(f'FALHOU {nome}'))
+            if options['verbosity'] > 1 or nome in falhas:
+                for linha in plano.splitlines():
+                    self.stdout.write(f'         {linha}')
+
+        if falhas:
+            raise CommandError(f"{len(falhas)} consulta(s) sem uso de índice: {', '.join(falhas)}")
+        self.stdout.write(self.style.SUCCESS('Todas as consultas críticas usam índices.'))
@@ -0,0 +1,172 @@
+# tickets/metricas.py
+"""
+Métricas por view (latência, consultas SQL, tempo de banco e SQL repetido),
+agregadas em memória no próprio processo pelo MetricasMiddleware.
+
+Os números são de cada processo: com vários workers, cada um expõe os seus
+(o Prometheus deve coletar de cada worker, não através do balanceador).
+"""
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.utils import timezone
+
+# Limites superiores (em segundos) dos baldes do histograma de latência
+BALDES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+VIEW_NAO_RESOLVIDA = '<não resolvida>'
+
+
+class ColetorConsultas:
+    """
+    execute_wrapper que mede as consultas de uma requisição.
+    Guarda só o SQL sem parâmetros: o mesmo texto repetido numa requisição
+    é quase sempre um N+1.
+    """
+
+    def __init__(self):
+        self.quantidade = 0
+        self.tempo = 0.0
+        self.textos = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo += time.perf_counter() - inicio
+            self.quantidade += 1
+            self.textos[sql] += 1
+
+    @property
+    def repetidas(self):
+        return sum(vezes - 1 for vezes in self.textos.values() if vezes > 1)
+
+    def mais_repetida(self):
+        if not self.textos:
+            return None, 0
+        return self.textos.most_common(1)[0]
+
+
+@dataclass
+class EstatisticaView:
+    requisicoes: int = 0
+    erros: int = 0
+    soma_latencia: float = 0.0
+    max_latencia: float = 0.0
+    baldes: list = field(default_factory=lambda: [0] * (len(BALDES_LATENCIA) + 1))
+    consultas: int = 0
+    max_consultas: int = 0
+    tempo_bd: float = 0.0
+    repetidas: int = 0
+    # SQL mais repetido já visto numa única requisição desta view
+    sql_repetido: str = ''
+    max_repeticoes: int = 0
+
+    def registrar(self, latencia, status, coletor):
+        self.requisicoes += 1
+        self.erros += status >= 500
+        self.soma_latencia += latencia
+        self.max_latencia = max(self.max_latencia, latencia)
+        self.baldes[self._balde(latencia)] += 1
+        self.consultas += coletor.quantidade
+        self.max_consultas = max(self.max_consultas, coletor.quantidade)
+        self.tempo_bd += coletor.tempo
+        self.repetidas += coletor.repetidas
+        sql, vezes = coletor.mais_repetida()
+        if vezes > 1 and vezes > self.max_repeticoes:
+            self.sql_repetido, self.max_repeticoes = sql, vezes
+
+    @staticmethod
+    def _balde(latencia):
+        for indice, limite in enumerate(BALDES_LATENCIA):
+            if latencia <= limite:
+                return indice
+        return len(BALDES_LATENCIA)
+
+    def percentil(self, p):
+        """Estimativa pelo limite superior do balde (como histogram_quantile)."""
+        alvo = self.requisicoes * p / 100
+        acumulado = 0
+        for indice, quantidade in enumerate(self.baldes):
+            acumulado += quantidade
+            if quantidade and acumulado >= alvo:
+                return BALDES_LATENCIA[indice] if indice < len(BALDES_LATENCIA) else self.max_latencia
+        return 0.0
+
+    @property
+    def media_latencia(self):
+        return self.soma_latencia / self.requisicoes if self.requisicoes else 0.0
+
+    @property
+    def media_consultas(self):
+        return self.consultas / self.requisicoes if self.requisicoes else 0.0
+
+
+class Metricas:
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+        self.inicio = timezone.now()
+
+    def registrar(self, view, latencia, status, coletor):
+        with self._lock:
+            estatistica = self._views.get(view)
+            if estatistica is None:
+                estatistica = self._views[view] = EstatisticaView()
+            estatistica.registrar(latencia, status, coletor)
+
+    def instantaneo(self):
+        """Cópia consistente de todas as estatísticas, ordenadas pelo nome da view."""
+        with self._lock:
+            return {
+                view: EstatisticaView(**{**vars(estatistica), 'baldes': list(estatistica.baldes)})
+                for view, estatistica in sorted(self._views.items())
+            }
+
+    def zerar(self):
+        with self._lock:
+            self._views.clear()
+            self.inicio = timezone.now()
+
+
+metricas = Metricas()
+
+
+# --- Exportação no formato de texto do Prometheus ---
+
+def _rotulo(valor):
+    return valor.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def formato_prometheus(instantaneo=None):
+    instantaneo = metricas.instantaneo() if instantaneo is None else instantaneo
+    linhas = [
+        '# HELP tickets_requisicao_duracao_segundos Latência das requisições por view.',
+        '# TYPE tickets_requisicao_duracao_segundos histogram',
+    ]
+    for view, estatistica in instantaneo.items():
+        rotulo = f'view="{_rotulo(view)}"'
+        acumulado = 0
+        for limite, quantidade in zip(BALDES_LATENCIA + ('+Inf',), estatistica.baldes):
+            acumulado += quantidade
+            linhas.append(f'tickets_requisicao_duracao_segundos_bucket{{{rotulo},le="{limite}"}} {acumulado}')
+        linhas.append(f'tickets_requisicao_duracao_segundos_sum{{{rotulo}}} {estatistica.soma_latencia:.6f}')
+        linhas.append(f'tickets_requisicao_duracao_segundos_count{{{rotulo}}} {estatistica.requisicoes}')
+
+    contadores = [
+        ('tickets_requisicao_erros_total', 'counter', 'Respostas 5xx por view.', 'erros'),
+        ('tickets_consultas_sql_total', 'counter', 'Consultas SQL executadas por view.', 'consultas'),
+        ('tickets_consultas_sql_repetidas_total', 'counter', 'Consultas com SQL repetido na mesma requisição (N+1).', 'repetidas'),
+        ('tickets_tempo_banco_segundos_total', 'counter', 'Tempo gasto no banco de dados por view.', 'tempo_bd'),
+        ('tickets_consultas_sql_max', 'gauge', 'Maior número de consultas numa única requisição.', 'max_consultas'),
+    ]
+    for nome, tipo, ajuda, atributo in contadores:
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        for view, estatistica in instantaneo.items():
+            valor = getattr(estatistica, atributo)
+            valor = f'{valor:.6f}' if isinstance(valor, float) else valor
+            linhas.append(f'{nome}{{view="{_rotulo(view)}"}} {valor}')
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,40 @@
+# tickets/middleware.py
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metricas import VIEW_NAO_RESOLVIDA, ColetorConsultas, metricas
+
+
+class MetricasMiddleware:
+    """
+    Mede cada requisição e agrega por nome de URL (ex.: 'tickets:lista'):
+    latência, número de consultas, tempo de banco e SQL repetido.
+    Deve vir logo depois de core.logs.RequestIdMiddleware, antes dos demais:
+    mede também os outros middlewares, e o que ele registra já sai com o
+    request_id.
+    Desligado com TICKETS_METRICAS_ATIVAS = False.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.ativo = getattr(settings, 'TICKETS_METRICAS_ATIVAS', True)
+
+    def __call__(self, request):
+        if not self.ativo:
+            return self.get_response(request)
+
+        coletor = ColetorConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as pilha:
+            for alias in connections:
+                pilha.enter_context(connections[alias].execute_wrapper(coletor))
+            resposta = self.get_response(request)
+        latencia = time.perf_counter() - inicio
+
+        correspondencia = getattr(request, 'resolver_match', None)
+        view = correspondencia.view_name if correspondencia else VIEW_NAO_RESOLVIDA
+        metricas.registrar(view, latencia, resposta.status_code, coletor)
+        return resposta
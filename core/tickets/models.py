@@ -1,10 +1,21 @@
 import os
 from django.db import models
 from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import fila
 
 Usuario = settings.AUTH_USER_MODEL
 
+
+def data_historico():
+    """Ordem do histórico (e expressão dos índices dele): data de conclusão ou de abertura."""
+    return Coalesce('data_conclusao', 'data_abertura')
+
 class Categoria(models.Model):
     nome = models.CharField(max_length=100, unique=True, verbose_name="Nome")
 
@@ -18,6 +29,63 @@ class Subcategoria(models.Model):
     def __str__(self):
         return f"{self.categoria.nome} - {self.nome}"
 
+class ChamadoQuerySet(models.QuerySet):
+    """
+    "Formatos" de consulta nomeados para cada tipo de tela, já com os
+    select_related/prefetch_related que o template correspondente precisa.
+    Assim o número de consultas de uma página não cresce com o número de linhas.
+    """
+
+    # Campos usados pelas linhas de listagem (dashboards, lista e histórico)
+    CAMPOS_LINHA = (
+        'id', 'status', 'prioridade', 'data_abertura', 'data_conclusao', 'data_fila',
+        'subcategoria', 'subcategoria__nome',
+        'usuario', 'usuario__username', 'usuario__first_name', 'usuario__last_name',
+        'tecnico', 'tecnico__username', 'tecnico__first_name', 'tecnico__last_name',
+    )
+
+    def para_lista(self):
+        return self.select_related('subcategoria', 'usuario', 'tecnico').only(*self.CAMPOS_LINHA)
+
+    def para_historico(self):
+        # O histórico mostra as mesmas colunas da lista, mais a data de conclusão.
+        # Chamados fechados sem data de conclusão (fechados pelo admin, dados
+        # antigos) entram pela data de abertura, em vez de sumirem da paginação
+        return self.para_lista().annotate(data_historico=data_historico())
+
+    def para_acao(self):
+        # Telas de confirmação e ações que salvam o chamado (sem only(), pois há save())
+        return self.select_related('subcategoria', 'usuario', 'tecnico')
+
+    def na_fila(self):
+        # Deve coincidir com a condição e a ordem do índice parcial 'chamado_fila_idx'.
+        # data_fila já combina prioridade e tempo de espera (ver tickets/fila.py)
+        return self.filter(status=Chamado.Status.ABERTO, tecnico__isnull=True).order_by(fila.posicao(), 'id')
+
+    def recalcular_fila(self):
+        # Um UPDATE com a posição na fila de todos os chamados do queryset
+        return self.update(data_fila=fila.expressao_data_fila())
+
+    def em_atendimento_por(self, tecnico):
+        # Filtra pelos status ativos (IN) em vez de excluir os finalizados (NOT IN),
+        # para que a busca use o índice (tecnico, status, data_abertura)
+        return self.filter(tecnico=tecnico, status__in=Chamado.STATUS_ATIVOS).order_by('data_abertura')
+
+    def contagem_por_status(self):
+        # Uma única consulta com agregação condicional para todos os status
+        totais = self.aggregate(**{
+            status: models.Count('pk', filter=models.Q(status=status))
+            for status in Chamado.Status.values
+        })
+        return {status: totais[status] or 0 for status in Chamado.Status.values}
+
+    def para_detalhe(self):
+        # Anexos, comentários e setor do solicitante ficam em querysets
+        # preguiçosos (ver detalhe_chamado): com os fragmentos do template em
+        # cache, ou numa resposta 304, essas consultas nem chegam a ser feitas
+        return self.select_related('subcategoria', 'usuario', 'tecnico', 'avaliacao')
+
+
 class Chamado(models.Model):
     class Prioridade(models.TextChoices):
         BAIXA = 'BAIXA', 'Baixa'
@@ -42,25 +110,133 @@ class Chamado(models.Model):
     status = models.CharField(max_length=30, choices=Status.choices, default=Status.ABERTO, verbose_name="Status")
     data_abertura = models.DateTimeField(auto_now_add=True, verbose_name="Data de Abertura")
     data_conclusao = models.DateTimeField(null=True, blank=True, verbose_name="Data de Conclusão")
+    # Posição na fila: data de abertura adiantada conforme a prioridade (ver tickets/fila.py)
+    data_fila = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Posição na Fila")
+    # Mudam a cada gravação do chamado ou de comentários, anexos e avaliação
+    # (ver tickets/versoes.py); usados no cache de fragmentos e no ETag do detalhe
+    versao = models.PositiveIntegerField(default=1, editable=False, verbose_name="Versão")
+    atualizado_em = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Atualizado em")
+    # Incidente mestre (ex.: parada geral) que este chamado acompanha; ver tickets/incidentes.py
+    incidente = models.ForeignKey(
+        'Incidente', on_delete=models.SET_NULL, null=True, blank=True, db_index=False,
+        related_name="chamados", verbose_name="Incidente",
+    )
+
+    objects = ChamadoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Paginação por cursor (keyset) de lista_chamados e historico_chamados
+            models.Index(fields=['-data_abertura', '-id'], name='chamado_abertura_idx'),
+            models.Index(fields=['usuario', '-data_abertura', '-id'], name='chamado_usuario_abertura_idx'),
+            models.Index(
+                models.F('status'), data_historico().desc(), models.F('id').desc(),
+                name='chamado_status_conclusao_idx',
+            ),
+            models.Index(
+                models.F('usuario'), models.F('status'), data_historico().desc(), models.F('id').desc(),
+                name='chamado_usr_status_concl_idx',
+            ),
+            # Fila de chamados abertos e sem técnico (índice parcial: só as linhas da fila)
+            models.Index(
+                fila.posicao(), models.F('id'),
+                name='chamado_fila_idx',
+                condition=models.Q(status='ABERTO', tecnico__isnull=True),
+            ),
+            # Atendimentos em andamento de um técnico (dashboard_tecnico)
+            models.Index(fields=['tecnico', 'status', 'data_abertura'], name='chamado_tecnico_status_idx'),
+            # Chamados ativos de um incidente (propagação e contagem no dashboard_tecnico)
+            models.Index(fields=['incidente', 'status'], name='chamado_incidente_status_idx'),
+        ]
+
+    STATUS_FINALIZADOS = [
+        Status.CONCLUIDO,
+        Status.FECHADO,
+        Status.CANCELADO,
+    ]
+    STATUS_ATIVOS = [
+        Status.ABERTO,
+        Status.EM_ATENDIMENTO,
+        Status.AGUARDANDO_RESPOSTA,
+        Status.AGUARDANDO_TERCEIROS,
+    ]
 
     # --- Métodos do Modelo ---
     def __str__(self):
         return f"Chamado #{self.id} ({self.subcategoria.nome}) - Status: {self.get_status_display()}"
 
+    def save(self, *args, **kwargs):
+        self.atualizado_em = timezone.now()
+        # Na criação, data_abertura (auto_now_add) ainda não foi preenchida
+        self.data_fila = fila.data_fila(self.data_abertura or self.atualizado_em, self.prioridade)
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        # Incremento no banco: a instância pode estar com uma versão antiga
+        versao = self.versao
+        self.versao = models.F('versao') + 1
+        if kwargs.get('update_fields') is not None:
+            campos = {'versao', 'atualizado_em'}
+            if 'prioridade' in kwargs['update_fields']:
+                campos.add('data_fila')
+            kwargs['update_fields'] = {*kwargs['update_fields'], *campos}
+        super().save(*args, **kwargs)
+        # Sem reler do banco, como em executar_transicao_em_lote: o valor em
+        # memória só acompanha o incremento (o ETag também usa atualizado_em)
+        self.versao = versao + 1
+
     @property
     def esta_finalizado(self):
-        return self.status in [
-            self.Status.CONCLUIDO,
-            self.Status.FECHADO,
-            self.Status.CANCELADO,
+        return self.status in self.STATUS_FINALIZADOS
+
+class IncidenteQuerySet(models.QuerySet):
+    def ativos_de(self, tecnico):
+        # Com o total de chamados ainda ativos de cada incidente, numa única consulta
+        return (
+            self.filter(tecnico=tecnico, status__in=Chamado.STATUS_ATIVOS)
+            .annotate(total_chamados=models.Count('chamados', filter=models.Q(chamados__status__in=Chamado.STATUS_ATIVOS)))
+            .order_by('data_abertura')
+        )
+
+
+class Incidente(models.Model):
+    """
+    Problema comum a vários chamados (ex.: uma parada geral). O técnico
+    trabalha no incidente e o status, os comentários e a resolução são
+    repassados aos chamados vinculados.
+    """
+    titulo = models.CharField(max_length=200, verbose_name="Título")
+    descricao = models.TextField(blank=True, verbose_name="Descrição")
+    tecnico = models.ForeignKey(Usuario, on_delete=models.PROTECT, related_name="incidentes", verbose_name="Técnico Responsável")
+    status = models.CharField(max_length=30, choices=Chamado.Status.choices, default=Chamado.Status.EM_ATENDIMENTO, verbose_name="Status")
+    data_abertura = models.DateTimeField(auto_now_add=True, verbose_name="Data de Abertura")
+    data_conclusao = models.DateTimeField(null=True, blank=True, verbose_name="Data de Conclusão")
+
+    objects = IncidenteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tecnico', 'status', 'data_abertura'], name='incidente_tecnico_status_idx'),
         ]
 
+    def __str__(self):
+        return f"Incidente #{self.id} - {self.titulo}"
+
+    @property
+    def esta_finalizado(self):
+        return self.status in Chamado.STATUS_FINALIZADOS
+
 class Comentario(models.Model):
     chamado = models.ForeignKey(Chamado, on_delete=models.CASCADE, related_name="comentarios")
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, verbose_name="Autor do Comentário")
     conteudo = models.TextField(verbose_name="Conteúdo")
     data_criacao = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
 
+    class Meta:
+        indexes = [
+            # Carregamento incremental dos comentários de um chamado (cursor em data_criacao, id)
+            models.Index(fields=['chamado', 'data_criacao', 'id'], name='comentario_chamado_data_idx'),
+        ]
+
     def __str__(self):
         return f"Comentário de {self.usuario.username} no Chamado #{self.chamado.id}"
 
@@ -104,6 +280,102 @@ class LogTecnico(models.Model):
     class Meta:
         # Ordena os logs do mais recente para o mais antigo por padrão
         ordering = ['-data_evento']
+        indexes = [
+            models.Index(fields=['chamado', '-data_evento'], name='logtecnico_chamado_evento_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.data_evento.strftime('%d/%m/%Y %H:%M')} - {self.tecnico.username} - {self.tipo_acao.nome_exibicao}"
+
+class Habilidade(models.Model):
+    """Subcategoria que um técnico atende; usada na distribuição automática (tickets/roteamento.py)."""
+    tecnico = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="habilidades", verbose_name="Técnico")
+    subcategoria = models.ForeignKey(Subcategoria, on_delete=models.CASCADE, related_name="habilidades", verbose_name="Subcategoria")
+
+    class Meta:
+        verbose_name_plural = "Habilidades"
+        constraints = [
+            models.UniqueConstraint(fields=['tecnico', 'subcategoria'], name='habilidade_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.tecnico} - {self.subcategoria}"
+
+class RegraPrioridade(models.Model):
+    """
+    Regra que define a prioridade de um chamado novo (ver tickets/prioridades.py).
+    Todas as condições preenchidas precisam valer; entre as regras que valem
+    para o chamado, fica a maior prioridade. Sem nenhuma, o chamado fica com
+    a prioridade padrão.
+    """
+    nome = models.CharField(max_length=100, verbose_name="Nome")
+    prioridade = models.CharField(max_length=20, choices=Chamado.Prioridade.choices, verbose_name="Prioridade")
+    grupo = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Grupo do solicitante")
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Categoria")
+    subcategoria = models.ForeignKey(Subcategoria, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Subcategoria")
+    palavras_chave = models.CharField(
+        max_length=255, blank=True, verbose_name="Palavras-chave",
+        help_text="Separadas por vírgula; vale se qualquer uma aparecer na observação do chamado.",
+    )
+    ativa = models.BooleanField(default=True, verbose_name="Ativa")
+
+    class Meta:
+        verbose_name = "Regra de prioridade"
+        verbose_name_plural = "Regras de prioridade"
+
+    def __str__(self):
+        return f"{self.nome} ({self.get_prioridade_display()})"
+
+    def clean(self):
+        if not (self.grupo_id or self.categoria_id or self.subcategoria_id or self.palavras_chave.strip()):
+            raise ValidationError("Preencha pelo menos uma condição (grupo, categoria, subcategoria ou palavras-chave).")
+
+class ResumoMensal(models.Model):
+    """
+    Totais de um mês por técnico e categoria, mantidos por tickets/relatorios.py
+    a cada evento. Tempos em segundos; as médias são soma / quantidade.
+    """
+    mes = models.DateField(verbose_name="Mês", help_text="Primeiro dia do mês")
+    tecnico = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="resumos_mensais", verbose_name="Técnico")
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name="resumos_mensais")
+    aceites = models.PositiveIntegerField(default=0)
+    tempo_aceite = models.PositiveBigIntegerField(default=0, help_text="Soma dos tempos da abertura ao aceite")
+    resolucoes = models.PositiveIntegerField(default=0)
+    tempo_resolucao = models.PositiveBigIntegerField(default=0, help_text="Soma dos tempos da abertura à conclusão")
+    reaberturas = models.PositiveIntegerField(default=0, help_text="Resoluções de chamados já resolvidos antes")
+    avaliacoes = models.PositiveIntegerField(default=0)
+    soma_notas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumo mensal"
+        verbose_name_plural = "Resumos mensais"
+        constraints = [
+            models.UniqueConstraint(fields=['mes', 'tecnico', 'categoria'], name='resumomensal_chave_unica'),
+        ]
+
+    def __str__(self):
+        return f"Resumo de {self.mes:%m/%Y} (técnico #{self.tecnico_id}, categoria #{self.categoria_id})"
+
+class DocumentoBusca(models.Model):
+    """
+    Texto pesquisável de um chamado, comentário ou log, já normalizado
+    (minúsculas e sem acentos). É a tabela de conteúdo do índice de texto
+    completo (FTS5 no SQLite, tsvector no PostgreSQL), mantida por tickets/busca.py.
+    """
+    class Origem(models.TextChoices):
+        CHAMADO = 'CHAMADO', 'Chamado'
+        COMENTARIO = 'COMENTARIO', 'Comentário'
+        LOG = 'LOG', 'Log Técnico'
+
+    chamado = models.ForeignKey(Chamado, on_delete=models.CASCADE, related_name="documentos_busca")
+    origem = models.CharField(max_length=20, choices=Origem.choices)
+    origem_id = models.PositiveBigIntegerField()
+    texto = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['origem', 'origem_id'], name='documentobusca_origem_unica'),
+        ]
 
     def __str__(self):
-        return f"{self.data_evento.strftime('%d/%m/%Y %H:%M')} - {self.tecnico.username} - {self.tipo_acao.nome_exibicao}"
\ No newline at end of file
+        return f"{self.get_origem_display()} #{self.origem_id} (Chamado #{self.chamado_id})"
@@ -0,0 +1,98 @@
+# tickets/operacoes.py
+"""
+Operações de técnicos em vários chamados de uma vez (ex.: todos os chamados
+de uma parada geral): aceitar, mudar o status, resolver ou comentar.
+
+Cada chamado é validado com as mesmas regras das views individuais; os que
+passam são alterados juntos, numa única transação, com um UPDATE para a
+transição e um bulk_create para os comentários e para os logs.
+"""
+from dataclasses import dataclass, field
+
+from . import busca
+from .eventos import lote_eventos, registrar_evento
+from .models import Chamado, Comentario
+from .transicoes import TRANSICOES, executar_transicao_em_lote
+from .versoes import campos_nova_versao
+
+ACOES_LOTE = ('aceitar', 'atualizar_status', 'resolver', 'comentar')
+LIMITE_LOTE = 200
+
+EVENTOS = {'aceitar': 'ACEITE', 'atualizar_status': 'STATUS_UPDATE', 'resolver': 'RESOLUCAO'}
+
+
+@dataclass
+class ResultadoLote:
+    aplicados: list = field(default_factory=list)
+    # id do chamado -> motivo da recusa
+    recusados: dict = field(default_factory=dict)
+
+
+def _motivo_recusa(chamado, acao, tecnico):
+    if acao == 'comentar':
+        # Técnicos podem comentar em qualquer chamado (como em adicionar_comentario)
+        return None
+    transicao = TRANSICOES[acao]
+    if acao == 'aceitar':
+        if chamado.tecnico_id is not None or chamado.status not in transicao.origens:
+            return transicao.mensagem_conflito
+        return None
+    if chamado.tecnico_id != tecnico.pk:
+        return "Apenas o técnico responsável pode alterar este chamado."
+    if chamado.status not in transicao.origens:
+        return transicao.mensagem_conflito
+    return None
+
+
+def comentar_em_lote(chamados, tecnico, conteudo, registrar_log):
+    """Adiciona o mesmo comentário aos chamados, com um INSERT para todos."""
+    comentarios = Comentario.objects.bulk_create(
+        [Comentario(chamado=chamado, usuario=tecnico, conteudo=conteudo) for chamado in chamados]
+    )
+    # bulk_create não dispara os sinais de post_save: índice de busca e versão do chamado
+    busca.salvar_documentos(busca.documento_comentario(comentario) for comentario in comentarios)
+    Chamado.objects.filter(pk__in=[chamado.pk for chamado in chamados]).update(**campos_nova_versao())
+    if registrar_log:
+        for chamado in chamados:
+            registrar_evento(chamado, tecnico, 'COMENTARIO', conteudo[:100])
+
+
+def aplicar_em_lote(tecnico, acao, ids, destino=None, comentario='', registrar_log=True):
+    """
+    Aplica 'acao' aos chamados 'ids' em nome do técnico. Chamados que não
+    existem ou não podem receber a ação ficam em ResultadoLote.recusados
+    e não impedem os demais. 'comentario' (obrigatório para 'comentar') é
+    adicionado aos chamados alterados. Levanta ConflitoTransicao se algum
+    chamado mudar entre a validação e o UPDATE; nesse caso nada é gravado.
+    """
+    resultado = ResultadoLote()
+    with lote_eventos():
+        # FOR UPDATE (no PostgreSQL): ninguém altera os chamados entre a validação e o UPDATE
+        encontrados = Chamado.objects.para_acao().select_for_update(of=('self',)).filter(pk__in=ids)
+        chamados = {chamado.pk: chamado for chamado in encontrados}
+
+        validos = []
+        for chamado_id in dict.fromkeys(ids):
+            chamado = chamados.get(chamado_id)
+            motivo = "Chamado não encontrado." if chamado is None else _motivo_recusa(chamado, acao, tecnico)
+            if motivo:
+                resultado.recusados[chamado_id] = motivo
+            else:
+                validos.append(chamado)
+        if not validos:
+            return resultado
+
+        if acao == 'aceitar':
+            executar_transicao_em_lote(validos, acao, condicoes={'tecnico__isnull': True}, tecnico=tecnico)
+        elif acao != 'comentar':
+            executar_transicao_em_lote(validos, acao, destino=destino, condicoes={'tecnico': tecnico})
+
+        if acao in EVENTOS:
+            for chamado in validos:
+                detalhes = f"Status alterado para: {chamado.get_status_display()}" if acao == 'atualizar_status' else None
+                registrar_evento(chamado, tecnico, EVENTOS[acao], detalhes)
+        if comentario:
+            comentar_em_lote(validos, tecnico, comentario, registrar_log)
+
+    resultado.aplicados = [chamado.pk for chamado in validos]
+    return resultado
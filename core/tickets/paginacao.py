@@ -0,0 +1,142 @@
+# tickets/paginacao.py
+import base64
+import json
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+ITENS_POR_PAGINA_PADRAO = 25
+ITENS_POR_PAGINA_MAXIMO = 100
+
+
+def itens_por_pagina(request):
+    """
+    Tamanho da página: ?por_pagina=N (limitado ao máximo) ou
+    settings.TICKETS_ITENS_POR_PAGINA.
+    """
+    padrao = getattr(settings, 'TICKETS_ITENS_POR_PAGINA', ITENS_POR_PAGINA_PADRAO)
+    try:
+        valor = int(request.GET.get('por_pagina', padrao))
+    except (TypeError, ValueError):
+        valor = padrao
+    return max(1, min(valor, ITENS_POR_PAGINA_MAXIMO))
+
+
+def _codificar(direcao, valores):
+    bruto = json.dumps([direcao, valores], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def _decodificar(token):
+    try:
+        preenchimento = '=' * (-len(token) % 4)
+        direcao, valores = json.loads(base64.urlsafe_b64decode(token + preenchimento))
+    except (ValueError, TypeError):
+        return None
+    if direcao not in ('apos', 'antes') or not isinstance(valores, list):
+        return None
+    return direcao, valores
+
+
+@dataclass
+class PaginaKeyset:
+    itens: list = field(default_factory=list)
+    token_proxima: str | None = None
+    token_anterior: str | None = None
+    por_pagina: int = ITENS_POR_PAGINA_PADRAO
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def tem_proxima(self):
+        return self.token_proxima is not None
+
+    @property
+    def tem_anterior(self):
+        return self.token_anterior is not None
+
+
+class KeysetPaginator:
+    """
+    Paginação por cursor (keyset) em ordem decrescente de (campo, id).
+
+    Em vez de OFFSET, cada página continua a partir da chave do último item
+    da página anterior ("WHERE (campo, id) < (x, y)"), então a página N custa
+    o mesmo que a primeira desde que exista um índice em (campo, id).
+    O campo de ordenação não pode ser nulo nos registros paginados.
+    """
+
+    def __init__(self, queryset, campo, por_pagina=ITENS_POR_PAGINA_PADRAO):
+        self.queryset = queryset
+        self.campo = campo
+        self.por_pagina = por_pagina
+
+    def _chave(self, obj):
+        return [getattr(obj, self.campo).isoformat(), obj.pk]
+
+    def _filtro(self, direcao, valores):
+        try:
+            valor = parse_datetime(valores[0])
+            pk = int(valores[1])
+        except (IndexError, TypeError, ValueError):
+            return None
+        if valor is None:
+            return None
+        if direcao == 'apos':
+            # Itens "depois" na ordem decrescente, ou seja, menores
+            return Q(**{f'{self.campo}__lt': valor}) | Q(**{self.campo: valor, 'pk__lt': pk})
+        return Q(**{f'{self.campo}__gt': valor}) | Q(**{self.campo: valor, 'pk__gt': pk})
+
+    def _cursor(self, token):
+        cursor = _decodificar(token) if token else None
+        filtro = self._filtro(*cursor) if cursor else None
+        if filtro is None:
+            return None, 'apos'
+        return filtro, cursor[0]
+
+    def token(self, direcao, obj):
+        """Cursor a partir de obj: 'apos' segue para os menores, 'antes' para os maiores."""
+        return _codificar(direcao, self._chave(obj))
+
+    def consulta(self, token=None):
+        """Consulta SQL de uma página (também usada por verificar_indices)."""
+        filtro, direcao = self._cursor(token)
+        if direcao == 'apos':
+            ordem = (f'-{self.campo}', '-pk')
+        else:
+            ordem = (self.campo, 'pk')
+
+        qs = self.queryset.order_by(*ordem)
+        if filtro is not None:
+            qs = qs.filter(filtro)
+        # Busca um item a mais para saber se existe mais uma página nessa direção
+        return qs[:self.por_pagina + 1]
+
+    def pagina(self, token=None):
+        filtro, direcao = self._cursor(token)
+        itens = list(self.consulta(token))
+        ha_mais = len(itens) > self.por_pagina
+        itens = itens[:self.por_pagina]
+        if direcao == 'antes':
+            itens.reverse()
+
+        pagina = PaginaKeyset(itens=itens, por_pagina=self.por_pagina)
+        if not itens:
+            return pagina
+
+        if direcao == 'apos':
+            tem_proxima, tem_anterior = ha_mais, filtro is not None
+        else:
+            tem_proxima, tem_anterior = True, ha_mais
+
+        if tem_proxima:
+            pagina.token_proxima = self.token('apos', itens[-1])
+        if tem_anterior:
+            pagina.token_anterior = self.token('antes', itens[0])
+        return pagina
@@ -0,0 +1,115 @@
+# tickets/prioridades.py
+"""
+Prioridade dos chamados novos a partir das regras cadastradas no admin
+(RegraPrioridade): grupo do solicitante, categoria, subcategoria e
+palavras-chave da observação.
+
+As regras ativas são lidas numa consulta e compiladas em memória (uma lista
+ordenada da maior para a menor prioridade, com as palavras-chave numa
+expressão regular), guardadas por processo. Decidir a prioridade não faz
+consultas: os grupos vêm de request.papeis e a categoria do chamado é o
+categoria_id da subcategoria já carregada pelo formulário. Editar uma regra
+(ou renomear/apagar um grupo) muda a versão no cache compartilhado (CACHES,
+ver core/versoes_cache.py) e cada processo recompila as regras no próximo
+chamado.
+"""
+import re
+import threading
+from dataclasses import dataclass
+
+from core.versoes_cache import incrementar_versao, ler_versao
+
+from .busca import normalizar
+from .models import Chamado, RegraPrioridade
+
+CHAVE_VERSAO = 'prioridades:versao'
+
+# Da menor para a maior (ordem das opções do campo)
+ORDEM_PRIORIDADE = list(Chamado.Prioridade.values)
+
+
+@dataclass(frozen=True)
+class RegraCompilada:
+    prioridade: str
+    grupo: str = None
+    categoria_id: int = None
+    subcategoria_id: int = None
+    palavras: re.Pattern = None
+
+    def vale_para(self, grupos, subcategoria, texto):
+        if self.grupo is not None and self.grupo not in grupos:
+            return False
+        if self.subcategoria_id is not None and self.subcategoria_id != subcategoria.pk:
+            return False
+        if self.categoria_id is not None and self.categoria_id != subcategoria.categoria_id:
+            return False
+        return self.palavras is None or self.palavras.search(texto()) is not None
+
+
+def _expressao(palavras_chave):
+    palavras = [normalizar(palavra.strip()) for palavra in palavras_chave.split(',') if palavra.strip()]
+    if not palavras:
+        return None
+    # Palavras ou expressões inteiras: "rede" não vale para "redefinir"
+    return re.compile(r'\b(?:' + '|'.join(re.escape(palavra) for palavra in palavras) + r')\b')
+
+
+def compilar(regras):
+    """Regras (instâncias de RegraPrioridade) da maior para a menor prioridade."""
+    compiladas = [
+        RegraCompilada(
+            prioridade=regra.prioridade,
+            grupo=regra.grupo.name if regra.grupo_id else None,
+            categoria_id=regra.categoria_id,
+            subcategoria_id=regra.subcategoria_id,
+            palavras=_expressao(regra.palavras_chave),
+        )
+        for regra in regras
+    ]
+    compiladas.sort(key=lambda regra: ORDEM_PRIORIDADE.index(regra.prioridade), reverse=True)
+    return compiladas
+
+
+_compiladas = None
+_versao = None
+_lock = threading.Lock()
+
+
+def regras_compiladas():
+    global _compiladas, _versao
+    versao = ler_versao(CHAVE_VERSAO)
+    with _lock:
+        if _compiladas is not None and _versao == versao:
+            return _compiladas
+    compiladas = compilar(RegraPrioridade.objects.filter(ativa=True).select_related('grupo'))
+    with _lock:
+        _compiladas, _versao = compiladas, versao
+    return compiladas
+
+
+def invalidar_regras(**kwargs):
+    # Chamado quando uma RegraPrioridade ou um Group é salvo ou apagado
+    global _compiladas
+    incrementar_versao(CHAVE_VERSAO)
+    with _lock:
+        _compiladas = None
+
+
+def prioridade_para(grupos, subcategoria, observacao):
+    """
+    Prioridade de um chamado novo: a da primeira regra que vale (a maior),
+    ou a prioridade padrão do chamado.
+    """
+    texto = None
+
+    def texto_normalizado():
+        # Só normaliza a observação se alguma regra com palavras-chave chegar a ser testada
+        nonlocal texto
+        if texto is None:
+            texto = normalizar(observacao)
+        return texto
+
+    for regra in regras_compiladas():
+        if regra.vale_para(grupos, subcategoria, texto_normalizado):
+            return regra.prioridade
+    return Chamado._meta.get_field('prioridade').default
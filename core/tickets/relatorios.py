@@ -0,0 +1,156 @@
+# tickets/relatorios.py
+"""
+Relatórios de SLA e desempenho dos técnicos a partir de ResumoMensal.
+
+Cada evento relevante soma na linha (mês do evento, técnico do chamado,
+categoria): o aceite soma o tempo desde a abertura, a resolução soma o tempo
+desde a abertura (e conta como reabertura se o chamado já tinha sido
+resolvido antes) e o fechamento soma a nota da avaliação. Como tudo são
+somas e contagens, a linha é atualizada por incremento, na mesma transação
+do evento (registrar_eventos, chamado por tickets/eventos.py), e o relatório
+lê só o resumo. reconstruir() refaz o resumo a partir dos logs.
+"""
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Avaliacao, LogTecnico, ResumoMensal
+
+ACEITE = 'ACEITE'
+RESOLUCAO = 'RESOLUCAO'
+FECHAMENTO = 'FECHAMENTO_USUARIO'
+ACOES_RESUMO = (ACEITE, RESOLUCAO, FECHAMENTO)
+
+CAMPOS_SOMA = ('aceites', 'tempo_aceite', 'resolucoes', 'tempo_resolucao', 'reaberturas', 'avaliacoes', 'soma_notas')
+TAMANHO_LOTE = 2000
+
+
+def mes_de(data):
+    return timezone.localtime(data).date().replace(day=1)
+
+
+def meses_antes(mes, quantidade):
+    total = mes.year * 12 + mes.month - 1 - quantidade
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _segundos(inicio, fim):
+    return max(0, int((fim - inicio).total_seconds()))
+
+
+def _incrementos(acao, data_evento, abertura, nota=None, reaberto=False):
+    if acao == ACEITE:
+        return {'aceites': 1, 'tempo_aceite': _segundos(abertura, data_evento)}
+    if acao == RESOLUCAO:
+        incrementos = {'resolucoes': 1, 'tempo_resolucao': _segundos(abertura, data_evento)}
+        if reaberto:
+            incrementos['reaberturas'] = 1
+        return incrementos
+    if acao == FECHAMENTO and nota is not None:
+        return {'avaliacoes': 1, 'soma_notas': nota}
+    return {}
+
+
+def _aplicar(totais):
+    for (mes, tecnico_id, categoria_id), incrementos in totais.items():
+        linha = ResumoMensal.objects.filter(mes=mes, tecnico_id=tecnico_id, categoria_id=categoria_id)
+        somas = {campo: F(campo) + valor for campo, valor in incrementos.items()}
+        if linha.update(**somas):
+            continue
+        try:
+            with transaction.atomic():
+                ResumoMensal.objects.create(mes=mes, tecnico_id=tecnico_id, categoria_id=categoria_id, **incrementos)
+        except IntegrityError:
+            # Outra requisição criou a linha ao mesmo tempo
+            linha.update(**somas)
+
+
+def registrar_eventos(logs):
+    """Soma no resumo os logs já gravados (com data_evento) que entram nos relatórios."""
+    relevantes = [log for log in logs if log.tipo_acao.nome in ACOES_RESUMO and log.chamado.tecnico_id]
+    if not relevantes:
+        return
+
+    resolvidos_antes = set()
+    resolucoes = [log for log in relevantes if log.tipo_acao.nome == RESOLUCAO]
+    if resolucoes:
+        resolvidos_antes = set(
+            LogTecnico.objects.filter(chamado_id__in={log.chamado_id for log in resolucoes}, tipo_acao__nome=RESOLUCAO)
+            .exclude(pk__in=[log.pk for log in resolucoes])
+            .values_list('chamado_id', flat=True)
+        )
+
+    totais = defaultdict(Counter)
+    for log in relevantes:
+        chamado = log.chamado
+        nota = None
+        if log.tipo_acao.nome == FECHAMENTO:
+            try:
+                nota = chamado.avaliacao.nota
+            except Avaliacao.DoesNotExist:
+                continue
+        chave = (mes_de(log.data_evento), chamado.tecnico_id, chamado.subcategoria.categoria_id)
+        totais[chave].update(_incrementos(
+            log.tipo_acao.nome, log.data_evento, chamado.data_abertura, nota,
+            reaberto=chamado.pk in resolvidos_antes,
+        ))
+    _aplicar(totais)
+
+
+def reconstruir():
+    """Apaga e recalcula todo o resumo a partir dos logs. Retorna o número de linhas."""
+    logs = (
+        LogTecnico.objects.filter(tipo_acao__nome__in=ACOES_RESUMO, chamado__tecnico__isnull=False)
+        .order_by('chamado_id', 'data_evento', 'id')
+        .values_list(
+            'tipo_acao__nome', 'data_evento', 'chamado_id', 'chamado__tecnico_id',
+            'chamado__subcategoria__categoria_id', 'chamado__data_abertura', 'chamado__avaliacao__nota',
+        )
+    )
+    totais = defaultdict(Counter)
+    resolvidos = set()
+    for acao, data_evento, chamado_id, tecnico_id, categoria_id, abertura, nota in logs.iterator(chunk_size=TAMANHO_LOTE):
+        chave = (mes_de(data_evento), tecnico_id, categoria_id)
+        totais[chave].update(_incrementos(acao, data_evento, abertura, nota, reaberto=chamado_id in resolvidos))
+        if acao == RESOLUCAO:
+            resolvidos.add(chamado_id)
+
+    linhas = [
+        ResumoMensal(mes=mes, tecnico_id=tecnico_id, categoria_id=categoria_id, **incrementos)
+        for (mes, tecnico_id, categoria_id), incrementos in totais.items()
+    ]
+    with transaction.atomic():
+        ResumoMensal.objects.all().delete()
+        ResumoMensal.objects.bulk_create(linhas, batch_size=500)
+    return len(linhas)
+
+
+def _medias(linha):
+    def media(soma, quantidade, divisor=1):
+        return soma / quantidade / divisor if quantidade else None
+
+    linha['horas_aceite'] = media(linha['tempo_aceite'], linha['aceites'], 3600)
+    linha['horas_resolucao'] = media(linha['tempo_resolucao'], linha['resolucoes'], 3600)
+    linha['nota_media'] = media(linha['soma_notas'], linha['avaliacoes'])
+    return linha
+
+
+def relatorio(agrupamento, meses=12):
+    """
+    Linhas do relatório dos últimos 'meses' por técnico ou por categoria:
+    o total do período e o detalhe mês a mês. Lê apenas ResumoMensal.
+    """
+    if agrupamento == 'categoria':
+        campos = ('categoria_id', 'categoria__nome')
+    else:
+        campos = ('tecnico_id', 'tecnico__username', 'tecnico__first_name', 'tecnico__last_name')
+    inicio = meses_antes(mes_de(timezone.now()), meses - 1)
+    resumo = ResumoMensal.objects.filter(mes__gte=inicio)
+    somas = {campo: Sum(campo) for campo in CAMPOS_SOMA}
+
+    periodo = [_medias(linha) for linha in resumo.values(*campos).annotate(**somas).order_by(campos[1])]
+    por_mes = [_medias(linha) for linha in resumo.values('mes', *campos).annotate(**somas).order_by('-mes', campos[1])]
+    return {'inicio': inicio, 'periodo': periodo, 'por_mes': por_mes}
@@ -0,0 +1,256 @@
+# tickets/roteamento.py
+"""
+Distribuição automática dos chamados novos entre os técnicos.
+
+Cada técnico atende as subcategorias cadastradas em Habilidade. Um chamado
+novo vai para o técnico habilitado com menos chamados ativos, se algum
+estiver abaixo de TICKETS_ROTEAMENTO_LIMITE; senão espera, na ordem da fila
+do painel (prioridade e tempo de espera, ver tickets/fila.py), até que um
+técnico habilitado resolva um chamado. Enquanto espera, continua na fila do
+painel e pode ser aceito à mão. Subcategorias sem técnico habilitado ficam só
+na fila manual.
+
+O estado (habilidades, carga de cada técnico e espera) fica em memória no
+processo: é montado a partir do banco no primeiro uso e atualizado a cada
+transição (sinal transicao_aplicada), sem novas consultas. Como outros
+processos também alteram chamados, ele é remontado a cada
+TICKETS_ROTEAMENTO_RECARGA segundos. A atribuição é o mesmo UPDATE
+condicional do aceite manual: dois processos nunca atribuem o mesmo chamado.
+O limite também é conferido nesse UPDATE, contando no banco os chamados
+ativos do técnico: a carga em memória de um processo pode estar atrasada em
+relação às atribuições feitas pelos outros. Se o técnico já chegou ao limite,
+o processo o marca como cheio e o chamado volta para a espera.
+"""
+import heapq
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+
+from .eventos import lote_eventos, registrar_evento
+from .fila import posicao
+from .models import Chamado, Habilidade
+from .transicoes import ConflitoTransicao, executar_transicao
+
+Prioridade = Chamado.Prioridade
+
+# Ordem de atendimento na espera: menor peso primeiro
+PESOS_PRIORIDADE = {Prioridade.ALTA: 0, Prioridade.MEDIA: 1, Prioridade.BAIXA: 2}
+# Variação da carga do técnico em cada transição
+DELTA_CARGA = {'aceitar': 1, 'resolver': -1, 'resolver_incidente': -1}
+
+LIMITE_PADRAO = 5
+RECARGA_PADRAO = 300
+
+
+class MotorRoteamento:
+    """
+    Regras da distribuição, só em memória (também usado por simular_roteamento).
+    'habilidades' são pares (subcategoria_id, tecnico_id) e 'carga' os chamados
+    ativos de cada técnico. A espera sai pelo menor (peso da prioridade, data);
+    sem pesos, só a data decide (ex.: data_fila, que já inclui a prioridade).
+    """
+
+    def __init__(self, habilidades, carga=None, limite=LIMITE_PADRAO, pesos=PESOS_PRIORIDADE):
+        self.tecnicos_da_subcategoria = {}
+        self.subcategorias_do_tecnico = {}
+        for subcategoria_id, tecnico_id in habilidades:
+            self.tecnicos_da_subcategoria.setdefault(subcategoria_id, set()).add(tecnico_id)
+            self.subcategorias_do_tecnico.setdefault(tecnico_id, set()).add(subcategoria_id)
+        self.carga = {tecnico_id: (carga or {}).get(tecnico_id, 0) for tecnico_id in self.subcategorias_do_tecnico}
+        self.limite = limite
+        self.pesos = pesos
+        # subcategoria_id -> heap de (peso, data, id). Um chamado que
+        # sai da espera por fora (aceite manual, cancelamento) só deixa 'pendentes';
+        # a entrada no heap é descartada quando chegar ao topo.
+        self.espera = {}
+        self.pendentes = set()
+
+    def escolher_tecnico(self, subcategoria_id):
+        """Técnico habilitado com menos carga abaixo do limite, ou None."""
+        livres = [
+            tecnico_id for tecnico_id in self.tecnicos_da_subcategoria.get(subcategoria_id, ())
+            if self.carga[tecnico_id] < self.limite
+        ]
+        return min(livres, key=lambda tecnico_id: (self.carga[tecnico_id], tecnico_id), default=None)
+
+    def chegada(self, chamado_id, subcategoria_id, prioridade, data):
+        """Técnico escolhido para um chamado novo; sem técnico livre, o chamado entra na espera."""
+        if chamado_id in self.pendentes or subcategoria_id not in self.tecnicos_da_subcategoria:
+            return None
+        tecnico_id = self.escolher_tecnico(subcategoria_id)
+        if tecnico_id is None:
+            self.enfileirar(chamado_id, subcategoria_id, prioridade, data)
+        return tecnico_id
+
+    def enfileirar(self, chamado_id, subcategoria_id, prioridade, data):
+        chave = (self.pesos.get(prioridade, len(self.pesos)), data, chamado_id)
+        heapq.heappush(self.espera.setdefault(subcategoria_id, []), chave)
+        self.pendentes.add(chamado_id)
+
+    def remover(self, chamado_id):
+        self.pendentes.discard(chamado_id)
+
+    def _topo(self, subcategoria_id):
+        heap = self.espera.get(subcategoria_id)
+        while heap and heap[0][2] not in self.pendentes:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def proximo_para(self, tecnico_id):
+        """Retira da espera o chamado mais prioritário que o técnico atende, se ele tiver vaga."""
+        if self.carga.get(tecnico_id, self.limite) >= self.limite:
+            return None
+        topos = []
+        for subcategoria_id in self.subcategorias_do_tecnico.get(tecnico_id, ()):
+            topo = self._topo(subcategoria_id)
+            if topo is not None:
+                topos.append((topo, subcategoria_id))
+        if not topos:
+            return None
+        (_, _, chamado_id), subcategoria_id = min(topos)
+        heapq.heappop(self.espera[subcategoria_id])
+        self.pendentes.discard(chamado_id)
+        return chamado_id
+
+    def marcar_cheio(self, tecnico_id):
+        # A carga real (no banco) já chegou ao limite; a próxima recarga corrige o valor
+        if tecnico_id in self.carga:
+            self.carga[tecnico_id] = max(self.carga[tecnico_id], self.limite)
+
+    def ajustar_carga(self, tecnico_id, delta):
+        # Técnicos sem habilidades não entram na distribuição
+        if tecnico_id in self.carga:
+            self.carga[tecnico_id] = max(0, self.carga[tecnico_id] + delta)
+
+
+_motor = None
+_carregado_em = 0.0
+# Reentrante: a atribuição dispara transicao_aplicada na mesma thread
+_lock = threading.RLock()
+
+
+def ativo():
+    return getattr(settings, 'TICKETS_ROTEAMENTO_AUTOMATICO', True)
+
+
+def _carregar():
+    habilidades = list(Habilidade.objects.filter(tecnico__is_active=True).values_list('subcategoria_id', 'tecnico_id'))
+    if not habilidades:
+        return MotorRoteamento([])
+    tecnicos = {tecnico_id for _, tecnico_id in habilidades}
+    carga = dict(
+        Chamado.objects.filter(tecnico__in=tecnicos, status__in=Chamado.STATUS_ATIVOS)
+        .values('tecnico').annotate(total=Count('pk')).values_list('tecnico', 'total')
+    )
+    # A espera segue a ordem da fila do painel (data_fila já inclui a prioridade)
+    motor = MotorRoteamento(habilidades, carga, pesos={})
+    fila = Chamado.objects.na_fila().filter(subcategoria__in=motor.tecnicos_da_subcategoria)
+    for chamado in fila.values_list('id', 'subcategoria_id', 'prioridade', posicao()):
+        motor.enfileirar(*chamado)
+    return motor
+
+
+def _obter_motor():
+    """Motor atual e se ele acabou de ser montado a partir do banco."""
+    global _motor, _carregado_em
+    recarga = getattr(settings, 'TICKETS_ROTEAMENTO_RECARGA', RECARGA_PADRAO)
+    recarregado = _motor is None or time.monotonic() - _carregado_em > recarga
+    if recarregado:
+        _motor = _carregar()
+        _carregado_em = time.monotonic()
+    _motor.limite = getattr(settings, 'TICKETS_ROTEAMENTO_LIMITE', LIMITE_PADRAO)
+    return _motor, recarregado
+
+
+def invalidar_roteamento(**kwargs):
+    # Chamado quando uma Habilidade é salva ou apagada (ex.: edição pelo admin)
+    global _motor
+    with _lock:
+        _motor = None
+
+
+def _abaixo_do_limite(tecnico_id, limite):
+    """Condição do UPDATE: o técnico tem menos de 'limite' chamados ativos, contados no banco."""
+    ativos = (
+        Chamado.objects.filter(tecnico_id=tecnico_id, status__in=Chamado.STATUS_ATIVOS)
+        .order_by().values('tecnico').annotate(total=Count('pk')).values('total')
+    )
+    return Q(LessThan(Coalesce(Subquery(ativos), 0), limite))
+
+
+def _atribuir(motor, chamado_id, tecnico_id):
+    chamado = Chamado.objects.para_acao().filter(pk=chamado_id).first()
+    if chamado is None:
+        return False
+    condicoes = Q(tecnico__isnull=True) & _abaixo_do_limite(tecnico_id, motor.limite)
+    try:
+        with lote_eventos():
+            executar_transicao(chamado, 'aceitar', condicoes=condicoes, tecnico_id=tecnico_id)
+            registrar_evento(chamado, chamado.tecnico, 'ACEITE', "Atribuído automaticamente")
+    except ConflitoTransicao:
+        # Aceito à mão ou cancelado antes da atribuição, ou o técnico chegou ao
+        # limite com atribuições de outros processos
+        if Chamado.objects.na_fila().filter(pk=chamado_id).exists():
+            motor.marcar_cheio(tecnico_id)
+            motor.enfileirar(chamado.pk, chamado.subcategoria_id, chamado.prioridade, chamado.data_fila or chamado.data_abertura)
+        return False
+    return True
+
+
+def _puxar_da_espera(motor, tecnico_id):
+    while (chamado_id := motor.proximo_para(tecnico_id)) is not None:
+        _atribuir(motor, chamado_id, tecnico_id)
+
+
+def _distribuir(motor):
+    for tecnico_id in sorted(motor.subcategorias_do_tecnico):
+        _puxar_da_espera(motor, tecnico_id)
+
+
+def rotear(chamado):
+    """Atribui um chamado recém-criado (depois do commit; ver rotear_apos_commit)."""
+    if not ativo():
+        return
+    with _lock:
+        motor, recarregado = _obter_motor()
+        if recarregado:
+            # O chamado já foi lido do banco junto com a fila
+            _distribuir(motor)
+            return
+        tecnico_id = motor.chegada(chamado.pk, chamado.subcategoria_id, chamado.prioridade, chamado.data_fila)
+        if tecnico_id is not None:
+            _atribuir(motor, chamado.pk, tecnico_id)
+
+
+def rotear_apos_commit(chamado):
+    # robust: uma falha na distribuição é registrada no log e o chamado fica na fila manual
+    transaction.on_commit(partial(rotear, chamado), robust=True)
+
+
+def registrar_transicao(sender, acao, chamados, **kwargs):
+    """Receptor de transicao_aplicada: atualiza a carga e puxa chamados da espera."""
+    if not ativo():
+        return
+    delta = DELTA_CARGA.get(acao, 0)
+    with _lock:
+        if _motor is None and delta >= 0:
+            # Ainda não montado: a montagem já lerá o estado novo do banco
+            return
+        motor, recarregado = _obter_motor()
+        if recarregado:
+            # A montagem já leu o estado depois da transição
+            _distribuir(motor)
+            return
+        for chamado in chamados:
+            motor.remover(chamado.pk)
+            if delta and chamado.tecnico_id:
+                motor.ajustar_carga(chamado.tecnico_id, delta)
+        if delta < 0:
+            for tecnico_id in sorted({chamado.tecnico_id for chamado in chamados if chamado.tecnico_id}):
+                _puxar_da_espera(motor, tecnico_id)
@@ -1,3 +1,1279 @@
-from django.test import TestCase
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from authentication.papeis import CHAVE_SESSAO
+from core import roteador
+from core.banco import configuracao_banco
+from core.logs import FiltroRequisicao, FormatoJSON, ManipuladorFila, RequestIdMiddleware, niveis_por_logger
+from core.versoes_cache import incrementar_versao
+
+from . import incidentes, urls as tickets_urls
+from .broker import CANAL_FILA, BrokerMemoria, obter_broker
+from .busca import buscar, normalizar, radical, termos_da_consulta
+from .estatisticas import contagem_por_status
+from .fila import preencher_fila
+from .eventos import CHAVE_VERSAO as EVENTOS_CHAVE_VERSAO, invalidar_tipos_acao, lote_eventos, registrar_evento, tipo_acao
+from .management.commands.medir_desempenho import comparar
+from .metricas import ColetorConsultas, metricas
+from .models import Anexo, Avaliacao, Categoria, Chamado, Comentario, DocumentoBusca, Habilidade, Incidente, LogTecnico, RegraPrioridade, ResumoMensal, Subcategoria, TipoAcao
+from .paginacao import KeysetPaginator
+from .management.commands.simular_roteamento import gerar_chegadas, gerar_habilidades, simular
+from .prioridades import CHAVE_VERSAO, invalidar_regras, prioridade_para
+from .relatorios import reconstruir
+from .roteamento import MotorRoteamento, _obter_motor, invalidar_roteamento
+from .transicoes import ConflitoTransicao, executar_transicao
+
+
+class DadosChamadosMixin:
+    """Cria usuários, grupos e uma subcategoria usados pelos testes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.usuario = User.objects.create_user(username='usuario', password='x')
+        cls.tecnico = User.objects.create_user(username='tecnico', password='x')
+        cls.tecnico.groups.add(Group.objects.create(name='CPD'))
+        categoria = Categoria.objects.create(nome='Hardware')
+        cls.subcategoria = Subcategoria.objects.create(nome='Impressora', categoria=categoria)
+
+    @classmethod
+    def criar_chamados(cls, quantidade, **campos):
+        agora = timezone.now()
+        chamados = []
+        for i in range(quantidade):
+            chamado = Chamado.objects.create(usuario=cls.usuario, subcategoria=cls.subcategoria, **campos)
+            # data_abertura é auto_now_add; ajusta para ter uma ordem conhecida
+            Chamado.objects.filter(pk=chamado.pk).update(data_abertura=agora - timedelta(minutes=i))
+            Chamado.objects.filter(pk=chamado.pk).recalcular_fila()
+            chamados.append(chamado.pk)
+        return chamados
+
+    def entrar(self, user):
+        # Login direto pelo ModelBackend, sem depender do servidor LDAP
+        self.client.force_login(user, backend='django.contrib.auth.backends.ModelBackend')
+
+
+class KeysetPaginatorTests(DadosChamadosMixin, TestCase):
+    def test_navega_para_frente_e_para_tras(self):
+        ids = self.criar_chamados(7)
+        paginador = KeysetPaginator(Chamado.objects.all(), 'data_abertura', por_pagina=3)
+
+        primeira = paginador.pagina()
+        self.assertEqual([c.pk for c in primeira], ids[0:3])
+        self.assertFalse(primeira.tem_anterior)
+
+        segunda = paginador.pagina(primeira.token_proxima)
+        self.assertEqual([c.pk for c in segunda], ids[3:6])
+
+        terceira = paginador.pagina(segunda.token_proxima)
+        self.assertEqual([c.pk for c in terceira], ids[6:7])
+        self.assertFalse(terceira.tem_proxima)
+
+        voltando = paginador.pagina(terceira.token_anterior)
+        self.assertEqual([c.pk for c in voltando], ids[3:6])
+        self.assertTrue(voltando.tem_anterior)
+        self.assertEqual([c.pk for c in paginador.pagina(voltando.token_anterior)], ids[0:3])
+
+    def test_empate_na_data_desempata_pelo_id(self):
+        ids = self.criar_chamados(5)
+        Chamado.objects.update(data_abertura=timezone.now())
+        paginador = KeysetPaginator(Chamado.objects.all(), 'data_abertura', por_pagina=2)
+
+        vistos = []
+        pagina = paginador.pagina()
+        while True:
+            vistos.extend(c.pk for c in pagina)
+            if not pagina.tem_proxima:
+                break
+            pagina = paginador.pagina(pagina.token_proxima)
+        self.assertEqual(vistos, sorted(ids, reverse=True))
+
+    def test_token_invalido_volta_para_primeira_pagina(self):
+        ids = self.criar_chamados(2)
+        pagina = KeysetPaginator(Chamado.objects.all(), 'data_abertura', por_pagina=5).pagina('lixo')
+        self.assertEqual([c.pk for c in pagina], ids)
+
+    def test_historico_paginado(self):
+        ids = self.criar_chamados(4, status=Chamado.Status.FECHADO)
+        Chamado.objects.update(data_conclusao=timezone.now())
+        self.entrar(self.usuario)
+
+        resposta = self.client.get(reverse('tickets:historico'), {'por_pagina': 3})
+        self.assertEqual(len(resposta.context['chamados']), 3)
+        pagina = resposta.context['pagina']
+        resposta = self.client.get(reverse('tickets:historico'), {'cursor': pagina.token_proxima, 'por_pagina': 3})
+        self.assertEqual([c.pk for c in resposta.context['chamados']], [min(ids)])
+
+    def test_historico_inclui_fechados_sem_data_de_conclusao(self):
+        ids = self.criar_chamados(3, status=Chamado.Status.FECHADO)
+        # Ex.: fechado pelo admin, sem passar por CONCLUIDO
+        Chamado.objects.filter(pk__in=ids[1:]).update(data_conclusao=timezone.now() + timedelta(minutes=1))
+        self.entrar(self.usuario)
+
+        resposta = self.client.get(reverse('tickets:historico'), {'por_pagina': 2})
+        self.assertEqual(len(resposta.context['chamados']), 2)
+        resposta = self.client.get(reverse('tickets:historico'), {'cursor': resposta.context['pagina'].token_proxima, 'por_pagina': 2})
+        self.assertEqual([c.pk for c in resposta.context['chamados']], [ids[0]])
+
+
+class QuantidadeConsultasTests(DadosChamadosMixin, TestCase):
+    """
+    O número de consultas de cada tela não pode depender da quantidade de
+    linhas exibidas (sem N+1).
+    """
+
+    # Sessão, usuário, grupos e as consultas próprias de cada tela
+    LIMITE_CONSULTAS = 8
+
+    def _consultas(self, user, url):
+        self.entrar(user)
+        # A primeira requisição grava os papéis na sessão; mede a seguinte
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return len(contexto)
+
+    def _popular(self, quantidade):
+        ids = self.criar_chamados(quantidade)
+        Chamado.objects.filter(pk__in=ids[::2]).update(tecnico=self.tecnico, status=Chamado.Status.EM_ATENDIMENTO)
+        self.criar_chamados(quantidade, status=Chamado.Status.FECHADO, tecnico=self.tecnico)
+        Chamado.objects.filter(status=Chamado.Status.FECHADO).update(data_conclusao=timezone.now())
+        return ids
+
+    def _medir_telas(self):
+        telas = [
+            (self.tecnico, reverse('tickets:lista')),
+            (self.usuario, reverse('tickets:lista')),
+            (self.tecnico, reverse('tickets:historico')),
+            (self.usuario, reverse('tickets:historico')),
+            (self.usuario, reverse('tickets:dashboard_usuario')),
+            (self.tecnico, reverse('tickets:dashboard_tecnico')),
+        ]
+        return {(user.username, url): self._consultas(user, url) for user, url in telas}
+
+    def test_listagens_nao_crescem_com_numero_de_linhas(self):
+        self._popular(1)
+        poucas = self._medir_telas()
+        self._popular(10)
+        muitas = self._medir_telas()
+
+        self.assertEqual(poucas, muitas)
+        for tela, total in muitas.items():
+            self.assertLessEqual(total, self.LIMITE_CONSULTAS, tela)
+
+    def test_detalhe_nao_cresce_com_comentarios_e_anexos(self):
+        chamado_id = self._popular(1)[0]
+        url = reverse('tickets:detalhe', args=[chamado_id])
+
+        def adicionar(quantidade):
+            for i in range(quantidade):
+                Comentario.objects.create(chamado_id=chamado_id, usuario=self.tecnico, conteudo=f'Comentário {i}')
+                Anexo.objects.create(chamado_id=chamado_id, usuario_upload=self.usuario, caminho=f'\\\\srv\\anexo{i}.txt')
+
+        adicionar(1)
+        poucas = self._consultas(self.tecnico, url)
+        adicionar(10)
+        muitas = self._consultas(self.tecnico, url)
+
+        self.assertEqual(poucas, muitas)
+        self.assertLessEqual(muitas, self.LIMITE_CONSULTAS)
+
+
+class VerificarIndicesTests(TestCase):
+    def test_consultas_criticas_usam_indices(self):
+        saida = StringIO()
+        call_command('verificar_indices', stdout=saida)
+        self.assertIn('Todas as consultas críticas usam índices.', saida.getvalue())
+
+
+class EstatisticasTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_contagem_de_todos_os_status_numa_consulta(self):
+        self.criar_chamados(3)
+        self.criar_chamados(2, status=Chamado.Status.AGUARDANDO_TERCEIROS)
+        with self.assertNumQueries(1):
+            contagem = contagem_por_status()
+        self.assertEqual(set(contagem), set(Chamado.Status.values))
+        self.assertEqual(contagem[Chamado.Status.ABERTO], 3)
+        self.assertEqual(contagem[Chamado.Status.AGUARDANDO_TERCEIROS], 2)
+        self.assertEqual(contagem[Chamado.Status.CANCELADO], 0)
+
+        with self.assertNumQueries(0):
+            contagem_por_status()
+
+    def test_cache_descartado_quando_chamado_muda(self):
+        self.criar_chamados(1)
+        self.assertEqual(contagem_por_status()[Chamado.Status.ABERTO], 1)
+        chamado = Chamado.objects.get()
+        chamado.status = Chamado.Status.CANCELADO
+        chamado.save()
+        contagem = contagem_por_status()
+        self.assertEqual(contagem[Chamado.Status.ABERTO], 0)
+        self.assertEqual(contagem[Chamado.Status.CANCELADO], 1)
+
+    @override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+    def test_pagina_inicial_do_admin(self):
+        admin = get_user_model().objects.create_superuser(username='admin', password='x')
+        self.criar_chamados(2)
+        self.entrar(admin)
+        resposta = self.client.get(reverse('myadmin:index'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['stats']['abertos'], 2)
+
+
+class EventosTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        invalidar_tipos_acao()
+        self.chamado = Chamado.objects.get(pk=self.criar_chamados(1)[0])
+
+    def test_tipo_padrao_criado_quando_ausente(self):
+        self.assertFalse(TipoAcao.objects.exists())
+        self.assertEqual(tipo_acao('ACEITE').nome_exibicao, 'Técnico aceitou o chamado')
+
+    def test_tipo_desconhecido(self):
+        with self.assertRaises(TipoAcao.DoesNotExist):
+            tipo_acao('NAO_EXISTE')
+
+    def test_cache_preenchido_apos_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tipo_acao('CRIACAO')
+        with self.assertNumQueries(0):
+            tipo_acao('CRIACAO')
+        TipoAcao.objects.filter(nome='CRIACAO').update(nome_exibicao='Aberto')
+        TipoAcao.objects.get(nome='CRIACAO').save()  # sinal post_save, como no admin
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(tipo_acao('CRIACAO').nome_exibicao, 'Aberto')
+
+    def test_tipo_apagado_em_outro_processo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            antigo = tipo_acao('CRIACAO')
+        # Outro processo apaga o tipo: aqui só chega a nova versão no cache compartilhado
+        TipoAcao.objects.filter(pk=antigo.pk)._raw_delete(connection.alias)
+        incrementar_versao(EVENTOS_CHAVE_VERSAO)
+        registrar_evento(self.chamado, self.tecnico, 'CRIACAO')
+        self.assertNotEqual(self.chamado.logs.get().tipo_acao_id, antigo.pk)
+
+    def test_lote_grava_eventos_num_unico_insert(self):
+        for nome in ('CRIACAO', 'ACEITE', 'COMENTARIO'):
+            tipo_acao(nome)
+        with self.captureOnCommitCallbacks(execute=True):
+            tipo_acao('CRIACAO')
+
+        with CaptureQueriesContext(connection) as contexto:
+            with lote_eventos():
+                registrar_evento(self.chamado, self.tecnico, 'CRIACAO')
+                registrar_evento(self.chamado, self.tecnico, 'ACEITE')
+                registrar_evento(self.chamado, self.tecnico, 'COMENTARIO', 'Verificando')
+                self.assertEqual(LogTecnico.objects.count(), 0)
+        tabela = LogTecnico._meta.db_table
+        inserts = [q for q in contexto.captured_queries if q['sql'].startswith(f'INSERT INTO "{tabela}"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(LogTecnico.objects.filter(chamado=self.chamado).count(), 3)
+
+    def test_criar_chamado_registra_evento(self):
+        self.entrar(self.usuario)
+        resposta = self.client.post(reverse('tickets:criar'), {'subcategoria': self.subcategoria.pk, 'observacao': 'Sem tinta'})
+        chamado = Chamado.objects.latest('pk')
+        self.assertRedirects(resposta, reverse('tickets:detalhe', args=[chamado.pk]))
+        self.assertEqual(chamado.logs.get().tipo_acao.nome, 'CRIACAO')
+
+
+class TransicoesTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        self.outro_tecnico = get_user_model().objects.create_user(username='outro', password='x')
+        self.chamado_id = self.criar_chamados(1)[0]
+
+    def test_aceite_simultaneo_tem_um_unico_vencedor(self):
+        # Duas leituras do mesmo chamado, como dois técnicos com a página aberta
+        primeiro = Chamado.objects.get(pk=self.chamado_id)
+        segundo = Chamado.objects.get(pk=self.chamado_id)
+
+        executar_transicao(primeiro, 'aceitar', condicoes={'tecnico__isnull': True}, tecnico=self.tecnico)
+        with self.assertRaises(ConflitoTransicao):
+            executar_transicao(segundo, 'aceitar', condicoes={'tecnico__isnull': True}, tecnico=self.outro_tecnico)
+
+        chamado = Chamado.objects.get(pk=self.chamado_id)
+        self.assertEqual(chamado.tecnico, self.tecnico)
+        self.assertEqual(chamado.status, Chamado.Status.EM_ATENDIMENTO)
+
+    def test_transicao_nao_sobrescreve_outros_campos(self):
+        lido = Chamado.objects.get(pk=self.chamado_id)
+        Chamado.objects.filter(pk=self.chamado_id).update(observacao='Editado em paralelo')
+        executar_transicao(lido, 'cancelar')
+        chamado = Chamado.objects.get(pk=self.chamado_id)
+        self.assertEqual(chamado.observacao, 'Editado em paralelo')
+        self.assertEqual(chamado.status, Chamado.Status.CANCELADO)
+
+    def test_resolver_preenche_data_de_conclusao(self):
+        chamado = Chamado.objects.get(pk=self.chamado_id)
+        executar_transicao(chamado, 'aceitar', tecnico=self.tecnico)
+        executar_transicao(chamado, 'resolver', condicoes={'tecnico': self.tecnico})
+        self.assertIsNotNone(Chamado.objects.get(pk=self.chamado_id).data_conclusao)
+
+    def test_view_informa_conflito_ao_segundo_tecnico(self):
+        self.outro_tecnico.groups.add(*self.tecnico.groups.all())
+        self.entrar(self.tecnico)
+        self.client.post(reverse('tickets:aceitar', args=[self.chamado_id]))
+        self.entrar(self.outro_tecnico)
+        resposta = self.client.post(reverse('tickets:aceitar', args=[self.chamado_id]), follow=True)
+
+        self.assertContains(resposta, 'já foi aceito por outro técnico')
+        self.assertEqual(Chamado.objects.get(pk=self.chamado_id).tecnico, self.tecnico)
+        self.assertEqual(LogTecnico.objects.filter(chamado_id=self.chamado_id, tipo_acao__nome='ACEITE').count(), 1)
+
+
+class TransicoesConcorrentesTests(TransactionTestCase):
+    """Vários workers aceitando o mesmo chamado ao mesmo tempo."""
+
+    WORKERS = 8
+
+    def test_aceite_concorrente_sem_atualizacao_perdida(self):
+        User = get_user_model()
+        tecnicos = [User.objects.create_user(username=f'tecnico{i}', password='x') for i in range(self.WORKERS)]
+        usuario = User.objects.create_user(username='usuario', password='x')
+        subcategoria = Subcategoria.objects.create(nome='Rede', categoria=Categoria.objects.create(nome='Infra'))
+        chamado_id = Chamado.objects.create(usuario=usuario, subcategoria=subcategoria).pk
+
+        barreira = threading.Barrier(self.WORKERS)
+        vencedores, conflitos = [], []
+
+        def worker(tecnico):
+            try:
+                chamado = Chamado.objects.get(pk=chamado_id)
+                barreira.wait()
+                executar_transicao(chamado, 'aceitar', condicoes={'tecnico__isnull': True}, tecnico=tecnico)
+                vencedores.append(tecnico.pk)
+            except ConflitoTransicao:
+                conflitos.append(tecnico.pk)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker, args=(tecnico,)) for tecnico in tecnicos]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(vencedores), 1)
+        self.assertEqual(len(conflitos), self.WORKERS - 1)
+        self.assertEqual(Chamado.objects.get(pk=chamado_id).tecnico_id, vencedores[0])
+
+
+class BrokerGravador:
+    """Backend de broker que só guarda o que foi publicado."""
+
+    def __init__(self):
+        self.publicados = []
+
+    def publicar(self, canal, evento):
+        self.publicados.append((canal, evento))
+
+
+class BrokerTests(DadosChamadosMixin, TestCase):
+    async def test_publicacao_de_outra_thread_chega_ao_assinante(self):
+        broker = BrokerMemoria()
+        async with broker.assinar(CANAL_FILA) as fila:
+            thread = threading.Thread(target=broker.publicar, args=(CANAL_FILA, {'tipo': 'criado', 'id': 1}))
+            thread.start()
+            evento = await asyncio.wait_for(fila.get(), 1)
+            thread.join()
+        self.assertEqual(evento, {'tipo': 'criado', 'id': 1})
+
+    @override_settings(TICKETS_BROKER_BACKEND='tickets.tests.BrokerGravador')
+    def test_transicao_publica_evento_apos_commit(self):
+        chamado = Chamado.objects.select_related('subcategoria').get(pk=self.criar_chamados(1)[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            executar_transicao(chamado, 'aceitar', tecnico=self.tecnico)
+            self.assertEqual(obter_broker().publicados, [])
+
+        canal, evento = obter_broker().publicados[0]
+        self.assertEqual(canal, CANAL_FILA)
+        self.assertEqual(evento['tipo'], 'aceitar')
+        self.assertEqual(evento['tecnico_id'], self.tecnico.pk)
+
+    @override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+    async def test_fluxo_sse_para_tecnico(self):
+        await self.async_client.aforce_login(self.tecnico)
+        resposta = await self.async_client.get(reverse('tickets:fila_eventos'))
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+
+        conteudo = aiter(resposta.streaming_content)
+        self.assertTrue((await anext(conteudo)).startswith(b'retry:'))
+        obter_broker().publicar(CANAL_FILA, {'tipo': 'criado', 'id': 42})
+        mensagem = (await asyncio.wait_for(anext(conteudo), 1)).decode()
+        self.assertTrue(mensagem.startswith('event: criado\n'))
+        self.assertEqual(json.loads(mensagem.split('data: ')[1])['id'], 42)
+        await conteudo.aclose()
+
+    def test_fluxo_sse_sob_wsgi_nao_abre_stream(self):
+        self.entrar(self.tecnico)
+        self.assertEqual(self.client.get(reverse('tickets:fila_eventos')).status_code, 204)
+        self.assertNotContains(self.client.get(reverse('tickets:dashboard_tecnico')), 'EventSource')
+
+    @override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+    async def test_fluxo_sse_negado_para_usuario_comum(self):
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get(reverse('tickets:fila_eventos'))
+        self.assertEqual(resposta.status_code, 403)
+
+
+class BuscaTests(DadosChamadosMixin, TestCase):
+    def test_radical_aproxima_flexoes(self):
+        self.assertEqual(radical(normalizar('Impressoras')), radical('impressora'))
+        self.assertEqual(termos_da_consulta('A configuração da rede'), ['configur', 'rede'])
+
+    def test_encontra_por_descricao_comentario_log_e_categoria(self):
+        por_descricao, por_comentario, por_log = self.criar_chamados(3)
+        chamado = Chamado.objects.get(pk=por_descricao)
+        chamado.observacao = 'Impressão saindo borrada'
+        chamado.save()
+        Comentario.objects.create(chamado_id=por_comentario, usuario=self.tecnico, conteudo='Troquei o toner da máquina')
+        registrar_evento(Chamado.objects.get(pk=por_log), self.tecnico, 'COMENTARIO', 'Cabo de rede danificado')
+
+        self.assertEqual(self._ids('impressao borrada'), [por_descricao])
+        self.assertEqual(self._ids('TONER'), [por_comentario])
+        self.assertEqual(self._ids('cabos'), [por_log])
+        self.assertEqual(set(self._ids('hardware')), {por_descricao, por_comentario, por_log})
+        self.assertEqual(self._ids('inexistente'), [])
+
+    def test_logs_do_lote_e_renomeacao_de_subcategoria_sao_indexados(self):
+        chamado = Chamado.objects.get(pk=self.criar_chamados(1)[0])
+        with lote_eventos():
+            registrar_evento(chamado, self.tecnico, 'COMENTARIO', 'Fonte queimada')
+        self.assertEqual(self._ids('fonte'), [chamado.pk])
+
+        self.subcategoria.nome = 'Scanner'
+        self.subcategoria.save()
+        self.assertEqual(self._ids('scanner'), [chamado.pk])
+        self.assertEqual(self._ids('impressora'), [])
+
+    def test_gravacao_sem_campos_do_texto_nao_reindexa(self):
+        chamado = Chamado.objects.get(pk=self.criar_chamados(1)[0])
+        chamado.prioridade = Chamado.Prioridade.ALTA
+        with self.assertNumQueries(1):
+            chamado.save(update_fields=['prioridade'])
+
+        chamado.observacao = 'Papel enroscado'
+        chamado.save(update_fields=['observacao'])
+        self.assertEqual(self._ids('enroscado'), [chamado.pk])
+
+    def test_comentario_apagado_sai_do_indice(self):
+        chamado_id = self.criar_chamados(1)[0]
+        comentario = Comentario.objects.create(chamado_id=chamado_id, usuario=self.usuario, conteudo='Monitor piscando')
+        comentario.delete()
+        self.assertEqual(self._ids('monitor'), [])
+
+    def test_view_restringe_usuario_comum_aos_seus_chamados(self):
+        outro = get_user_model().objects.create_user(username='outro', password='x')
+        meu = self.criar_chamados(1, observacao='Teclado falhando')[0]
+        alheio = Chamado.objects.create(usuario=outro, subcategoria=self.subcategoria, observacao='Teclado quebrado').pk
+
+        self.entrar(self.usuario)
+        resposta = self.client.get(reverse('tickets:buscar'), {'q': 'teclado'})
+        self.assertEqual([c.pk for c in resposta.context['resultado'].chamados], [meu])
+
+        self.entrar(self.tecnico)
+        resposta = self.client.get(reverse('tickets:buscar'), {'q': 'teclado'})
+        self.assertEqual({c.pk for c in resposta.context['resultado'].chamados}, {meu, alheio})
+
+    def test_paginacao_sem_count(self):
+        self.criar_chamados(5, observacao='Mouse sem fio')
+        primeira = buscar('mouse', pagina=1, por_pagina=3)
+        segunda = buscar('mouse', pagina=2, por_pagina=3)
+        self.assertTrue(primeira.tem_proxima)
+        self.assertFalse(segunda.tem_proxima)
+        self.assertEqual(len(primeira.chamados) + len(segunda.chamados), 5)
+
+    def test_reconstruir_busca(self):
+        chamado_id = self.criar_chamados(1, observacao='Projetor sem imagem')[0]
+        DocumentoBusca.objects.all().delete()
+        self.assertEqual(self._ids('projetor'), [])
+        call_command('reconstruir_busca', stdout=StringIO())
+        self.assertEqual(self._ids('projetor'), [chamado_id])
+
+    def _ids(self, consulta):
+        return [chamado.pk for chamado in buscar(consulta).chamados]
+
+
+class DesempenhoTests(TestCase):
+    def test_gerar_dados_e_medir_desempenho(self):
+        call_command('gerar_dados', usuarios=5, tecnicos=2, chamados=300, lote=120, stdout=StringIO())
+        self.assertEqual(Chamado.objects.count(), 300)
+        self.assertEqual(set(Chamado.objects.values_list('status', flat=True)), set(Chamado.Status.values))
+        # Datas espalhadas no passado, não a data da gravação
+        self.assertLess(Chamado.objects.order_by('data_abertura').first().data_abertura, timezone.now() - timedelta(days=1))
+        self.assertEqual(Avaliacao.objects.count(), Chamado.objects.filter(status=Chamado.Status.FECHADO).count())
+        self.assertTrue(Chamado.objects.filter(incidente__isnull=False).exists())
+
+        total_chamados = Chamado.objects.count()
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'desempenho.json')
+            call_command('medir_desempenho', repeticoes=2, aquecimento=0, saida=saida, stdout=StringIO())
+            with open(saida, encoding='utf-8') as arquivo:
+                resultado = json.load(arquivo)
+            call_command('medir_desempenho', repeticoes=2, aquecimento=0, saida=saida, comparar=saida, tolerancia=100, stdout=StringIO())
+
+        cenarios = resultado['cenarios']
+        self.assertIn('dashboard_tecnico', cenarios)
+        self.assertEqual(cenarios['lista (técnico)']['status'], 200)
+        self.assertEqual(cenarios['criar']['status'], 302)
+        self.assertIn('p95', cenarios['detalhe']['ms'])
+        self.assertEqual(cenarios['comentarios']['status'], 200)
+        self.assertEqual(cenarios['operacao_lote']['status'], 200)
+        for nome in ('vincular_chamados', 'atualizar_status_incidente', 'comentar_incidente', 'resolver_incidente'):
+            self.assertEqual(cenarios[nome]['status'], 302)
+        # Uma requisição para cada view de tickets/urls.py
+        self.assertEqual(
+            {resolve(cenario['url']).url_name for cenario in cenarios.values()},
+            {padrao.name for padrao in tickets_urls.urlpatterns},
+        )
+        # As requisições que gravam são desfeitas
+        self.assertEqual(Chamado.objects.count(), total_chamados)
+
+    def test_comparar_aponta_mais_consultas(self):
+        base = {'cenarios': {'lista': {'consultas': 5, 'ms': {'p95': 10.0}}}}
+        atual = {'cenarios': {'lista': {'consultas': 6, 'ms': {'p95': 10.5}}}}
+        self.assertEqual(comparar(atual, base, 0.2), ['lista: 5 -> 6 consultas'])
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class MetricasTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        metricas.zerar()
+
+    def test_registra_latencia_e_consultas_por_view(self):
+        self.criar_chamados(3)
+        self.entrar(self.tecnico)
+        for _ in range(2):
+            self.client.get(reverse('tickets:lista'))
+
+        estatistica = metricas.instantaneo()['tickets:lista']
+        self.assertEqual(estatistica.requisicoes, 2)
+        self.assertEqual(sum(estatistica.baldes), 2)
+        self.assertGreater(estatistica.consultas, 0)
+        self.assertGreater(estatistica.tempo_bd, 0)
+
+    def test_detecta_sql_repetido(self):
+        ids = self.criar_chamados(3)
+        coletor = ColetorConsultas()
+        with connection.execute_wrapper(coletor):
+            for chamado in Chamado.objects.filter(pk__in=ids):
+                chamado.subcategoria.nome  # N+1: uma consulta por chamado
+        self.assertEqual(coletor.repetidas, 2)
+        metricas.registrar('teste', 0.02, 200, coletor)
+        self.assertEqual(metricas.instantaneo()['teste'].max_repeticoes, 3)
+
+    def test_pagina_do_admin_somente_para_staff(self):
+        self.entrar(self.usuario)
+        self.assertEqual(self.client.get(reverse('myadmin:metricas')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('myadmin:metricas_prometheus')).status_code, 403)
+
+        self.entrar(get_user_model().objects.create_superuser(username='admin', password='x'))
+        self.client.get(reverse('tickets:lista'))
+        resposta = self.client.get(reverse('myadmin:metricas'))
+        self.assertContains(resposta, 'tickets:lista')
+
+    @override_settings(TICKETS_METRICAS_TOKEN='segredo')
+    def test_exportacao_prometheus_com_token(self):
+        metricas.registrar('tickets:lista', 0.02, 200, ColetorConsultas())
+        resposta = self.client.get(reverse('myadmin:metricas_prometheus'), HTTP_AUTHORIZATION='Bearer segredo')
+        texto = resposta.content.decode()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('tickets_requisicao_duracao_segundos_bucket{view="tickets:lista",le="0.025"} 1', texto)
+        self.assertIn('tickets_requisicao_duracao_segundos_count{view="tickets:lista"} 1', texto)
+        self.assertEqual(self.client.get(reverse('myadmin:metricas_prometheus'), HTTP_AUTHORIZATION='Bearer outro').status_code, 403)
+
+
+class LogsTests(DadosChamadosMixin, TestCase):
+    def test_request_id_na_resposta_e_nos_logs(self):
+        registros = []
+
+        class Gravador(logging.Handler):
+            def emit(self, record):
+                registros.append(record)
+
+        def view_com_log(request):
+            logging.getLogger('tickets.teste').warning('processando %s', 'pedido', extra={'chamado': 7})
+            return HttpResponse('ok')
+
+        gravador = Gravador()
+        gravador.addFilter(FiltroRequisicao())
+        logging.getLogger('tickets.teste').addHandler(gravador)
+        self.addCleanup(logging.getLogger('tickets.teste').removeHandler, gravador)
+
+        resposta = RequestIdMiddleware(view_com_log)(RequestFactory().get('/', HTTP_X_REQUEST_ID='abc-123'))
+        self.assertEqual(resposta['X-Request-ID'], 'abc-123')
+        dados = json.loads(FormatoJSON().format(registros[0]))
+        self.assertEqual(dados['request_id'], 'abc-123')
+        self.assertEqual(dados['mensagem'], 'processando pedido')
+        self.assertEqual(dados['chamado'], 7)
+
+        # Um id inválido no cabeçalho é trocado por um novo
+        resposta = RequestIdMiddleware(view_com_log)(RequestFactory().get('/', HTTP_X_REQUEST_ID='x' * 100))
+        self.assertEqual(len(resposta['X-Request-ID']), 32)
+
+    def test_manipulador_fila_escreve_em_outra_thread(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = os.path.join(pasta, 'app.log')
+            manipulador = ManipuladorFila(arquivo=arquivo)
+            manipulador.setFormatter(FormatoJSON())
+            logger = logging.getLogger('tickets.teste.fila')
+            logger.addHandler(manipulador)
+            logger.propagate = False
+            try:
+                logger.error('falha no chamado %d', 42)
+            finally:
+                logger.removeHandler(manipulador)
+                logger.propagate = True
+                manipulador.close()
+            with open(arquivo, encoding='utf-8') as conteudo:
+                dados = json.loads(conteudo.readline())
+        self.assertEqual(dados['mensagem'], 'falha no chamado 42')
+        self.assertEqual(dados['nivel'], 'ERROR')
+
+    def test_manipulador_fila_reinicia_a_thread_depois_de_fork(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = os.path.join(pasta, 'app.log')
+            manipulador = ManipuladorFila(arquivo=arquivo)
+            manipulador.setFormatter(FormatoJSON())
+            logger = logging.getLogger('tickets.teste.fork')
+            logger.addHandler(manipulador)
+            logger.propagate = False
+            try:
+                logger.error('antes do fork')
+                herdado = manipulador.listener
+                # Como num worker criado por fork: o handler veio do pai, a thread não
+                herdado.stop()
+                manipulador._pid = None
+                logger.error('no worker')
+                self.assertIsNot(manipulador.listener, herdado)
+            finally:
+                logger.removeHandler(manipulador)
+                logger.propagate = True
+                manipulador.close()
+            with open(arquivo, encoding='utf-8') as conteudo:
+                mensagens = [json.loads(linha)['mensagem'] for linha in conteudo]
+        self.assertEqual(mensagens, ['antes do fork', 'no worker'])
+
+    def test_niveis_por_logger(self):
+        self.assertEqual(
+            niveis_por_logger('django_auth_ldap=debug, tickets=WARNING'),
+            {'django_auth_ldap': {'level': 'DEBUG'}, 'tickets': {'level': 'WARNING'}},
+        )
+
+
+class DetalheCondicionalTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.chamado = Chamado.objects.get(pk=self.criar_chamados(1)[0])
+        Comentario.objects.create(chamado=self.chamado, usuario=self.tecnico, conteudo='Primeiro comentário')
+        self.url = reverse('tickets:detalhe', args=[self.chamado.pk])
+        self.entrar(self.usuario)
+
+    def _consultas(self, **cabecalhos):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(self.url, **cabecalhos)
+        tabelas = ' '.join(consulta['sql'] for consulta in contexto.captured_queries)
+        return resposta, tabelas
+
+    def test_sem_alteracao_responde_304_sem_consultar_comentarios(self):
+        primeira = self.client.get(self.url)
+        self.assertEqual(primeira.status_code, 200)
+        self.assertIn('private', primeira['Cache-Control'])
+
+        resposta, sql = self._consultas(HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(resposta.status_code, 304)
+        self.assertEqual(resposta['ETag'], primeira['ETag'])
+        self.assertNotIn(Comentario._meta.db_table, sql)
+
+    def test_fragmentos_em_cache_ate_a_proxima_gravacao(self):
+        self.client.get(self.url)
+        resposta, sql = self._consultas()
+        self.assertContains(resposta, 'Primeiro comentário')
+        self.assertNotIn(Comentario._meta.db_table, sql)
+        self.assertNotIn(Anexo._meta.db_table, sql)
+
+        Comentario.objects.create(chamado=self.chamado, usuario=self.tecnico, conteudo='Segundo comentário')
+        self.assertContains(self.client.get(self.url), 'Segundo comentário')
+
+    def test_gravacoes_mudam_a_versao(self):
+        versoes = [Chamado.objects.get(pk=self.chamado.pk).versao]
+
+        def nova_versao():
+            versoes.append(Chamado.objects.get(pk=self.chamado.pk).versao)
+            return versoes[-1] > versoes[-2]
+
+        Anexo.objects.create(chamado=self.chamado, usuario_upload=self.usuario, caminho=r'\\srv\a.txt')
+        self.assertTrue(nova_versao())
+        executar_transicao(self.chamado, 'aceitar', tecnico=self.tecnico)
+        self.assertTrue(nova_versao())
+        self.chamado.observacao = 'Editado no admin'
+        antes = self.chamado.versao
+        with CaptureQueriesContext(connection) as contexto:
+            self.chamado.save(update_fields=['observacao'])
+        # A versão em memória acompanha o incremento, sem reler o chamado
+        self.assertFalse([q for q in contexto.captured_queries if q['sql'].startswith('SELECT') and Chamado._meta.db_table in q['sql']])
+        self.assertEqual(self.chamado.versao, antes + 1)
+        self.assertTrue(nova_versao())
+
+        etag = self.client.get(self.url)['ETag']
+        Comentario.objects.filter(chamado=self.chamado).delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depende_de_quem_ve(self):
+        etag = self.client.get(self.url)['ETag']
+        self.entrar(self.tecnico)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_mensagem_pendente_desativa_resposta_condicional(self):
+        self.entrar(self.tecnico)
+        etag = self.client.get(self.url)['ETag']
+        # Aceitar um chamado que já está em atendimento gera uma mensagem de erro
+        Chamado.objects.filter(pk=self.chamado.pk).update(status=Chamado.Status.EM_ATENDIMENTO, tecnico=self.tecnico)
+        self.client.get(reverse('tickets:aceitar', args=[self.chamado.pk]))
+
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotIn('ETag', resposta)
+        self.assertIn('no-store', resposta['Cache-Control'])
+
+
+class ComentariosIncrementaisTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.chamado = Chamado.objects.get(pk=self.criar_chamados(1)[0])
+        agora = timezone.now()
+        for i in range(5):
+            comentario = Comentario.objects.create(chamado=self.chamado, usuario=self.tecnico, conteudo=f'Comentário {i}')
+            Comentario.objects.filter(pk=comentario.pk).update(data_criacao=agora - timedelta(minutes=5 - i))
+        self.url = reverse('tickets:comentarios', args=[self.chamado.pk])
+        self.entrar(self.usuario)
+
+    def _conteudos(self, dados):
+        return [comentario['conteudo'] for comentario in dados['comentarios']]
+
+    def test_mais_recentes_e_anteriores_em_ordem_cronologica(self):
+        dados = self.client.get(self.url, {'por_pagina': 2}).json()
+        self.assertEqual(self._conteudos(dados), ['Comentário 3', 'Comentário 4'])
+
+        vistos = self._conteudos(dados)
+        while dados['anteriores']:
+            dados = self.client.get(self.url, {'por_pagina': 2, 'cursor': dados['anteriores']}).json()
+            vistos = self._conteudos(dados) + vistos
+        self.assertEqual(vistos, [f'Comentário {i}' for i in range(5)])
+
+    def test_novos_a_partir_do_cursor(self):
+        dados = self.client.get(self.url).json()
+        vazio = self.client.get(self.url, {'cursor': dados['novos']}).json()
+        self.assertEqual(vazio['comentarios'], [])
+        self.assertEqual(vazio['novos'], dados['novos'])
+
+        Comentario.objects.create(chamado=self.chamado, usuario=self.usuario, conteudo='Chegou agora')
+        novos = self.client.get(self.url, {'cursor': dados['novos']}).json()
+        self.assertEqual(self._conteudos(novos), ['Chegou agora'])
+        self.assertFalse(novos['mais_novos'])
+
+    def test_permissao_igual_a_do_detalhe(self):
+        outro = get_user_model().objects.create_user(username='outro', password='x')
+        self.entrar(outro)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.entrar(self.tecnico)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(reverse('tickets:comentarios', args=[0])).status_code, 404)
+
+    def test_detalhe_mostra_so_a_primeira_pagina(self):
+        with self.settings(TICKETS_CACHE_FRAGMENTOS=0, TICKETS_COMENTARIOS_POR_PAGINA=2):
+            resposta = self.client.get(reverse('tickets:detalhe', args=[self.chamado.pk]))
+        self.assertContains(resposta, 'Comentário 4')
+        self.assertNotContains(resposta, 'Comentário 0')
+        self.assertContains(resposta, 'carregar-anteriores')
+
+
+class ConfiguracaoBancoTests(TestCase):
+    def _configuracao(self, **variaveis):
+        with mock.patch.dict(os.environ, variaveis, clear=True):
+            return configuracao_banco(Path('/base'))
+
+    def test_sqlite_otimizado_por_padrao(self):
+        banco = self._configuracao()
+        self.assertEqual(banco['NAME'], Path('/base') / 'db.sqlite3')
+        self.assertIn('journal_mode=WAL', banco['OPTIONS']['init_command'])
+        self.assertIn('busy_timeout=5000', banco['OPTIONS']['init_command'])
+        self.assertEqual(banco['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+        sem_otimizacao = self._configuracao(DB_SQLITE_OTIMIZADO='False')
+        self.assertNotIn('transaction_mode', sem_otimizacao['OPTIONS'])
+
+    def test_postgresql_persistente_ou_com_pool(self):
+        banco = self._configuracao(DB_ENGINE='postgresql', DB_NAME='chamados', DB_HOST='db', DB_CONN_MAX_AGE='120')
+        self.assertEqual(banco['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(banco['CONN_MAX_AGE'], 120)
+        self.assertTrue(banco['CONN_HEALTH_CHECKS'])
+        self.assertEqual(banco['OPTIONS'], {})
+
+        # O pool do psycopg não pode ser combinado com conexões persistentes
+        banco = self._configuracao(DB_ENGINE='postgresql', DB_POOL='True', DB_POOL_MAXIMO='20')
+        self.assertEqual(banco['CONN_MAX_AGE'], 0)
+        self.assertEqual(banco['OPTIONS']['pool']['max_size'], 20)
+
+    def test_motor_desconhecido(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self._configuracao(DB_ENGINE='oracle')
+
+    def test_pragmas_na_conexao(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Somente SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class ReplicaTests(DadosChamadosMixin, TransactionTestCase):
+    """
+    Com DB_REPLICA_NAME/DB_REPLICA_HOST definido, a réplica é um espelho do
+    banco de testes (TEST MIRROR) numa conexão separada; sem transação em
+    volta do teste, ela enxerga o que o principal gravou.
+    """
+
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        roteador.reativar_replica()
+        # Sem rollback entre os testes: ids em cache apontariam para linhas apagadas
+        cache.clear()
+        invalidar_tipos_acao()
+        self.setUpTestData()
+        self.criar_chamados(2)
+        self.entrar(self.usuario)
+
+    def _leituras_replica(self, url):
+        if 'replica' not in settings.DATABASES:
+            self.skipTest('Sem réplica configurada (DB_REPLICA_NAME ou DB_REPLICA_HOST)')
+        with CaptureQueriesContext(connections['replica']) as contexto:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [consulta['sql'] for consulta in contexto.captured_queries if Chamado._meta.db_table in consulta['sql']]
+
+    def test_gravacao_fixa_o_usuario_no_principal(self):
+        resposta = self.client.post(reverse('tickets:criar'), {'subcategoria': self.subcategoria.pk, 'observacao': 'Sem tinta'})
+        self.assertIn(roteador.COOKIE_PRINCIPAL, resposta.cookies)
+        self.assertEqual(resposta.cookies[roteador.COOKIE_PRINCIPAL]['max-age'], settings.DB_REPLICA_FIXAR)
+
+        self.client.cookies.pop(roteador.COOKIE_PRINCIPAL)
+        resposta = self.client.get(reverse('tickets:lista'))
+        self.assertNotIn(roteador.COOKIE_PRINCIPAL, resposta.cookies)
+
+    def test_listagem_le_da_replica(self):
+        self.assertTrue(self._leituras_replica(reverse('tickets:lista')))
+        # O detalhe não está entre as leituras enviadas à réplica
+        chamado = Chamado.objects.first()
+        self.assertFalse(self._leituras_replica(reverse('tickets:detalhe', args=[chamado.pk])))
+
+    def test_depois_de_gravar_le_do_principal(self):
+        self.client.post(reverse('tickets:criar'), {'subcategoria': self.subcategoria.pk, 'observacao': 'Sem tinta'})
+        self.assertFalse(self._leituras_replica(reverse('tickets:lista')))
+
+    def test_replica_indisponivel_volta_ao_principal(self):
+        if 'replica' not in settings.DATABASES:
+            self.skipTest('Sem réplica configurada (DB_REPLICA_NAME ou DB_REPLICA_HOST)')
+        replica = connections['replica']
+        with mock.patch.object(replica, 'connection', None), \
+                mock.patch.object(replica, 'ensure_connection', side_effect=OperationalError('fora do ar')):
+            self.assertEqual(self.client.get(reverse('tickets:lista')).status_code, 200)
+        # Continua no principal durante a pausa, sem tentar conectar de novo
+        self.assertFalse(self._leituras_replica(reverse('tickets:lista')))
+
+    def test_conexao_perdida_com_a_replica_repete_no_principal(self):
+        self.assertTrue(self._leituras_replica(reverse('tickets:lista')))
+        replica = connections['replica']
+
+        def conexao_perdida(execute, sql, params, many, context):
+            replica.errors_occurred = True
+            raise OperationalError('conexão perdida')
+
+        with mock.patch.object(replica, 'is_usable', return_value=False), replica.execute_wrapper(conexao_perdida):
+            self.assertEqual(self.client.get(reverse('tickets:lista')).status_code, 200)
+        self.assertFalse(self._leituras_replica(reverse('tickets:lista')))
+
+    def test_gravar_a_sessao_nao_fixa_no_principal(self):
+        # A primeira requisição depois do login grava os papéis na sessão
+        resposta = self.client.get(reverse('tickets:lista'))
+        self.assertIn(CHAVE_SESSAO, self.client.session)
+        self.assertNotIn(roteador.COOKIE_PRINCIPAL, resposta.cookies)
+
+
+class RelatoriosTests(DadosChamadosMixin, TestCase):
+    CAMPOS = ('aceites', 'resolucoes', 'reaberturas', 'avaliacoes', 'soma_notas')
+
+    def _atender(self, chamado_id, nota=None):
+        self.entrar(self.tecnico)
+        self.client.get(reverse('tickets:aceitar', args=[chamado_id]))
+        self.client.post(reverse('tickets:resolver', args=[chamado_id]))
+        if nota is not None:
+            self.entrar(self.usuario)
+            self.client.post(reverse('tickets:avaliar_e_fechar', args=[chamado_id]), {'nota': nota})
+
+    def _resumo(self):
+        return sorted(ResumoMensal.objects.values_list('mes', 'tecnico_id', 'categoria_id', *self.CAMPOS))
+
+    def test_eventos_atualizam_o_resumo_como_a_reconstrucao(self):
+        primeiro, segundo = self.criar_chamados(2)
+        self._atender(primeiro, nota=4)
+        self._atender(segundo, nota=2)
+        # Reaberto (ex.: pelo admin) e resolvido de novo
+        Chamado.objects.filter(pk=segundo).update(status=Chamado.Status.EM_ATENDIMENTO)
+        self.entrar(self.tecnico)
+        self.client.post(reverse('tickets:resolver', args=[segundo]))
+
+        resumo = ResumoMensal.objects.get()
+        self.assertEqual(resumo.tecnico, self.tecnico)
+        self.assertEqual(resumo.categoria_id, self.subcategoria.categoria_id)
+        self.assertEqual((resumo.aceites, resumo.resolucoes, resumo.reaberturas), (2, 3, 1))
+        self.assertEqual((resumo.avaliacoes, resumo.soma_notas), (2, 6))
+        # criar_chamados abre os chamados no passado; o tempo até o aceite conta desde lá
+        self.assertGreaterEqual(resumo.tempo_aceite, 60)
+
+        incremental = self._resumo()
+        self.assertEqual(reconstruir(), 1)
+        self.assertEqual(self._resumo(), incremental)
+
+    def test_relatorio_le_apenas_o_resumo(self):
+        self._atender(self.criar_chamados(1)[0], nota=5)
+        self.entrar(get_user_model().objects.create_superuser(username='admin', password='x'))
+        for por in ('tecnico', 'categoria'):
+            with CaptureQueriesContext(connection) as contexto:
+                resposta = self.client.get(reverse('myadmin:relatorios'), {'por': por})
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual(resposta.context['periodo'][0]['nota_media'], 5)
+            sql = ' '.join(consulta['sql'] for consulta in contexto.captured_queries)
+            self.assertNotIn(LogTecnico._meta.db_table, sql)
+            self.assertNotIn(Chamado._meta.db_table, sql)
+
+
+class OperacaoEmLoteTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        self.url = reverse('tickets:operacao_lote')
+        self.entrar(self.tecnico)
+
+    def _enviar(self, **dados):
+        return self.client.post(self.url, json.dumps(dados), content_type='application/json')
+
+    def test_aceita_em_lote_e_informa_os_recusados(self):
+        ids = self.criar_chamados(5)
+        outro = get_user_model().objects.create_user(username='outro_tecnico', password='x')
+        Chamado.objects.filter(pk=ids[0]).update(status=Chamado.Status.EM_ATENDIMENTO, tecnico=outro)
+
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self._enviar(acao='aceitar', ids=ids + [0], comentario='Parada geral da rede')
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados['aplicados'], ids[1:])
+        self.assertEqual([recusado['id'] for recusado in dados['recusados']], [ids[0], 0])
+
+        self.assertEqual(Chamado.objects.filter(tecnico=self.tecnico, status=Chamado.Status.EM_ATENDIMENTO).count(), 4)
+        self.assertEqual(LogTecnico.objects.filter(tipo_acao__nome='ACEITE').count(), 4)
+        self.assertEqual(Comentario.objects.filter(conteudo='Parada geral da rede').count(), 4)
+        # Um UPDATE para os quatro chamados, e não um por chamado
+        updates = [consulta for consulta in contexto.captured_queries
+                   if consulta['sql'].startswith('UPDATE') and Chamado._meta.db_table in consulta['sql']]
+        self.assertLessEqual(len(updates), 2)
+
+    def test_resolver_exige_ser_o_responsavel(self):
+        meus = self.criar_chamados(2, status=Chamado.Status.EM_ATENDIMENTO, tecnico=self.tecnico)
+        aberto = self.criar_chamados(1)
+        dados = self._enviar(acao='resolver', ids=meus + aberto).json()
+        self.assertEqual(dados['aplicados'], meus)
+        self.assertEqual(dados['recusados'][0]['id'], aberto[0])
+        self.assertEqual(Chamado.objects.filter(pk__in=meus, status=Chamado.Status.CONCLUIDO, data_conclusao__isnull=False).count(), 2)
+
+    def test_validacao_do_pedido(self):
+        self.assertEqual(self._enviar(acao='apagar', ids=[1]).status_code, 400)
+        self.assertEqual(self._enviar(acao='aceitar', ids='1,2').status_code, 400)
+        self.assertEqual(self._enviar(acao='atualizar_status', ids=[1], status='FECHADO').status_code, 400)
+        self.assertEqual(self._enviar(acao='comentar', ids=[1]).status_code, 400)
+        self.entrar(self.usuario)
+        self.assertEqual(self._enviar(acao='aceitar', ids=[1]).status_code, 403)
+
+
+class IncidentesTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        self.entrar(self.tecnico)
+        self.incidente = Incidente.objects.create(titulo='Queda da rede do prédio B', tecnico=self.tecnico)
+
+    def _updates_chamado(self, contexto):
+        return [consulta for consulta in contexto.captured_queries
+                if consulta['sql'].startswith('UPDATE') and Chamado._meta.db_table in consulta['sql']]
+
+    def test_vincular_aceita_os_abertos_e_recusa_os_de_outro_tecnico(self):
+        abertos = self.criar_chamados(3)
+        meu = self.criar_chamados(1, status=Chamado.Status.AGUARDANDO_TERCEIROS, tecnico=self.tecnico)
+        outro = get_user_model().objects.create_user(username='outro_tecnico', password='x')
+        alheio = self.criar_chamados(1, status=Chamado.Status.EM_ATENDIMENTO, tecnico=outro)
+
+        resposta = self.client.post(
+            reverse('tickets:vincular_chamados', args=[self.incidente.id]),
+            {'chamados': ', '.join(str(chamado_id) for chamado_id in abertos + meu + alheio)},
+        )
+        self.assertRedirects(resposta, reverse('tickets:detalhe_incidente', args=[self.incidente.id]))
+
+        vinculados = Chamado.objects.filter(incidente=self.incidente)
+        self.assertEqual(sorted(vinculados.values_list('pk', flat=True)), abertos + meu)
+        self.assertFalse(vinculados.exclude(tecnico=self.tecnico, status=Chamado.Status.EM_ATENDIMENTO).exists())
+        self.assertEqual(Chamado.objects.get(pk=alheio[0]).tecnico, outro)
+        self.assertEqual(LogTecnico.objects.filter(tipo_acao__nome='ACEITE').count(), 3)
+
+    def test_status_comentario_e_resolucao_sao_repassados_aos_chamados(self):
+        ids = self.criar_chamados(4)
+        incidentes.vincular(self.incidente, ids)
+
+        with CaptureQueriesContext(connection) as contexto:
+            self.client.post(
+                reverse('tickets:atualizar_status_incidente', args=[self.incidente.id]),
+                {'status': Chamado.Status.AGUARDANDO_TERCEIROS},
+            )
+        # Um UPDATE para os quatro chamados, e não um por chamado
+        self.assertEqual(len(self._updates_chamado(contexto)), 1)
+        self.assertEqual(Chamado.objects.filter(pk__in=ids, status=Chamado.Status.AGUARDANDO_TERCEIROS).count(), 4)
+
+        self.client.post(reverse('tickets:comentar_incidente', args=[self.incidente.id]), {'conteudo': 'Aguardando a operadora'})
+        self.assertEqual(Comentario.objects.filter(chamado__in=ids, conteudo='Aguardando a operadora').count(), 4)
+
+        self.client.post(reverse('tickets:resolver_incidente', args=[self.incidente.id]), {'comentario': 'Link restabelecido'})
+        self.incidente.refresh_from_db()
+        self.assertEqual(self.incidente.status, Chamado.Status.CONCLUIDO)
+        concluidos = Chamado.objects.filter(pk__in=ids, status=Chamado.Status.CONCLUIDO, data_conclusao=self.incidente.data_conclusao)
+        self.assertEqual(concluidos.count(), 4)
+        self.assertEqual(LogTecnico.objects.filter(chamado__in=ids, tipo_acao__nome='RESOLUCAO').count(), 4)
+
+        # Resolvido, o incidente não aceita mais ações
+        self.client.post(reverse('tickets:comentar_incidente', args=[self.incidente.id]), {'conteudo': 'Depois'})
+        self.assertFalse(Comentario.objects.filter(conteudo='Depois').exists())
+
+    def test_dashboard_mostra_o_incidente_uma_vez(self):
+        vinculados = self.criar_chamados(5)
+        incidentes.vincular(self.incidente, vinculados)
+        avulso = self.criar_chamados(1, status=Chamado.Status.EM_ATENDIMENTO, tecnico=self.tecnico)
+
+        resposta = self.client.get(reverse('tickets:dashboard_tecnico'))
+        self.assertContains(resposta, f'id="incidente-{self.incidente.id}"', count=1)
+        self.assertContains(resposta, '5 chamados vinculados')
+        self.assertContains(resposta, f'id="atendimento-{avulso[0]}"')
+        for chamado_id in vinculados:
+            self.assertNotContains(resposta, f'id="atendimento-{chamado_id}"')
+
+    def test_apenas_o_responsavel_altera_o_incidente(self):
+        outro = get_user_model().objects.create_user(username='outro_tecnico', password='x')
+        outro.groups.add(*self.tecnico.groups.all())
+        self.entrar(outro)
+        resposta = self.client.post(reverse('tickets:resolver_incidente', args=[self.incidente.id]))
+        self.assertEqual(resposta.status_code, 403)
+        self.entrar(self.usuario)
+        self.assertEqual(self.client.get(reverse('tickets:detalhe_incidente', args=[self.incidente.id])).status_code, 403)
+
+
+class RoteamentoTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        Habilidade.objects.create(tecnico=self.tecnico, subcategoria=self.subcategoria)
+        # Os callbacks de on_commit executados aqui guardam estado do processo
+        # (tipos de ação, motor do roteamento) com registros que o rollback apaga
+        for limpar in (invalidar_roteamento, invalidar_tipos_acao):
+            limpar()
+            self.addCleanup(limpar)
+        self.entrar(self.usuario)
+
+    def _abrir_chamado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('tickets:criar'), {'subcategoria': self.subcategoria.pk, 'observacao': 'Sem tinta'})
+        return Chamado.objects.latest('pk')
+
+    def test_chamado_novo_vai_para_o_tecnico_habilitado(self):
+        chamado = self._abrir_chamado()
+        self.assertEqual(chamado.tecnico, self.tecnico)
+        self.assertEqual(chamado.status, Chamado.Status.EM_ATENDIMENTO)
+        self.assertTrue(LogTecnico.objects.filter(chamado=chamado, tipo_acao__nome='ACEITE', tecnico=self.tecnico).exists())
+
+    @override_settings(TICKETS_ROTEAMENTO_LIMITE=1)
+    def test_acima_do_limite_espera_ate_o_tecnico_resolver(self):
+        primeiro = self._abrir_chamado()
+        segundo = self._abrir_chamado()
+        self.assertEqual(segundo.status, Chamado.Status.ABERTO)
+        self.assertIsNone(segundo.tecnico)
+
+        self.entrar(self.tecnico)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('tickets:resolver', args=[primeiro.id]))
+        segundo.refresh_from_db()
+        self.assertEqual(segundo.tecnico, self.tecnico)
+
+    @override_settings(TICKETS_ROTEAMENTO_LIMITE=1)
+    def test_limite_conferido_no_banco_quando_a_carga_em_memoria_esta_atrasada(self):
+        motor, _ = _obter_motor()
+        # Atribuição feita por outro processo: este motor continua com carga 0
+        self.criar_chamados(1, tecnico=self.tecnico, status=Chamado.Status.EM_ATENDIMENTO)
+        chamado = self._abrir_chamado()
+        self.assertEqual(chamado.status, Chamado.Status.ABERTO)
+        self.assertIsNone(chamado.tecnico)
+        self.assertEqual(motor.carga[self.tecnico.pk], 1)
+        self.assertIn(chamado.pk, motor.pendentes)
+
+    def test_motor_escolhe_o_menos_carregado_e_a_maior_prioridade(self):
+        motor = MotorRoteamento([(1, 10), (1, 20)], carga={10: 2, 20: 1}, limite=2)
+        self.assertEqual(motor.chegada(1, 1, Chamado.Prioridade.BAIXA, 0), 20)
+        motor.ajustar_carga(20, 1)
+        # Os dois no limite: os chamados esperam e saem por prioridade, não por chegada
+        self.assertIsNone(motor.chegada(2, 1, Chamado.Prioridade.BAIXA, 1))
+        self.assertIsNone(motor.chegada(3, 1, Chamado.Prioridade.ALTA, 2))
+        motor.remover(3)
+        self.assertIsNone(motor.chegada(4, 1, Chamado.Prioridade.MEDIA, 3))
+        motor.ajustar_carga(10, -1)
+        self.assertEqual(motor.proximo_para(10), 4)
+        motor.ajustar_carga(10, 1)
+        self.assertIsNone(motor.proximo_para(10))
+
+    def test_simulacao_reduz_a_espera_dos_prioritarios(self):
+        aleatorio = random.Random(1)
+        habilidades = gerar_habilidades(4, 6, 3, aleatorio)
+        chegadas = gerar_chegadas(1500, 14, 90, 6, aleatorio)
+        por_prioridade = simular(chegadas, habilidades, limite=5)
+        fifo = simular(chegadas, habilidades, limite=5, pesos={})
+        self.assertEqual(sum(map(len, por_prioridade.values())), 1500)
+        alta = Chamado.Prioridade.ALTA
+        self.assertLess(sum(por_prioridade[alta]), sum(fifo[alta]))
+
+
+class RegrasPrioridadeTests(DadosChamadosMixin, TestCase):
+    def setUp(self):
+        # As regras compiladas ficam no processo; o rollback do teste não as apaga
+        self.addCleanup(invalidar_regras)
+        self.entrar(self.usuario)
+
+    def _abrir_chamado(self, observacao='Sem tinta'):
+        self.client.post(reverse('tickets:criar'), {'subcategoria': self.subcategoria.pk, 'observacao': observacao})
+        return Chamado.objects.latest('pk')
+
+    def test_regras_por_grupo_categoria_e_palavras_chave(self):
+        diretoria = Group.objects.create(name='Diretoria')
+        RegraPrioridade.objects.create(nome='Diretoria', prioridade=Chamado.Prioridade.ALTA, grupo=diretoria)
+        RegraPrioridade.objects.create(nome='Hardware', prioridade=Chamado.Prioridade.MEDIA, categoria=self.subcategoria.categoria)
+        RegraPrioridade.objects.create(nome='Rede', prioridade=Chamado.Prioridade.ALTA, palavras_chave='sem conexão, fora do ar')
+
+        self.assertEqual(self._abrir_chamado().prioridade, Chamado.Prioridade.MEDIA)
+        # Sem acento e com outras maiúsculas também vale
+        self.assertEqual(self._abrir_chamado('Impressora SEM CONEXAO desde ontem').prioridade, Chamado.Prioridade.ALTA)
+
+        self.usuario.groups.add(diretoria)
+        self.assertEqual(self._abrir_chamado().prioridade, Chamado.Prioridade.ALTA)
+
+    def test_decide_sem_consultas_e_recompila_ao_editar(self):
+        regra = RegraPrioridade.objects.create(nome='Hardware', prioridade=Chamado.Prioridade.MEDIA, categoria=self.subcategoria.categoria)
+        # Como no formulário: a subcategoria carregada sem a categoria
+        subcategoria = Subcategoria.objects.get(pk=self.subcategoria.pk)
+        prioridade_para(frozenset(), subcategoria, '')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(prioridade_para(frozenset({'CPD'}), subcategoria, 'Sem tinta'), Chamado.Prioridade.MEDIA)
+
+        regra.ativa = False
+        regra.save()
+        self.assertEqual(self._abrir_chamado().prioridade, Chamado.Prioridade.BAIXA)
+
+    def test_edicao_em_outro_processo_recompila_as_regras(self):
+        subcategoria = Subcategoria.objects.get(pk=self.subcategoria.pk)
+        self.assertEqual(prioridade_para(frozenset(), subcategoria, ''), Chamado.Prioridade.BAIXA)
+        # Outro processo grava a regra: aqui só chega a nova versão no cache compartilhado
+        RegraPrioridade.objects.bulk_create([RegraPrioridade(nome='Hardware', prioridade=Chamado.Prioridade.ALTA, categoria=self.subcategoria.categoria)])
+        incrementar_versao(CHAVE_VERSAO)
+        self.assertEqual(prioridade_para(frozenset(), subcategoria, ''), Chamado.Prioridade.ALTA)
+
+
+class FilaPrioridadeTests(DadosChamadosMixin, TestCase):
+    def _abrir(self, prioridade, minutos_atras):
+        chamado = Chamado.objects.create(usuario=self.usuario, subcategoria=self.subcategoria, prioridade=prioridade)
+        Chamado.objects.filter(pk=chamado.pk).update(data_abertura=timezone.now() - timedelta(minutes=minutos_atras))
+        return chamado.pk
+
+    def _ordem(self):
+        return list(Chamado.objects.na_fila().values_list('pk', flat=True))
+
+    def test_prioridade_adianta_e_espera_envelhece(self):
+        Prioridade = Chamado.Prioridade
+        baixa_antiga = self._abrir(Prioridade.BAIXA, 300)
+        baixa_recente = self._abrir(Prioridade.BAIXA, 60)
+        media = self._abrir(Prioridade.MEDIA, 30)
+        alta = self._abrir(Prioridade.ALTA, 0)
+        Chamado.objects.recalcular_fila()
+
+        # Avanços padrão: ALTA 240 min, MEDIA 60 min
+        self.assertEqual(self._ordem(), [baixa_antiga, alta, media, baixa_recente])
+
+    @override_settings(TICKETS_FILA_AVANCO={'ALTA': 0, 'MEDIA': 0, 'BAIXA': 0})
+    def test_recalcular_fila_com_outros_avancos(self):
+        antigo = self._abrir(Chamado.Prioridade.BAIXA, 10)
+        novo = self._abrir(Chamado.Prioridade.ALTA, 0)
+        saida = StringIO()
+        call_command('recalcular_fila', stdout=saida)
+        self.assertIn('2 chamados atualizados.', saida.getvalue())
+        self.assertEqual(self._ordem(), [antigo, novo])
+
+        with override_settings(TICKETS_FILA_AVANCO={'ALTA': 60}):
+            # Mudar a prioridade recalcula a posição do chamado
+            chamado = Chamado.objects.get(pk=antigo)
+            chamado.prioridade = Chamado.Prioridade.ALTA
+            chamado.save(update_fields=['prioridade'])
+        self.assertEqual(self._ordem(), [antigo, novo])
+        chamado.refresh_from_db()
+        self.assertEqual(chamado.data_fila, chamado.data_abertura - timedelta(minutes=60))
+
+    def test_chamados_sem_data_fila_entram_pela_data_de_abertura(self):
+        antigo = self._abrir(Chamado.Prioridade.BAIXA, 30)
+        alta = self._abrir(Chamado.Prioridade.ALTA, 0)
+        Chamado.objects.recalcular_fila()
+        # Como um chamado gravado antes de existir a coluna
+        Chamado.objects.filter(pk=antigo).update(data_fila=None)
+        self.assertEqual(self._ordem(), [alta, antigo])
+        self.assertEqual(Chamado.objects.na_fila().count(), 2)
+
+        tickets = apps.get_app_config('tickets')
+        # Migrate parcial, ainda sem a tabela: nada a fazer (e nada na réplica)
+        with mock.patch.object(connection.introspection, 'table_names', return_value=[]), self.assertNumQueries(0):
+            preencher_fila(tickets, using='default')
+        self.assertFalse(roteador.RoteadorReplica().allow_migrate(roteador.REPLICA, 'tickets'))
+
+        preencher_fila(tickets, using='default')
+        self.assertEqual(Chamado.objects.filter(data_fila__isnull=True).count(), 0)
+
+    @override_settings(TICKETS_FILA_TAMANHO=2)
+    def test_painel_mostra_o_inicio_da_fila(self):
+        ids = [self._abrir(Chamado.Prioridade.BAIXA, 10), self._abrir(Chamado.Prioridade.BAIXA, 5)]
+        ids.insert(0, self._abrir(Chamado.Prioridade.ALTA, 0))
+        Chamado.objects.recalcular_fila()
+        self.entrar(self.tecnico)
+
+        resposta = self.client.get(reverse('tickets:dashboard_tecnico'))
+        self.assertEqual([chamado.pk for chamado in resposta.context['chamados_na_fila']], ids[:2])
+        self.assertContains(resposta, 'Prioridade Alta')
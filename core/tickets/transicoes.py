@@ -0,0 +1,130 @@
+# tickets/transicoes.py
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .broker import publicar_evento_chamado
+from .estatisticas import invalidar_estatisticas
+from .models import Chamado
+from .versoes import campos_nova_versao
+
+Status = Chamado.Status
+
+
+class ConflitoTransicao(Exception):
+    """O chamado não estava mais no status esperado (outra pessoa agiu antes)."""
+
+
+# Enviado depois do commit de cada transição, com 'acao' e a lista 'chamados'
+# (ex.: para a distribuição automática acompanhar a carga dos técnicos)
+transicao_aplicada = Signal()
+
+
+@dataclass(frozen=True)
+class Transicao:
+    origens: tuple
+    destinos: tuple
+    mensagem_conflito: str
+
+
+# Máquina de estados do Chamado: de quais status cada ação pode partir
+TRANSICOES = {
+    'aceitar': Transicao(
+        origens=(Status.ABERTO,),
+        destinos=(Status.EM_ATENDIMENTO,),
+        mensagem_conflito="Este chamado já foi aceito por outro técnico ou não está mais aberto.",
+    ),
+    'cancelar': Transicao(
+        origens=(Status.ABERTO,),
+        destinos=(Status.CANCELADO,),
+        mensagem_conflito="O chamado não pode mais ser cancelado: ele já está sendo atendido.",
+    ),
+    'atualizar_status': Transicao(
+        origens=(Status.EM_ATENDIMENTO, Status.AGUARDANDO_RESPOSTA, Status.AGUARDANDO_TERCEIROS),
+        destinos=(Status.EM_ATENDIMENTO, Status.AGUARDANDO_RESPOSTA, Status.AGUARDANDO_TERCEIROS),
+        mensagem_conflito="O status do chamado foi alterado por outra ação. Verifique e tente novamente.",
+    ),
+    'responder': Transicao(
+        origens=(Status.AGUARDANDO_RESPOSTA,),
+        destinos=(Status.EM_ATENDIMENTO,),
+        mensagem_conflito="O chamado não está mais aguardando a sua resposta.",
+    ),
+    'resolver': Transicao(
+        origens=(Status.EM_ATENDIMENTO,),
+        destinos=(Status.CONCLUIDO,),
+        mensagem_conflito="O chamado não está mais em atendimento e não pode ser resolvido.",
+    ),
+    # Resolução de um incidente: os chamados vinculados são concluídos em
+    # qualquer status de atendimento (ver tickets/incidentes.py)
+    'resolver_incidente': Transicao(
+        origens=(Status.EM_ATENDIMENTO, Status.AGUARDANDO_RESPOSTA, Status.AGUARDANDO_TERCEIROS),
+        destinos=(Status.CONCLUIDO,),
+        mensagem_conflito="Um dos chamados do incidente foi alterado por outra ação. Verifique e tente novamente.",
+    ),
+    'fechar': Transicao(
+        origens=(Status.CONCLUIDO,),
+        destinos=(Status.FECHADO,),
+        mensagem_conflito="Este chamado já foi avaliado e fechado.",
+    ),
+}
+
+
+def executar_transicao(chamado, acao, destino=None, condicoes=None, **campos):
+    """
+    Aplica a transição 'acao' ao chamado com um único UPDATE condicional:
+
+        UPDATE ... SET status = <destino>, <campos> WHERE id = <id> AND status IN (<origens>) [AND <condicoes>]
+
+    Se nenhuma linha for atualizada, o chamado mudou desde que foi lido e a
+    transição levanta ConflitoTransicao. Só os campos da transição são
+    gravados, então alterações concorrentes em outros campos não se perdem.
+    A instância recebida é atualizada com os novos valores. 'condicoes' é um
+    dicionário de filtros ou um Q (ex.: com subconsultas).
+    """
+    return executar_transicao_em_lote([chamado], acao, destino, condicoes, **campos)[0]
+
+
+def executar_transicao_em_lote(chamados, acao, destino=None, condicoes=None, **campos):
+    """
+    Como executar_transicao, mas para vários chamados num único UPDATE
+    (WHERE id IN (...)). Se algum deles não estiver mais em condições de
+    fazer a transição, nenhum é alterado (ConflitoTransicao).
+    """
+    transicao = TRANSICOES[acao]
+    destino = destino or transicao.destinos[0]
+    if destino not in transicao.destinos:
+        raise ValueError(f"Status '{destino}' não permitido para a ação '{acao}'.")
+    if not chamados:
+        return chamados
+
+    if destino == Status.CONCLUIDO:
+        campos.setdefault('data_conclusao', timezone.now())
+
+    versao = campos_nova_versao()
+    # Com vários chamados, um UPDATE parcial precisa ser desfeito; com um só,
+    # não há o que desfazer e o UPDATE roda sem abrir transação
+    with transaction.atomic() if len(chamados) > 1 else nullcontext():
+        if not isinstance(condicoes, Q):
+            condicoes = Q(**(condicoes or {}))
+        atualizados = Chamado.objects.filter(
+            condicoes, pk__in=[chamado.pk for chamado in chamados], status__in=transicao.origens,
+        ).update(status=destino, **versao, **campos)
+        if atualizados != len(chamados):
+            raise ConflitoTransicao(transicao.mensagem_conflito)
+
+    for chamado in chamados:
+        chamado.status = destino
+        chamado.versao += 1
+        chamado.atualizado_em = versao['atualizado_em']
+        for campo, valor in campos.items():
+            setattr(chamado, campo, valor)
+        publicar_evento_chamado(chamado, acao)
+    # O UPDATE não dispara post_save; descarta a contagem por status em cache
+    transaction.on_commit(invalidar_estatisticas)
+    transaction.on_commit(partial(transicao_aplicada.send, sender=Chamado, acao=acao, chamados=chamados), robust=True)
+    return chamados
@@ -8,6 +8,7 @@ urlpatterns = [
     path('', views.lista_chamados, name='lista'),
     path('<int:chamado_id>/', views.detalhe_chamado, name='detalhe'),
     path('historico/', views.historico_chamados, name='historico'),
+    path('busca/', views.buscar_chamados, name='buscar'),
 
     # --- URLs para USUÁRIOS normais ---
     path('criar/', views.criar_chamado, name='criar'),
@@ -17,15 +18,24 @@ urlpatterns = [
     path('<int:chamado_id>/aceitar/', views.aceitar_chamado, name='aceitar'),
     path('<int:chamado_id>/atualizar_status/', views.atualizar_status, name='atualizar_status'),
     path('<int:chamado_id>/resolver/', views.resolver_chamado, name='resolver'),
+    path('lote/', views.operacao_em_lote, name='operacao_lote'),
+    path('incidentes/novo/', views.criar_incidente, name='criar_incidente'),
+    path('incidentes/<int:incidente_id>/', views.detalhe_incidente, name='detalhe_incidente'),
+    path('incidentes/<int:incidente_id>/vincular/', views.vincular_chamados, name='vincular_chamados'),
+    path('incidentes/<int:incidente_id>/atualizar_status/', views.atualizar_status_incidente, name='atualizar_status_incidente'),
+    path('incidentes/<int:incidente_id>/comentar/', views.comentar_incidente, name='comentar_incidente'),
+    path('incidentes/<int:incidente_id>/resolver/', views.resolver_incidente, name='resolver_incidente'),
 
     # --- URLs para ações específicas ---
     path('<int:chamado_id>/avaliar/', views.avaliar_e_fechar_chamado, name='avaliar_e_fechar'),
     path('<int:chamado_id>/adicionar_anexo/', views.adicionar_anexo, name='adicionar_anexo'),
     path('<int:chamado_id>/adicionar_comentario/', views.adicionar_comentario, name='adicionar_comentario'),
+    path('<int:chamado_id>/comentarios/', views.comentarios_chamado, name='comentarios'),
 
     # URLs para dashboards
     path('dashboard/usuario/', views.dashboard_usuario, name='dashboard_usuario'),
     path('dashboard/tecnico/', views.dashboard_tecnico, name='dashboard_tecnico'),
+    path('dashboard/tecnico/eventos/', views.fila_eventos, name='fila_eventos'),
 
 
 
@@ -0,0 +1,55 @@
+# tickets/versoes.py
+"""
+Versão de cada chamado, usada pela página de detalhe.
+
+Chamado.versao e Chamado.atualizado_em mudam em toda gravação: no
+Chamado.save(), nas transições (UPDATE condicional de transicoes.py) e, por
+sinais, ao gravar ou apagar comentários, anexos e a avaliação. A página de
+detalhe usa a versão na chave dos fragmentos em cache e para responder 304
+(ETag/Last-Modified) quando nada mudou.
+"""
+import hashlib
+
+from django.db.models import F
+from django.middleware.csrf import get_token
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from authentication.papeis import versao_papeis
+
+from .models import Anexo, Avaliacao, Chamado, Comentario
+
+
+def campos_nova_versao():
+    """Campos a somar num UPDATE de chamado para que ele mude de versão."""
+    return {'versao': F('versao') + 1, 'atualizado_em': timezone.now()}
+
+
+def tocar_chamado(chamado_id):
+    Chamado.objects.filter(pk=chamado_id).update(**campos_nova_versao())
+
+
+def _ao_gravar_relacionado(sender, instance, **kwargs):
+    tocar_chamado(instance.chamado_id)
+
+
+def conectar_sinais():
+    for modelo in (Comentario, Anexo, Avaliacao):
+        nome = modelo._meta.model_name
+        post_save.connect(_ao_gravar_relacionado, sender=modelo, dispatch_uid=f'versao_{nome}_salvo')
+        post_delete.connect(_ao_gravar_relacionado, sender=modelo, dispatch_uid=f'versao_{nome}_apagado')
+
+
+def etag_detalhe(request, chamado):
+    """
+    ETag da página de detalhe para quem a está vendo. Além da versão do
+    chamado, a página depende do usuário (ações disponíveis), dos papéis dele
+    e do token CSRF dos formulários.
+    """
+    # get_token garante o segredo CSRF já na primeira visita (é o mesmo que a página vai usar)
+    get_token(request)
+    partes = (
+        chamado.pk, chamado.versao, chamado.atualizado_em.isoformat(),
+        request.user.pk, versao_papeis(request.user.pk), request.META.get('CSRF_COOKIE', ''),
+    )
+    return hashlib.md5(repr(partes).encode(), usedforsecurity=False).hexdigest()
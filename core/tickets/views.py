@@ -1,53 +1,176 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.decorators.http import require_POST # Adicione esta importação
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.messages import get_messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden
-from .models import Chamado, Comentario, Anexo, LogTecnico, TipoAcao
-from .forms import ChamadoForm, ComentarioForm, AtualizarStatusForm, AnexoForm, AvaliacaoForm
-from django.utils import timezone
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date, quote_etag
+from core.roteador import leitura_replica
+from .models import Chamado, Comentario, Anexo, Incidente
+from .forms import (
+    ChamadoForm, ComentarioForm, AtualizarStatusForm, AnexoForm, AvaliacaoForm,
+    IncidenteForm, VincularChamadosForm, AtualizarStatusIncidenteForm, ResolverIncidenteForm,
+)
+from . import incidentes
+from .busca import buscar
+from .broker import CANAL_FILA, obter_broker, publicar_evento_chamado
+from .eventos import lote_eventos, registrar_evento
+from .operacoes import ACOES_LOTE, LIMITE_LOTE, aplicar_em_lote
+from . import fila
+from .paginacao import KeysetPaginator, itens_por_pagina
+from .prioridades import prioridade_para
+from .roteamento import rotear_apos_commit
+from .transicoes import TRANSICOES, ConflitoTransicao, executar_transicao
+from .versoes import etag_detalhe
+
+# Tempo (em segundos) dos fragmentos da página de detalhe em cache; a chave
+# inclui a versão do chamado, então uma gravação já os torna obsoletos
+TEMPO_CACHE_FRAGMENTOS_PADRAO = 600
+
+# Comentários mostrados de início na página de detalhe; os mais antigos vêm
+# sob demanda pela view comentarios_chamado
+COMENTARIOS_POR_PAGINA_PADRAO = 20
 
 # View principal que mostra a lista de chamados
 @login_required
+@leitura_replica()
 def lista_chamados(request):
     # Verificamos se o usuário é do grupo 'CPD' (ou seja, se é técnico)
-    is_tecnico = request.user.groups.filter(name='CPD').exists()
+    is_tecnico = request.papeis.is_tecnico
 
     if is_tecnico:
         # Se for técnico, mostra todos os chamados
-        lista = Chamado.objects.all().order_by('-data_abertura')
+        lista = Chamado.objects.para_lista()
     else:
         # Se for um usuário comum, mostra apenas os seus próprios chamados
-        lista = Chamado.objects.filter(usuario=request.user).order_by('-data_abertura')
+        lista = Chamado.objects.para_lista().filter(usuario=request.user)
+
+    # Paginação por cursor: mais recentes primeiro, em páginas de tamanho fixo
+    paginador = KeysetPaginator(lista, 'data_abertura', itens_por_pagina(request))
+    pagina = paginador.pagina(request.GET.get('cursor'))
 
-    return render(request, 'tickets/dashboard_tecnico.html', {'chamados': lista, 'is_tecnico': is_tecnico})
+    return render(request, 'tickets/lista_chamados.html', {'chamados': pagina, 'pagina': pagina, 'is_tecnico': is_tecnico})
+
+# Busca de texto nos chamados, comentários e logs
+@login_required
+def buscar_chamados(request):
+    is_tecnico = request.papeis.is_tecnico
+    consulta = request.GET.get('q', '').strip()
+    try:
+        pagina = max(int(request.GET.get('pagina', 1)), 1)
+    except ValueError:
+        pagina = 1
+
+    # Técnicos pesquisam em todos os chamados; usuários comuns, só nos seus
+    resultado = buscar(
+        consulta,
+        usuario_id=None if is_tecnico else request.user.pk,
+        pagina=pagina,
+        por_pagina=itens_por_pagina(request),
+    )
+
+    return render(request, 'tickets/busca.html', {'resultado': resultado, 'consulta': consulta, 'is_tecnico': is_tecnico})
 
 # View para ver os detalhes de um chamado específico
 @login_required
 def detalhe_chamado(request, chamado_id):
-    chamado = get_object_or_404(Chamado, id=chamado_id)
-    is_tecnico = request.user.groups.filter(name='CPD').exists()
+    chamado = get_object_or_404(Chamado.objects.para_detalhe(), id=chamado_id)
+    is_tecnico = request.papeis.is_tecnico
 
     # Permissão: apenas o criador do chamado ou um técnico podem ver
-    if not (chamado.usuario == request.user or is_tecnico):
+    if not (chamado.usuario_id == request.user.pk or is_tecnico):
         return HttpResponseForbidden("Você não tem permissão para ver este chamado.")
-    
-    # Busca os comentários associados a este chamado
-    comentarios = Comentario.objects.filter(chamado=chamado).order_by('data_criacao')
-    
-    # Prepara o formulário de novo comentário (será processado por outra view)
-    form_comentario = ComentarioForm()
-    form_status = AtualizarStatusForm(instance=chamado)
 
+    # Com mensagens pendentes a página não pode vir do cache do navegador
+    # (nem ser guardada nele): a mensagem só deve aparecer uma vez
+    condicional = not get_messages(request)
+    if condicional:
+        etag = quote_etag(etag_detalhe(request, chamado))
+        modificado = int(chamado.atualizado_em.timestamp())
+        resposta = get_conditional_response(request, etag=etag, last_modified=modificado)
+        if resposta is not None:
+            return _cache_revalidado(resposta, etag, modificado)
+
+    # Querysets preguiçosos: só são consultados se o fragmento do template
+    # que os usa não estiver em cache
     context = {
         'chamado': chamado,
         'is_tecnico': is_tecnico,
-        'comentarios': comentarios,
+        'setores': chamado.usuario.groups.all(),
+        'anexos': chamado.anexos.select_related('usuario_upload').order_by('data_upload'),
+        'comentarios': SimpleLazyObject(lambda: _pagina_comentarios(
+            chamado.id, getattr(settings, 'TICKETS_COMENTARIOS_POR_PAGINA', COMENTARIOS_POR_PAGINA_PADRAO))),
+        'tempo_cache': getattr(settings, 'TICKETS_CACHE_FRAGMENTOS', TEMPO_CACHE_FRAGMENTOS_PADRAO),
         'form_comentario': ComentarioForm(),
         'form_status': AtualizarStatusForm(instance=chamado),
         'form_anexo': AnexoForm(),
     }
 
-    return render(request, 'tickets/detalhe_chamado.html', context)
+    resposta = render(request, 'tickets/detalhe_chamado.html', context)
+    if condicional:
+        return _cache_revalidado(resposta, etag, modificado)
+    patch_cache_control(resposta, private=True, no_store=True)
+    return resposta
+
+
+def _cache_revalidado(resposta, etag, modificado):
+    # O navegador pode guardar a página, mas só para este usuário e revalidando a cada acesso
+    resposta['ETag'] = etag
+    resposta['Last-Modified'] = http_date(modificado)
+    patch_cache_control(resposta, private=True, no_cache=True)
+    patch_vary_headers(resposta, ['Cookie'])
+    return resposta
+
+
+def _pagina_comentarios(chamado_id, por_pagina, token=None):
+    """
+    Página de comentários do chamado, dos mais recentes para os mais antigos.
+    Além dos cursores do paginador, token_novos continua a partir do comentário
+    mais recente da página, para buscar só os que chegarem depois.
+    """
+    comentarios = Comentario.objects.filter(chamado_id=chamado_id).select_related('usuario')
+    paginador = KeysetPaginator(comentarios, 'data_criacao', por_pagina)
+    pagina = paginador.pagina(token)
+    pagina.token_novos = paginador.token('antes', pagina.itens[0]) if pagina.itens else token
+    return pagina
+
+
+# Comentários de um chamado em JSON, para a página de detalhe carregar aos poucos
+@login_required
+def comentarios_chamado(request, chamado_id):
+    dono = Chamado.objects.filter(id=chamado_id).values_list('usuario_id', flat=True).first()
+    if dono is None:
+        raise Http404("Chamado não encontrado.")
+    # Mesma regra da página de detalhe: o criador do chamado ou um técnico
+    if not (dono == request.user.pk or request.papeis.is_tecnico):
+        return HttpResponseForbidden("Você não tem permissão para ver este chamado.")
+
+    # ?cursor= vem de 'anteriores' (mais antigos) ou 'novos' (chegaram depois)
+    pagina = _pagina_comentarios(chamado_id, itens_por_pagina(request), request.GET.get('cursor'))
+    return JsonResponse({
+        # Em ordem cronológica, como aparecem na página
+        'comentarios': [
+            {
+                'id': comentario.id,
+                'autor': comentario.usuario.get_full_name() or comentario.usuario.username,
+                'conteudo': comentario.conteudo,
+                'data_criacao': comentario.data_criacao.isoformat(),
+            }
+            for comentario in reversed(pagina.itens)
+        ],
+        'anteriores': pagina.token_proxima,
+        'novos': pagina.token_novos,
+        # Chegaram mais comentários do que cabem numa página: buscar de novo já
+        'mais_novos': pagina.tem_anterior,
+    })
 
 # View para um usuário normal criar um chamado
 
@@ -68,7 +191,7 @@ def criar_chamado(request):
             'pendentes': chamados_pendentes
         })
 
-    if request.user.groups.filter(name='TI').exists():
+    if request.papeis.is_ti:
     # Redireciona o técnico para a sua tela principal.
         return redirect('tickets:lista') 
     
@@ -77,22 +200,19 @@ def criar_chamado(request):
         if form.is_valid():
             chamado = form.save(commit=False)
             chamado.usuario = request.user
-            
-            # Exemplo: Se o usuário for do grupo 'Diretoria', a prioridade é alta.
-            if request.user.groups.filter(name='Diretoria').exists():
-                chamado.prioridade = Chamado.Prioridade.ALTA
-            # Exemplo: Se a categoria for 'Parada Geral', a prioridade é alta.
-            elif form.cleaned_data['subcategoria'].categoria.nome == 'Parada Geral':
-                chamado.prioridade = Chamado.Prioridade.ALTA
-            # Se nenhuma regra especial for aplicada, o valor padrão 'BAIXA' será usado.
-
-            
-            chamado.save()
-            LogTecnico.objects.create(
-                chamado=chamado,
-                tecnico=request.user, # Aqui, o 'tecnico' é o usuário que fez a ação
-                tipo_acao=TipoAcao.objects.get(nome='CRIACAO')
-            )
+
+            # Regras de prioridade cadastradas no admin (grupo, categoria,
+            # subcategoria, palavras-chave), sem consultas extras.
+            # Se nenhuma regra valer, o valor padrão 'BAIXA' será usado.
+            chamado.prioridade = prioridade_para(request.papeis.grupos, chamado.subcategoria, chamado.observacao)
+
+            with lote_eventos():
+                chamado.save()
+                # Aqui, o 'tecnico' do log é o usuário que fez a ação
+                registrar_evento(chamado, request.user, 'CRIACAO')
+                publicar_evento_chamado(chamado, 'criado')
+                # Depois do commit, entrega o chamado a um técnico habilitado (tickets/roteamento.py)
+                rotear_apos_commit(chamado)
             return redirect('tickets:detalhe', chamado_id=chamado.id)
     else:
         form = ChamadoForm()
@@ -102,29 +222,27 @@ def criar_chamado(request):
 # View para um técnico aceitar um chamado
 @login_required
 def aceitar_chamado(request, chamado_id):
-    is_tecnico = request.user.groups.filter(name='CPD').exists()
+    is_tecnico = request.papeis.is_tecnico
     if not is_tecnico:
         return HttpResponseForbidden("Apenas técnicos podem aceitar chamados.")
 
-    chamado = get_object_or_404(Chamado, id=chamado_id)
+    chamado = get_object_or_404(Chamado.objects.para_acao(), id=chamado_id)
     
-    # Lógica para aceitar o chamado (geralmente via POST, mas simplificado aqui)
-    chamado.tecnico = request.user
-    chamado.status = Chamado.Status.EM_ATENDIMENTO
-    chamado.save()
-
-    # ADICIONAR LOG
-    LogTecnico.objects.create(
-        chamado=chamado,
-        tecnico=request.user,
-        tipo_acao=TipoAcao.objects.get(nome='ACEITE')
-    )
+    # Lógica para aceitar o chamado (geralmente via POST, mas simplificado aqui).
+    # O UPDATE só acontece se o chamado ainda estiver aberto e sem técnico, então
+    # dois técnicos clicando ao mesmo tempo não "ganham" os dois.
+    try:
+        with lote_eventos():
+            executar_transicao(chamado, 'aceitar', condicoes={'tecnico__isnull': True}, tecnico=request.user)
+            registrar_evento(chamado, request.user, 'ACEITE')
+    except ConflitoTransicao as erro:
+        messages.error(request, str(erro))
     
     return redirect('tickets:detalhe', chamado_id=chamado.id)
 
 @login_required
 def cancelar_chamado(request, chamado_id):
-    chamado = get_object_or_404(Chamado, id=chamado_id)
+    chamado = get_object_or_404(Chamado.objects.para_acao(), id=chamado_id)
 
     # Lógica de Permissão: Apenas o criador do chamado pode cancelar.
     if chamado.usuario != request.user:
@@ -137,8 +255,10 @@ def cancelar_chamado(request, chamado_id):
 
     if request.method == 'POST':
         # Se o formulário foi submetido, cancela o chamado
-        chamado.status = Chamado.Status.CANCELADO
-        chamado.save()
+        try:
+            executar_transicao(chamado, 'cancelar', condicoes={'usuario': request.user})
+        except ConflitoTransicao as erro:
+            messages.error(request, str(erro))
         return redirect('tickets:detalhe', chamado_id=chamado.id)
 
     # Se for um pedido GET, mostra a página de confirmação
@@ -146,7 +266,7 @@ def cancelar_chamado(request, chamado_id):
 
 @login_required
 def resolver_chamado(request, chamado_id):
-    chamado = get_object_or_404(Chamado, id=chamado_id)
+    chamado = get_object_or_404(Chamado.objects.para_acao(), id=chamado_id)
 
     # Lógica de Permissão: Apenas o técnico responsável pode resolver o chamado.
     if chamado.tecnico != request.user:
@@ -159,17 +279,13 @@ def resolver_chamado(request, chamado_id):
 
     if request.method == 'POST':
         # Se o formulário foi submetido, resolve o chamado
-        chamado.status = Chamado.Status.CONCLUIDO
-        chamado.data_conclusao = timezone.now() # Regista a data/hora exata da conclusão
-        chamado.save()
-
-        # ADICIONAR LOG
-        LogTecnico.objects.create(
-            chamado=chamado,
-            tecnico=request.user,
-            tipo_acao=TipoAcao.objects.get(nome='RESOLUCAO')
-        )
-        # Adicionar ao log, etc.
+        # (a transição regista a data/hora exata da conclusão)
+        try:
+            with lote_eventos():
+                executar_transicao(chamado, 'resolver', condicoes={'tecnico': request.user})
+                registrar_evento(chamado, request.user, 'RESOLUCAO')
+        except ConflitoTransicao as erro:
+            messages.error(request, str(erro))
         return redirect('tickets:detalhe', chamado_id=chamado.id)
 
     # Se for um pedido GET, mostra a página de confirmação
@@ -180,41 +296,82 @@ def resolver_chamado(request, chamado_id):
 # ... (outras importações) ...
 
 @login_required
+@leitura_replica()
 def dashboard_usuario(request):
     """
     Mostra o painel principal para usuários comuns.
     """
     # Mostra apenas os chamados criados pelo próprio usuário.
-    meus_chamados = Chamado.objects.filter(usuario=request.user).exclude(status=Chamado.Status.FECHADO).order_by('-data_abertura')
+    meus_chamados = Chamado.objects.para_lista().filter(usuario=request.user).exclude(status=Chamado.Status.FECHADO).order_by('-data_abertura')
     return render(request, 'tickets/dashboard_usuario.html', {'chamados': meus_chamados})
 
 @login_required
+@leitura_replica()
 def dashboard_tecnico(request):
     """
     Mostra o painel principal para técnicos do CPD.
     """
     # Lógica de permissão: apenas membros do CPD podem aceder.
-    if not request.user.groups.filter(name='CPD').exists():
+    if not request.papeis.is_tecnico:
         return HttpResponseForbidden("Acesso negado. Esta página é apenas para técnicos.")
 
-    # Mostra chamados abertos e não atribuídos, por exemplo.
-    chamados_na_fila = Chamado.objects.filter(status='ABERTO', tecnico__isnull=True).order_by('data_abertura')
-# Define a lista de status que representam um chamado finalizado
-    status_finalizados = [
-        Chamado.Status.CONCLUIDO,
-        Chamado.Status.FECHADO,
-        Chamado.Status.CANCELADO,
-    ]
+    # Os primeiros chamados abertos e não atribuídos, na ordem da fila
+    # (prioridade e tempo de espera; ver tickets/fila.py)
+    chamados_na_fila = Chamado.objects.para_lista().na_fila()[:fila.tamanho()]
 
-    # A nova consulta exclui todos os chamados cujo status esteja nessa lista
-    meus_atendimentos = Chamado.objects.filter(tecnico=request.user).exclude(status__in=status_finalizados).order_by('data_abertura')
+    # Exclui os chamados finalizados (Chamado.STATUS_FINALIZADOS). Os chamados
+    # vinculados a um incidente aparecem uma vez só, na linha do incidente.
+    meus_atendimentos = Chamado.objects.para_lista().em_atendimento_por(request.user).filter(incidente__isnull=True)
+    meus_incidentes = Incidente.objects.ativos_de(request.user)
 
     context = {
         'chamados_na_fila': chamados_na_fila,
         'meus_atendimentos': meus_atendimentos,
+        'meus_incidentes': meus_incidentes,
+        # A atualização em tempo real (fila_eventos) só funciona sob o ASGI
+        'tempo_real': isinstance(request, ASGIRequest),
     }
     return render(request, 'tickets/dashboard_tecnico.html', context)
 
+# Intervalo (segundos) entre os "pings" que mantêm a conexão SSE aberta
+INTERVALO_PING_SSE = 15
+
+
+@login_required
+async def fila_eventos(request):
+    """
+    Server-Sent Events com as alterações da fila (novos chamados, aceites,
+    mudanças de status) para o painel do técnico.
+
+    É uma view assíncrona: precisa rodar sob o ASGI (core/asgi.py, com
+    uvicorn/daphne) para que cada conexão aberta não ocupe uma thread.
+    """
+    is_tecnico = await sync_to_async(lambda: request.papeis.is_tecnico)()
+    if not is_tecnico:
+        return HttpResponseForbidden("Acesso negado. Esta página é apenas para técnicos.")
+    if not isinstance(request, ASGIRequest):
+        # Sob o WSGI (ex.: runserver) o Django consome o stream inteiro antes
+        # de responder: a conexão nunca terminaria e prenderia uma thread.
+        # Com 204 o EventSource desiste e não tenta reconectar.
+        return HttpResponse(status=204)
+
+    async def transmitir():
+        async with obter_broker().assinar(CANAL_FILA) as fila:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), INTERVALO_PING_SSE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+
+    resposta = StreamingHttpResponse(transmitir(), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    # Evita que proxies (ex.: nginx) acumulem a resposta em buffer
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
+
 
     # tickets/views.py
 
@@ -223,8 +380,8 @@ def dashboard_tecnico(request):
 @login_required
 @require_POST
 def adicionar_comentario(request, chamado_id):
-    chamado = get_object_or_404(Chamado, id=chamado_id)
-    is_tecnico = request.user.groups.filter(name='CPD').exists()
+    chamado = get_object_or_404(Chamado.objects.para_acao(), id=chamado_id)
+    is_tecnico = request.papeis.is_tecnico
     pode_comentar = False
     
     # 1. Se o usuário logado for um técnico, ele pode comentar.
@@ -245,59 +402,237 @@ def adicionar_comentario(request, chamado_id):
         comentario = form.save(commit=False)
         comentario.chamado = chamado
         comentario.usuario = request.user
-        comentario.save()
-
-        # Adiciona o log APENAS se quem comentou for um técnico
-        if request.user.groups.filter(name='TI').exists():
-            LogTecnico.objects.create(
-                chamado=chamado,
-                tecnico=request.user,
-                tipo_acao=TipoAcao.objects.get(nome='COMENTARIO'),
-                detalhes=comentario.conteudo[:100] # Guarda os primeiros 100 caracteres do comentário
-            )
-        # Lógica Bónus: Se foi um usuário comum que respondeu,
-        # mudamos o status de volta para 'Em Atendimento' automaticamente.
-        if not is_tecnico:
-            chamado.status = Chamado.Status.EM_ATENDIMENTO
-            chamado.save()
+        try:
+            with lote_eventos():
+                comentario.save()
+
+                # Adiciona o log APENAS se quem comentou for um técnico
+                if request.papeis.is_ti:
+                    # Guarda os primeiros 100 caracteres do comentário
+                    registrar_evento(chamado, request.user, 'COMENTARIO', comentario.conteudo[:100])
+                # Lógica Bónus: Se foi um usuário comum que respondeu,
+                # mudamos o status de volta para 'Em Atendimento' automaticamente.
+                if not is_tecnico:
+                    executar_transicao(chamado, 'responder', condicoes={'usuario': request.user})
+        except ConflitoTransicao as erro:
+            messages.error(request, str(erro))
 
     # No final, redireciona de volta para a página de detalhes.
     return redirect('tickets:detalhe', chamado_id=chamado.id)
 
 
+@login_required
+@require_POST
+def operacao_em_lote(request):
+    """
+    Aplica uma ação a vários chamados de uma vez (JSON):
+    {"acao": "aceitar" | "atualizar_status" | "resolver" | "comentar",
+     "ids": [1, 2, ...], "status": "...", "comentario": "..."}
+    Responde com os ids alterados e o motivo de cada chamado recusado.
+    """
+    if not request.papeis.is_tecnico:
+        return HttpResponseForbidden("Apenas técnicos podem alterar chamados em lote.")
+
+    try:
+        dados = json.loads(request.body)
+    except ValueError:
+        dados = None
+    if not isinstance(dados, dict):
+        return JsonResponse({'erro': "Corpo da requisição deve ser um objeto JSON."}, status=400)
+
+    acao = dados.get('acao')
+    ids = dados.get('ids')
+    destino = dados.get('status')
+    comentario = dados.get('comentario') or ''
+    if acao not in ACOES_LOTE:
+        erro = f"Ação inválida. Use uma de: {', '.join(ACOES_LOTE)}."
+    elif not isinstance(ids, list) or not ids or not all(type(item) is int for item in ids):
+        erro = "Informe 'ids' como uma lista de números de chamado."
+    elif len(ids) > LIMITE_LOTE:
+        erro = f"No máximo {LIMITE_LOTE} chamados por vez."
+    elif acao == 'atualizar_status' and destino not in TRANSICOES['atualizar_status'].destinos:
+        erro = "Status de destino inválido."
+    elif not isinstance(comentario, str) or (acao == 'comentar' and not comentario.strip()):
+        erro = "Informe o texto do comentário."
+    else:
+        erro = None
+    if erro:
+        return JsonResponse({'erro': erro}, status=400)
+
+    try:
+        resultado = aplicar_em_lote(
+            request.user, acao, ids, destino=destino, comentario=comentario.strip(),
+            registrar_log=request.papeis.is_ti,
+        )
+    except ConflitoTransicao as conflito:
+        return JsonResponse({'erro': f"{conflito} Nenhum chamado foi alterado; tente novamente."}, status=409)
+
+    return JsonResponse({
+        'acao': acao,
+        'aplicados': resultado.aplicados,
+        'recusados': [{'id': chamado_id, 'motivo': motivo} for chamado_id, motivo in resultado.recusados.items()],
+    })
+
+# --- Incidentes (vários chamados do mesmo problema; ver tickets/incidentes.py) ---
+
+def _mensagem_vinculo(request, resultado):
+    if resultado.aplicados:
+        messages.success(request, f"{len(resultado.aplicados)} chamado(s) vinculado(s) ao incidente.")
+    for chamado_id, motivo in resultado.recusados.items():
+        messages.warning(request, f"Chamado #{chamado_id}: {motivo}")
+
+
+@login_required
+def criar_incidente(request):
+    if not request.papeis.is_tecnico:
+        return HttpResponseForbidden("Apenas técnicos podem abrir incidentes.")
+
+    if request.method == 'POST':
+        form = IncidenteForm(request.POST)
+        if form.is_valid():
+            incidente = form.save(commit=False)
+            incidente.tecnico = request.user
+            incidente.save()
+            if form.cleaned_data['chamados']:
+                try:
+                    _mensagem_vinculo(request, incidentes.vincular(incidente, form.cleaned_data['chamados']))
+                except ConflitoTransicao as erro:
+                    messages.error(request, str(erro))
+            return redirect('tickets:detalhe_incidente', incidente_id=incidente.id)
+    else:
+        form = IncidenteForm()
+
+    return render(request, 'tickets/criar_incidente.html', {'form': form})
+
+
+@login_required
+def detalhe_incidente(request, incidente_id):
+    if not request.papeis.is_tecnico:
+        return HttpResponseForbidden("Acesso negado. Esta página é apenas para técnicos.")
+
+    incidente = get_object_or_404(Incidente.objects.select_related('tecnico'), id=incidente_id)
+    context = {
+        'incidente': incidente,
+        'chamados': Chamado.objects.para_lista().filter(incidente=incidente).order_by('data_abertura'),
+        'form_vincular': VincularChamadosForm(),
+        'form_status': AtualizarStatusIncidenteForm(instance=incidente),
+        'form_comentario': ComentarioForm(),
+        'form_resolver': ResolverIncidenteForm(),
+    }
+    return render(request, 'tickets/detalhe_incidente.html', context)
+
+
+def _incidente_do_tecnico(request, incidente_id):
+    # Só o técnico responsável altera o incidente (como no chamado)
+    incidente = get_object_or_404(Incidente.objects.select_related('tecnico'), id=incidente_id)
+    if incidente.tecnico != request.user:
+        return None
+    return incidente
+
+
+@login_required
+@require_POST
+def vincular_chamados(request, incidente_id):
+    incidente = _incidente_do_tecnico(request, incidente_id)
+    if incidente is None:
+        return HttpResponseForbidden("Acesso negado. Apenas o técnico responsável pode alterar este incidente.")
+
+    form = VincularChamadosForm(request.POST)
+    if form.is_valid():
+        try:
+            _mensagem_vinculo(request, incidentes.vincular(incidente, form.cleaned_data['chamados']))
+        except ConflitoTransicao as erro:
+            messages.error(request, str(erro))
+    else:
+        messages.error(request, form.errors['chamados'][0])
+
+    return redirect('tickets:detalhe_incidente', incidente_id=incidente.id)
+
+
+@login_required
+@require_POST
+def atualizar_status_incidente(request, incidente_id):
+    incidente = _incidente_do_tecnico(request, incidente_id)
+    if incidente is None:
+        return HttpResponseForbidden("Acesso negado. Apenas o técnico responsável pode alterar este incidente.")
+
+    form = AtualizarStatusIncidenteForm(request.POST)
+    if form.is_valid():
+        try:
+            incidentes.atualizar_status(incidente, form.cleaned_data['status'])
+        except ConflitoTransicao as erro:
+            messages.error(request, str(erro))
+
+    return redirect('tickets:detalhe_incidente', incidente_id=incidente.id)
+
+
+@login_required
+@require_POST
+def comentar_incidente(request, incidente_id):
+    incidente = _incidente_do_tecnico(request, incidente_id)
+    if incidente is None:
+        return HttpResponseForbidden("Acesso negado. Apenas o técnico responsável pode alterar este incidente.")
+
+    form = ComentarioForm(request.POST)
+    if form.is_valid():
+        try:
+            incidentes.comentar(incidente, form.cleaned_data['conteudo'], registrar_log=request.papeis.is_ti)
+        except ConflitoTransicao as erro:
+            messages.error(request, str(erro))
+
+    return redirect('tickets:detalhe_incidente', incidente_id=incidente.id)
+
+
+@login_required
+@require_POST
+def resolver_incidente(request, incidente_id):
+    incidente = _incidente_do_tecnico(request, incidente_id)
+    if incidente is None:
+        return HttpResponseForbidden("Acesso negado. Apenas o técnico responsável pode resolver este incidente.")
+
+    form = ResolverIncidenteForm(request.POST)
+    if form.is_valid():
+        try:
+            incidentes.resolver(incidente, form.cleaned_data['comentario'].strip(), registrar_log=request.papeis.is_ti)
+        except ConflitoTransicao as erro:
+            messages.error(request, str(erro))
+
+    return redirect('tickets:detalhe_incidente', incidente_id=incidente.id)
+
 @login_required
 @require_POST
 def atualizar_status(request, chamado_id):
-    chamado = get_object_or_404(Chamado, id=chamado_id)
+    chamado = get_object_or_404(Chamado.objects.para_acao(), id=chamado_id)
 
     # Lógica de permissão
     if chamado.tecnico != request.user:
         return HttpResponseForbidden("Acesso negado.")
 
+    status_lido = chamado.status
     form = AtualizarStatusForm(request.POST, instance=chamado)
 
     if form.is_valid():
-        chamado_atualizado = form.save(commit=False)
-
-        if chamado_atualizado.status == Chamado.Status.CONCLUIDO:
-            chamado_atualizado.data_conclusao = timezone.now()
-
-        chamado_atualizado.save()
-
-
-        LogTecnico.objects.create(
-            chamado=chamado_atualizado,
-            tecnico=request.user,
-            tipo_acao=TipoAcao.objects.get(nome='STATUS_UPDATE'),
-            detalhes=f"Status alterado para: {chamado_atualizado.get_status_display()}"
-        )
+        novo_status = form.cleaned_data['status']
+        # Só grava se o status ainda for o que o técnico tinha na tela
+        try:
+            with lote_eventos():
+                executar_transicao(
+                    chamado, 'atualizar_status', destino=novo_status,
+                    condicoes={'tecnico': request.user, 'status': status_lido},
+                )
+                registrar_evento(
+                    chamado, request.user, 'STATUS_UPDATE',
+                    f"Status alterado para: {chamado.get_status_display()}",
+                )
+        except ConflitoTransicao as erro:
+            messages.error(request, str(erro))
 
     return redirect('tickets:detalhe', chamado_id=chamado.id)
 
 @login_required
 @require_POST
 def adicionar_anexo(request, chamado_id):
-    chamado = get_object_or_404(Chamado, id=chamado_id)
+    chamado = get_object_or_404(Chamado.objects.para_acao(), id=chamado_id)
 
     if chamado.usuario != request.user or chamado.status != Chamado.Status.AGUARDANDO_RESPOSTA:
         return HttpResponseForbidden("Você não tem permissão para adicionar um anexo neste momento.")
@@ -308,19 +643,17 @@ def adicionar_anexo(request, chamado_id):
         anexo = form.save(commit=False)
         anexo.chamado = chamado
         anexo.usuario_upload = request.user
-        anexo.save()
-        LogTecnico.objects.create(
-                chamado=chamado,
-                tecnico=request.user, # Aqui, o 'tecnico' é o usuário que fez a ação
-                tipo_acao=TipoAcao.objects.get(nome='ANEXOU_ARQUIVO')
-            )
+        with lote_eventos():
+            anexo.save()
+            # Aqui, o 'tecnico' do log é o usuário que fez a ação
+            registrar_evento(chamado, request.user, 'ANEXOU_ARQUIVO')
 
 
     return redirect('tickets:detalhe', chamado_id=chamado.id)
 
 @login_required
 def avaliar_e_fechar_chamado(request, chamado_id):
-    chamado = get_object_or_404(Chamado, id=chamado_id)
+    chamado = get_object_or_404(Chamado.objects.para_acao(), id=chamado_id)
 
     # Permissão: apenas o dono do chamado pode avaliar, e apenas se estiver 'CONCLUIDO'
     if chamado.usuario != request.user or chamado.status != Chamado.Status.CONCLUIDO:
@@ -332,16 +665,15 @@ def avaliar_e_fechar_chamado(request, chamado_id):
             avaliacao = form.save(commit=False)
             avaliacao.chamado = chamado
             avaliacao.usuario = request.user
-            avaliacao.save()
-
-            # O passo final: muda o status do chamado para 'FECHADO'
-            chamado.status = Chamado.Status.FECHADO
-            chamado.save()
-            LogTecnico.objects.create(
-                chamado=chamado,
-                tecnico=request.user, 
-                tipo_acao=TipoAcao.objects.get(nome='FECHAMENTO_USUARIO')
-            )
+            try:
+                with lote_eventos():
+                    # O passo final: muda o status do chamado para 'FECHADO'.
+                    # Se outra aba já fechou o chamado, nada é gravado.
+                    executar_transicao(chamado, 'fechar', condicoes={'usuario': request.user})
+                    avaliacao.save()
+                    registrar_evento(chamado, request.user, 'FECHAMENTO_USUARIO')
+            except ConflitoTransicao as erro:
+                messages.error(request, str(erro))
 
             return redirect('tickets:detalhe', chamado_id=chamado.id)
     else:
@@ -350,25 +682,31 @@ def avaliar_e_fechar_chamado(request, chamado_id):
     return render(request, 'tickets/avaliar_chamado.html', {'form': form, 'chamado': chamado})
 
 @login_required
+@leitura_replica()
 def historico_chamados(request):
     """
     Mostra uma lista de todos os chamados com status 'FECHADO'.
     A lista é filtrada de acordo com o perfil do usuário (comum ou técnico).
     """
-    is_tecnico = request.user.groups.filter(name='CPD').exists()
+    is_tecnico = request.papeis.is_tecnico
 
     if is_tecnico:
         # Se for técnico, mostra TODOS os chamados fechados, ordenados pelo mais recente.
-        lista_fechados = Chamado.objects.filter(status=Chamado.Status.FECHADO).order_by('-data_conclusao')
+        lista_fechados = Chamado.objects.para_historico().filter(status=Chamado.Status.FECHADO)
     else:
         # Se for um usuário comum, mostra apenas os SEUS chamados fechados.
-        lista_fechados = Chamado.objects.filter(
+        lista_fechados = Chamado.objects.para_historico().filter(
             usuario=request.user, 
             status=Chamado.Status.FECHADO
-        ).order_by('-data_conclusao')
+        )
+
+    # data_historico: data de conclusão, ou de abertura se ela faltar (ver para_historico)
+    paginador = KeysetPaginator(lista_fechados, 'data_historico', itens_por_pagina(request))
+    pagina = paginador.pagina(request.GET.get('cursor'))
 
     context = {
-        'chamados': lista_fechados,
+        'chamados': pagina,
+        'pagina': pagina,
         'is_tecnico': is_tecnico
     }
     